@@ -0,0 +1,5 @@
+"""HTTP API模块"""
+
+from .server import create_api_app, router
+
+__all__ = ['create_api_app', 'router']
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""单独启动HTTP API（不含Gradio界面），便于压测"""
+
+import uvicorn
+
+from backend.config.settings import settings
+from backend.api.server import create_api_app
+
+if __name__ == "__main__":
+    uvicorn.run(create_api_app(), host="0.0.0.0", port=settings.api_port)
\ No newline at end of file
@@ -0,0 +1,449 @@
+"""HTTP API模块"""
+
+import json
+import time
+import uuid
+import inspect
+from datetime import date, datetime
+from typing import Generator, List, Optional, Tuple, Union
+from fastapi import APIRouter, Depends, FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.solver import problem_solver
+from backend.core.metrics import metrics
+from backend.core.export import list_solutions, solution_exporter
+from backend.core.scheduler import AdmissionRejected, REJECT_BUSY, Ticket, lane_scheduler
+from backend.core.quota import usage_tracker
+from backend.core.utils import ImageTooLarge, check_image_limits, estimate_tokens
+from backend.core.profiler import request_profiler
+from backend.core.effort import effort_policy
+from backend.core.mode_classifier import ModeDecision, mode_classifier
+from backend.tracing import tracer
+from backend.jobs.store import job_store, STATUS_DONE, STATUS_FAILED
+
+security = HTTPBasic(auto_error=False)
+router = APIRouter(prefix="/api")
+
+def verify_user(
+    credentials: Optional[HTTPBasicCredentials] = Depends(security)
+) -> Optional[str]:
+    """
+    使用与Gradio界面相同的凭据进行HTTP Basic认证
+
+    Returns:
+        Optional[str]: 认证通过的用户名，未启用认证时为None
+    """
+    if not settings.auth_enabled:
+        return None
+    if credentials is None or not settings.verify_auth(
+        credentials.username, credentials.password
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="认证失败",
+            headers={"WWW-Authenticate": "Basic"}
+        )
+    return credentials.username
+
+def _read_upload(images: Optional[List[UploadFile]]) -> List[bytes]:
+    """读取上传图片的原始字节，不经过PIL解码；超出大小或像素数限制时返回413"""
+    if not images:
+        return []
+    result = []
+    for image in images:
+        # 最多读取比上限多一个字节，超大文件不会整个读入内存
+        data = image.file.read(settings.image_max_bytes + 1 if settings.image_max_bytes else -1)
+        if not data:
+            continue
+        if settings.image_max_bytes and len(data) > settings.image_max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"图片 {image.filename} 超过 {settings.image_max_bytes / 1024 / 1024:.0f} MB 上限"
+            )
+        try:
+            check_image_limits(data)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"无法识别的图片：{image.filename}")
+        result.append(data)
+    return result
+
+def _enter_lane(complex_mode: bool, username: Optional[str] = None) -> Ticket:
+    """进入对应模式的调度通道，系统繁忙时立即返回503，用户超出限制或额度时返回429"""
+    try:
+        return lane_scheduler.enter(lane_scheduler.lane_for(complex_mode), username or "")
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503 if e.reason == REJECT_BUSY else 429,
+            detail=str(e),
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+
+# 关闭仍在工作线程中执行的事件生成器时的重试间隔（秒）
+FINISH_POLL_INTERVAL = 0.05
+
+class TicketStreamingResponse(StreamingResponse):
+    """
+    持有排队凭据的流式响应
+
+    凭据在返回响应前获取（以便系统繁忙时直接返回503），之后由_iter_solution负责
+    等待放行和释放。响应结束或客户端断开时关闭事件生成器，由其释放凭据；
+    只有事件生成器从未开始执行时才由这里释放，避免通道名额泄漏。
+    """
+    def __init__(self, content: Generator[str, None, None], ticket: Ticket, **kwargs):
+        super().__init__(content, **kwargs)
+        self.generator = content
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await run_in_threadpool(self.finish)
+
+    def finish(self) -> None:
+        """关闭事件生成器；生成器仍在工作线程中执行时等待其产出后再关闭"""
+        while True:
+            unstarted = inspect.getgeneratorstate(self.generator) == inspect.GEN_CREATED
+            try:
+                self.generator.close()
+                break
+            except ValueError:
+                time.sleep(FINISH_POLL_INTERVAL)
+        if unstarted:
+            lane_scheduler.release(self.ticket)
+
+def _iter_solution(
+    text: str,
+    images: List[bytes],
+    complex_mode: bool,
+    ensemble: bool = False,
+    ticket: Optional[Ticket] = None,
+    speculative: bool = False,
+    decision: Optional[ModeDecision] = None,
+    report_queue: bool = False
+) -> Generator[Union[Tuple[str, str], float], None, None]:
+    """
+    将求解器的输出统一为(解答内容, 日志)
+
+    传入排队凭据时先等待放行，结束（包括被关闭）时释放凭据，凭据只由这里等待和释放。
+    report_queue为True时，开始时先产出一次预计等待秒数（已放行时为0），
+    排队期间继续产出最新的预计等待秒数。
+    """
+    solution = ""
+    error = None
+    start_time = time.monotonic()
+    request_id = uuid.uuid4().hex[:12]
+    trace = tracer.start_trace(
+        "solve", request_id, source="api", complex_mode=complex_mode,
+        ensemble=ensemble, speculative=speculative, images=len(images)
+    )
+    try:
+        if ticket is not None:
+            with trace.span("queue.wait", lane=ticket.lane):
+                waiting = lane_scheduler.wait(ticket)
+                estimate = next(waiting, 0.0)
+                if report_queue:
+                    yield estimate
+                for estimate in waiting:
+                    if report_queue:
+                        yield estimate
+        elif report_queue:
+            yield 0.0
+        steps = request_profiler.wrap(
+            problem_solver.solve_problem(
+                text, images, complex_mode, ensemble=ensemble, trace=trace, speculative=speculative
+            ),
+            request_id,
+            {"source": "api", "complex_mode": complex_mode, "ensemble": ensemble,
+             "speculative": speculative}
+        )
+        for step in steps:
+            step = step if isinstance(step, tuple) else (step, "")
+            if step[0]:
+                solution = step[0]
+            yield step
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        if ticket is not None:
+            lane_scheduler.release(ticket, estimate_tokens(text) + estimate_tokens(solution))
+        mode_classifier.record(
+            text, complex_mode, solution, time.monotonic() - start_time, decision, images, error
+        )
+        trace.end(error)
+
+def _format_sse(event: str, data: dict) -> str:
+    """格式化单条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _stream_events(
+    text: str,
+    images: List[bytes],
+    complex_mode: bool,
+    ensemble: bool = False,
+    ticket: Optional[Ticket] = None,
+    speculative: bool = False,
+    decision: Optional[ModeDecision] = None
+) -> Generator[str, None, None]:
+    """
+    将求解过程转换为SSE事件流
+
+    自动选择模式时先发送mode事件；排队期间发送queued事件（含预计等待秒数）；
+    之后只发送新增内容（delta），当已发送内容不是新内容的前缀时
+    （如草稿被复杂模式解答替换）发送replace事件。排队凭据交由_iter_solution等待和释放。
+    """
+    sent = ""
+    log = ""
+    steps = _iter_solution(
+        text, images, complex_mode, ensemble, ticket, speculative, decision, report_queue=True
+    )
+    try:
+        # 先启动_iter_solution再产出事件：本生成器一旦开始执行，凭据就由_iter_solution释放
+        for index, step in enumerate(steps):
+            if index == 0 and decision is not None:
+                yield _format_sse("mode", _decision_payload(decision))
+            if isinstance(step, float):
+                if step:
+                    yield _format_sse("queued", {"estimated_wait": round(step)})
+                continue
+            solution, step_log = step
+            if step_log:
+                log = step_log
+            if not solution or solution == sent:
+                continue
+            if solution.startswith(sent):
+                yield _format_sse("delta", {"text": solution[len(sent):]})
+            else:
+                yield _format_sse("replace", {"text": solution})
+            sent = solution
+        yield _format_sse("done", {"solution": sent, "log": log})
+    except Exception as e:
+        logger.log_error(f"API流式求解出错：{str(e)}")
+        yield _format_sse("error", {"message": str(e)})
+    finally:
+        steps.close()
+
+def _decide_mode(
+    text: str,
+    images: List[bytes],
+    complex_mode: bool,
+    auto_mode: bool
+) -> Tuple[bool, Optional[ModeDecision]]:
+    """自动选择模式时按题目特征决定是否使用复杂模式"""
+    if not auto_mode:
+        return complex_mode, None
+    decision = mode_classifier.decide(text, images)
+    return decision.is_complex_mode, decision
+
+def _decision_payload(decision: ModeDecision) -> dict:
+    """自动选择结果的响应内容"""
+    return {
+        "complex_mode": decision.is_complex_mode,
+        "probability": round(decision.probability, 4),
+        "reasons": decision.reasons,
+    }
+
+@router.post("/solve")
+def solve(
+    text: str = Form(...),
+    complex_mode: bool = Form(False),
+    ensemble: bool = Form(False),
+    speculative: bool = Form(False),
+    auto_mode: bool = Form(False),
+    image: Optional[List[UploadFile]] = File(None),
+    username: Optional[str] = Depends(verify_user)
+) -> dict:
+    """
+    非流式求解，返回最终解答（auto_mode=true时忽略complex_mode，按题目特征自动选择）
+
+    参数与流式接口一致；speculative只影响中间输出，最终解答始终是复杂模式的结果。
+    """
+    images = _read_upload(image)
+    complex_mode, decision = _decide_mode(text, images, complex_mode, auto_mode)
+    solution, log = "", ""
+    ticket = _enter_lane(complex_mode, username)
+    for step_solution, step_log in _iter_solution(
+        text, images, complex_mode, ensemble, ticket, speculative, decision
+    ):
+        if step_solution:
+            solution = step_solution
+        if step_log:
+            log = step_log
+    result = {"solution": solution, "log": log}
+    if decision is not None:
+        result["mode"] = _decision_payload(decision)
+    return result
+
+@router.post("/solve/stream")
+def solve_stream(
+    text: str = Form(...),
+    complex_mode: bool = Form(False),
+    ensemble: bool = Form(False),
+    speculative: bool = Form(False),
+    auto_mode: bool = Form(False),
+    image: Optional[List[UploadFile]] = File(None),
+    username: Optional[str] = Depends(verify_user)
+) -> StreamingResponse:
+    """流式求解，以SSE形式推送增量内容（speculative=true时复杂模式先推送草稿）"""
+    images = _read_upload(image)
+    complex_mode, decision = _decide_mode(text, images, complex_mode, auto_mode)
+    ticket = _enter_lane(complex_mode, username)
+    return TicketStreamingResponse(
+        _stream_events(text, images, complex_mode, ensemble, ticket, speculative, decision),
+        ticket,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _get_job_for_user(job_id: str, username: Optional[str]) -> dict:
+    """查询任务，并校验任务归属"""
+    job = job_store.get(job_id)
+    if job is None or (username is not None and job["username"] != username):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+def _stream_job_events(job_id: str) -> Generator[str, None, None]:
+    """
+    轮询任务的阶段性输出并转换为SSE事件流
+
+    客户端断开后可随时重新连接，会先收到当前完整输出再继续接收增量。
+    """
+    sent = ""
+    while True:
+        job = job_store.get(job_id)
+        if job is None:
+            yield _format_sse("error", {"message": "任务不存在"})
+            return
+        output = job["output"]
+        if output and output != sent:
+            if output.startswith(sent):
+                yield _format_sse("delta", {"text": output[len(sent):]})
+            else:
+                yield _format_sse("replace", {"text": output})
+            sent = output
+        if job["status"] == STATUS_DONE:
+            yield _format_sse("done", {"solution": output, "log": job["log"]})
+            return
+        if job["status"] == STATUS_FAILED:
+            yield _format_sse("error", {"message": job["error"] or "任务执行失败"})
+            return
+        time.sleep(settings.job_poll_interval)
+
+@router.post("/jobs")
+def submit_job(
+    text: str = Form(...),
+    complex_mode: bool = Form(False),
+    image: Optional[List[UploadFile]] = File(None),
+    username: Optional[str] = Depends(verify_user)
+) -> dict:
+    """提交异步求解任务，立即返回任务ID（任务执行时同样经过调度通道并计入用户用量）"""
+    if username and not usage_tracker.check(username):
+        raise HTTPException(
+            status_code=429,
+            detail="本小时的用量额度已用完，请稍后再试",
+            headers={"Retry-After": str(usage_tracker.seconds_until_reset())}
+        )
+    job_id = job_store.submit(text, _read_upload(image), complex_mode, username)
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}")
+def get_job(
+    job_id: str,
+    username: Optional[str] = Depends(verify_user)
+) -> dict:
+    """查询任务状态和当前输出"""
+    return _get_job_for_user(job_id, username)
+
+@router.get("/jobs/{job_id}/stream")
+def stream_job(
+    job_id: str,
+    username: Optional[str] = Depends(verify_user)
+) -> StreamingResponse:
+    """以SSE形式重新连接任务的输出流"""
+    _get_job_for_user(job_id, username)
+    return StreamingResponse(
+        _stream_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _parse_date(value: Optional[str], name: str) -> Optional[date]:
+    """解析YYYY-MM-DD格式的日期参数"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} 日期格式应为 YYYY-MM-DD")
+
+@router.get("/export")
+def export_solutions(
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    ids: Optional[str] = Query(None),
+    username: Optional[str] = Depends(verify_user)
+) -> StreamingResponse:
+    """按日期范围或ID列表（逗号分隔）批量导出已保存的解答，以zip流式下载"""
+    id_list = [item.strip() for item in ids.split(",") if item.strip()] if ids else None
+    records = list_solutions(
+        settings.solutions_dir, _parse_date(start, "start"), _parse_date(end, "end"), id_list
+    )
+    if not records:
+        raise HTTPException(status_code=404, detail="没有符合条件的解答")
+    logger.logger.info(f"用户 {username} 导出 {len(records)} 份解答")
+    filename = f"solutions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        solution_exporter.stream(records),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _require_admin(username: Optional[str]) -> None:
+    """校验管理员权限（未启用认证或未配置管理员时一律拒绝）"""
+    if not settings.auth_enabled or username not in settings.admin_users:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+@router.get("/admin/profiling")
+def get_profiling(username: Optional[str] = Depends(verify_user)) -> dict:
+    """查询性能剖析开关"""
+    _require_admin(username)
+    return {"enabled": request_profiler.enabled, "sample_rate": request_profiler.sample_rate}
+
+@router.post("/admin/profiling")
+def set_profiling(
+    enabled: Optional[bool] = Form(None),
+    sample_rate: Optional[float] = Form(None),
+    username: Optional[str] = Depends(verify_user)
+) -> dict:
+    """在运行时开关性能剖析（对所有工作进程生效）"""
+    _require_admin(username)
+    config = request_profiler.configure(enabled, sample_rate)
+    logger.logger.info(f"管理员 {username} 修改剖析设置：{config}")
+    return config
+
+@router.get("/health")
+def health() -> dict:
+    """健康检查"""
+    return {"status": "ok"}
+
+@router.get("/metrics")
+def get_metrics(username: Optional[str] = Depends(verify_user)) -> dict:
+    """查询所有工作进程汇总后的运行指标，以及本进程各调度通道和推理强度策略的状态"""
+    return {
+        **metrics.snapshot(),
+        "lanes": lane_scheduler.get_status(),
+        "effort": effort_policy.get_status(),
+    }
+
+def create_api_app() -> FastAPI:
+    """创建仅包含HTTP API的FastAPI应用"""
+    app = FastAPI(title="TheoryX API")
+    app.include_router(router)
+    return app
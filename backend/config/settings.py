@@ -3,11 +3,39 @@
 import os
 import json
 import logging
+from typing import Optional
+from fnmatch import fnmatchcase
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv(override=True)
 
+# 模型参数档案的默认值
+DEFAULT_MODEL_PROFILE = {
+    # 是否支持temperature参数
+    'temperature': True,
+    # 复杂模式下的最高推理强度（high/medium/low），None表示不发送reasoning_effort
+    'reasoning_effort': None,
+    # 最大输出token数（0表示不限制）
+    'max_tokens': 0,
+    # 流式请求的stream_options，None表示不发送
+    'stream_options': None,
+}
+
+# 内置的模型参数档案（按模型名通配匹配，可被 MODEL_PROFILES 覆盖）
+BUILTIN_MODEL_PROFILES = {
+    'o1*': {'temperature': False, 'reasoning_effort': 'high'},
+    'o3*': {'temperature': False, 'reasoning_effort': 'high'},
+    'o4*': {'temperature': False, 'reasoning_effort': 'high'},
+}
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 class Settings:
     """配置类"""
     def __init__(self):
@@ -15,24 +43,134 @@ class Settings:
         self.api_base_url = os.getenv('OPENAI_API_BASE_URL')
         self.api_key = os.getenv('OPENAI_API_KEY')
         
+        # 多端点路由配置
+        self.endpoints = self._load_endpoints()
+        self.router_ewma_alpha = float(os.getenv('ROUTER_EWMA_ALPHA', '0.3'))
+        self.router_cooldown = float(os.getenv('ROUTER_COOLDOWN', '30'))
+        self.router_probe_interval = float(os.getenv('ROUTER_PROBE_INTERVAL', '30'))
+        # 是否直接解析原始SSE字节流（跳过SDK数据块对象构建）
+        self.stream_fast_path = _env_bool('STREAM_FAST_PATH', False)
+        # 流式输出中途因暂时性错误中断时的最多续写次数（0表示不续写）
+        self.stream_max_resumes = int(os.getenv('STREAM_MAX_RESUMES', '2'))
+        
         # 模型配置
         self.simple_image_model = os.getenv('SIMPLE_IMAGE_MODEL')
         self.simple_solver_model = os.getenv('SIMPLE_SOLVER_MODEL')
         self.complex_image_model = os.getenv('COMPLEX_IMAGE_MODEL')
         self.complex_solver_model = os.getenv('COMPLEX_SOLVER_MODEL')
         
+        # 模型参数档案（JSON对象，键为模型名或通配模式）
+        self.model_profiles = self._load_model_profiles()
+        # 推理强度的延迟预算：预计p95完成时间超过该秒数时逐级降低推理强度（0表示不调整）
+        self.effort_target_p95 = float(os.getenv('EFFORT_TARGET_P95', '0'))
+        
+        # 求解模式自动选择配置
+        self.auto_mode = _env_bool('AUTO_MODE', False)
+        self.mode_threshold = float(os.getenv('MODE_THRESHOLD', '0.5'))
+        self.mode_model_path = os.getenv('MODE_MODEL_PATH', 'data/mode_classifier.json')
+        self.mode_log_path = os.getenv('MODE_LOG_PATH', '')
+        self.mode_log_max_bytes = int(os.getenv('MODE_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+        
+        # 复杂模式草稿配置（界面中“先显示快速草稿”选项的默认值）
+        self.speculative_draft = _env_bool('SPECULATIVE_DRAFT', False)
+        
+        # 集成求解配置
+        self.ensemble_size = int(os.getenv('ENSEMBLE_SIZE', '3'))
+        self.ensemble_models = [
+            name.strip() for name in os.getenv('ENSEMBLE_MODELS', '').split(',') if name.strip()
+        ]
+        self.ensemble_temperature = float(os.getenv('ENSEMBLE_TEMPERATURE', '0.7'))
+        self.ensemble_max_tokens = int(os.getenv('ENSEMBLE_MAX_TOKENS', '0'))
+        
+        # 图片处理配置
+        # 图片编码缓存按base64数据的总字节数限制
+        self.image_cache_bytes = int(os.getenv('IMAGE_CACHE_BYTES', str(64 * 1024 * 1024)))
+        self.image_encode_workers = int(os.getenv('IMAGE_ENCODE_WORKERS', '4'))
+        # 上传图片的文件大小和像素数上限，以及发送给模型前缩放到的最长边（0表示不限制）
+        self.image_max_bytes = int(os.getenv('IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+        self.image_max_pixels = int(os.getenv('IMAGE_MAX_PIXELS', '100000000'))
+        self.image_max_side = int(os.getenv('IMAGE_MAX_SIDE', '2048'))
+        
+        # 解答渲染配置
+        self.render_cache_size = int(os.getenv('RENDER_CACHE_SIZE', '4096'))
+        
+        # 调度通道配置（简单/复杂模式分别限制并发数和排队长度）
+        self.lane_simple_concurrency = int(os.getenv('LANE_SIMPLE_CONCURRENCY', '8'))
+        self.lane_simple_max_queue = int(os.getenv('LANE_SIMPLE_MAX_QUEUE', '32'))
+        self.lane_complex_concurrency = int(os.getenv('LANE_COMPLEX_CONCURRENCY', '2'))
+        self.lane_complex_max_queue = int(os.getenv('LANE_COMPLEX_MAX_QUEUE', '8'))
+        self.lane_max_wait = float(os.getenv('LANE_MAX_WAIT', '0'))
+        
+        # 用户公平调度与配额配置（仅在启用认证时按用户名生效）
+        # 并发和排队上限按进程计数，多进程部署时实际上限为其乘以进程数；token额度在进程间共享
+        self.user_max_active = int(os.getenv('USER_MAX_ACTIVE', '2'))
+        self.user_max_queued = int(os.getenv('USER_MAX_QUEUED', '4'))
+        self.user_tokens_per_hour = int(os.getenv('USER_TOKENS_PER_HOUR', '0'))
+        self.fair_quantum = float(os.getenv('FAIR_QUANTUM', '1.0'))
+        self.quota_flush_interval = float(os.getenv('QUOTA_FLUSH_INTERVAL', '10'))
+        
+        # 性能剖析配置（默认关闭；也可由管理员在运行时开启）
+        self.profile_enabled = _env_bool('PROFILE_ENABLED', False)
+        self.profile_sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+        self.profile_retention = int(os.getenv('PROFILE_RETENTION', '50'))
+        self.admin_users = [
+            name.strip() for name in os.getenv('ADMIN_USERS', '').split(',') if name.strip()
+        ]
+        
+        # 链路追踪配置
+        self.tracing_enabled = _env_bool('TRACING_ENABLED', False)
+        self.trace_dir = os.getenv('TRACE_DIR', 'traces')
+        self.trace_service_name = os.getenv('TRACE_SERVICE_NAME', 'theoryx')
+        
+        # 上游响应录制与回放配置（record录制，replay回放且不访问模型端点）
+        self.cassette_mode = os.getenv('CASSETTE_MODE', 'off').strip().lower() or 'off'
+        self.cassette_dir = os.getenv('CASSETTE_DIR', 'cassettes')
+        self.cassette_speed = float(os.getenv('CASSETTE_SPEED', '1'))
+        
+        # 批量导出配置
+        self.export_workers = int(os.getenv('EXPORT_WORKERS', '4'))
+        self.export_window = int(os.getenv('EXPORT_WINDOW', '16'))
+        self.export_compress_level = int(os.getenv('EXPORT_COMPRESS_LEVEL', '6'))
+        
+        # 习题集导入配置
+        self.ingest_concurrency = int(os.getenv('INGEST_CONCURRENCY', '4'))
+        self.ingest_min_gap_ratio = float(os.getenv('INGEST_MIN_GAP_RATIO', '0.02'))
+        self.ingest_min_region_ratio = float(os.getenv('INGEST_MIN_REGION_RATIO', '0.04'))
+        
         # 验证配置完整性
         self._validate_settings()
         
         # Gradio认证配置
         self.auth_enabled = bool(os.getenv('GRADIO_AUTH'))
         self.auth_data = self._load_auth_data()
+        
+        # HTTP API配置
+        self.api_enabled = _env_bool('ENABLE_HTTP_API', False)
+        self.api_port = int(os.getenv('API_PORT', '7861'))
+        
+        # 多进程部署与共享状态配置
+        self.server_workers = int(os.getenv('SERVER_WORKERS', '1'))
+        self.server_port = int(os.getenv('SERVER_PORT', '7860'))
+        self.worker_base_port = int(os.getenv('WORKER_BASE_PORT', '7870'))
+        self.shared_state_path = os.getenv('SHARED_STATE_PATH', 'data/shared_state.db')
+        self.metrics_flush_interval = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+        self.solutions_dir = os.getenv('SOLUTIONS_DIR', 'solutions')
+        
+        # 异步任务配置
+        self.job_workers = int(os.getenv('JOB_WORKERS', '0'))
+        self.job_db_path = os.getenv('JOB_DB_PATH', 'data/jobs.db')
+        self.job_checkpoint_interval = float(os.getenv('JOB_CHECKPOINT_INTERVAL', '1'))
+        self.job_poll_interval = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+        self.job_lease_timeout = float(os.getenv('JOB_LEASE_TIMEOUT', '600'))
+        self.job_heartbeat_interval = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '30'))
+        self.job_max_attempts = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
 
     def _validate_settings(self):
         """验证所有必需的配置项"""
         required_vars = [
-            ('OPENAI_API_BASE_URL', self.api_base_url),
-            ('OPENAI_API_KEY', self.api_key),
+            # 回放录制的响应时不需要真实端点
+            ('OPENAI_API_BASE_URL 或 OPENAI_ENDPOINTS', self.endpoints or self.cassette_mode == 'replay'),
             ('SIMPLE_IMAGE_MODEL', self.simple_image_model),
             ('SIMPLE_SOLVER_MODEL', self.simple_solver_model),
             ('COMPLEX_IMAGE_MODEL', self.complex_image_model),
@@ -46,6 +184,140 @@ class Settings:
                 f"缺少必要的环境变量：{', '.join(missing_vars)}。"
                 "请检查.env文件配置。"
             )
+        
+        # 公平调度按量子累积亏欠额，量子不大于0时排队的请求永远无法被选中
+        if self.fair_quantum <= 0:
+            raise ValueError(f"FAIR_QUANTUM 必须大于0（当前为 {self.fair_quantum}）")
+
+    def _load_endpoints(self) -> list:
+        """
+        加载模型端点列表
+        
+        优先读取 OPENAI_ENDPOINTS（JSON列表），每个端点可单独配置
+        base_url、api_key、weight 以及 models（模型列表或 {模型: 权重}）；
+        未配置时回退到单一的 OPENAI_API_BASE_URL / OPENAI_API_KEY。
+        
+        Returns:
+            list: 端点配置字典列表
+        """
+        endpoints_data = os.getenv('OPENAI_ENDPOINTS')
+        if not endpoints_data:
+            if not (self.api_base_url and self.api_key):
+                return []
+            return [{
+                'name': 'default',
+                'base_url': self.api_base_url,
+                'api_key': self.api_key,
+                'weight': 1.0,
+                'models': None
+            }]
+            
+        try:
+            raw_endpoints = json.loads(endpoints_data)
+        except json.JSONDecodeError:
+            raise ValueError("OPENAI_ENDPOINTS 环境变量格式错误，应为JSON列表")
+            
+        endpoints = []
+        for index, item in enumerate(raw_endpoints):
+            base_url = item.get('base_url') or self.api_base_url
+            api_key = item.get('api_key') or self.api_key
+            if not (base_url and api_key):
+                raise ValueError(f"OPENAI_ENDPOINTS 第{index + 1}个端点缺少 base_url 或 api_key")
+            models = item.get('models')
+            if isinstance(models, list):
+                models = {name: 1.0 for name in models}
+            endpoints.append({
+                'name': item.get('name') or f"endpoint-{index + 1}",
+                'base_url': base_url,
+                'api_key': api_key,
+                'weight': float(item.get('weight', 1.0)),
+                'models': models
+            })
+        return endpoints
+
+    def _load_model_profiles(self) -> dict:
+        """
+        加载模型参数档案
+        
+        MODEL_PROFILES 为JSON对象，键为模型名或通配模式（如 "o3*"），值可包含
+        temperature、reasoning_effort、max_tokens、stream_options，
+        未配置的字段沿用内置档案和默认值。
+        
+        Returns:
+            dict: {模型名或通配模式: 参数档案}，自定义档案排在内置档案之前
+        """
+        profiles_data = os.getenv('MODEL_PROFILES')
+        if not profiles_data:
+            return dict(BUILTIN_MODEL_PROFILES)
+            
+        try:
+            custom_profiles = json.loads(profiles_data)
+        except json.JSONDecodeError:
+            raise ValueError("MODEL_PROFILES 环境变量格式错误，应为JSON对象")
+        if not isinstance(custom_profiles, dict):
+            raise ValueError("MODEL_PROFILES 环境变量格式错误，应为JSON对象")
+            
+        for pattern, profile in custom_profiles.items():
+            unknown = set(profile) - set(DEFAULT_MODEL_PROFILE)
+            if unknown:
+                raise ValueError(f"MODEL_PROFILES 中 {pattern} 包含未知字段：{', '.join(sorted(unknown))}")
+            effort = profile.get('reasoning_effort')
+            if effort not in (None, 'high', 'medium', 'low'):
+                raise ValueError(f"MODEL_PROFILES 中 {pattern} 的 reasoning_effort 应为 high/medium/low")
+        return {**custom_profiles, **{
+            pattern: profile for pattern, profile in BUILTIN_MODEL_PROFILES.items()
+            if pattern not in custom_profiles
+        }}
+
+    def get_model_profile(self, model: str) -> dict:
+        """
+        获取模型的参数档案（精确匹配优先，其次按配置顺序取第一个匹配的通配模式）
+        
+        Args:
+            model: 模型名称
+            
+        Returns:
+            dict: 合并默认值后的参数档案
+        """
+        profile = self.model_profiles.get(model)
+        if profile is None:
+            profile = next(
+                (value for pattern, value in self.model_profiles.items()
+                 if fnmatchcase(model, pattern)),
+                {}
+            )
+        return {**DEFAULT_MODEL_PROFILE, **profile}
+
+    def get_request_params(
+        self,
+        model: str,
+        temperature: float = 0.01,
+        reasoning_effort: Optional[str] = None
+    ) -> dict:
+        """
+        按模型参数档案构建请求的附加参数（模型不支持的参数不发送）
+        
+        Args:
+            model: 模型名称
+            temperature: 采样温度
+            reasoning_effort: 推理强度（None表示不发送）
+            
+        Returns:
+            dict: 透传给 chat.completions.create 的参数
+        """
+        profile = self.get_model_profile(model)
+        request_params = {}
+        if profile["temperature"]:
+            request_params["temperature"] = temperature
+        if reasoning_effort:
+            request_params["reasoning_effort"] = reasoning_effort
+        if profile["max_tokens"]:
+            # 推理模型以 max_completion_tokens 限制输出（包含推理token）
+            key = "max_completion_tokens" if profile["reasoning_effort"] else "max_tokens"
+            request_params[key] = profile["max_tokens"]
+        if profile["stream_options"]:
+            request_params["stream_options"] = profile["stream_options"]
+        return request_params
 
     def _load_auth_data(self):
         """加载认证数据"""
@@ -76,5 +348,12 @@ class Settings:
             return self.complex_image_model, self.complex_solver_model
         return self.simple_image_model, self.simple_solver_model
 
+    def get_ensemble_models(self, is_complex_mode: bool) -> list:
+        """获取集成求解各路采样使用的模型（未配置时全部使用当前模式的求解模型）"""
+        _, solver_model = self.get_model_info(is_complex_mode)
+        candidates = self.ensemble_models or [solver_model]
+        size = max(self.ensemble_size, 1)
+        return [candidates[index % len(candidates)] for index in range(size)]
+
 # 创建全局配置实例
 settings = Settings()
\ No newline at end of file
@@ -2,11 +2,13 @@
 
 from .image_processor import image_processor
 from .solver import problem_solver
+from .router import model_router
 from .utils import encode_image, convert_formula_format, save_solution
 
 __all__ = [
     'image_processor',
     'problem_solver',
+    'model_router',
     'encode_image',
     'convert_formula_format',
     'save_solution'
@@ -0,0 +1,237 @@
+"""上游流式响应的录制与回放模块"""
+
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+
+# 录制模式
+CASSETTE_OFF = "off"
+CASSETTE_RECORD = "record"
+CASSETTE_REPLAY = "replay"
+
+# 录制文件格式版本
+CASSETTE_VERSION = 2
+# 时间间隔保留的小数位数（毫秒精度）
+DELAY_DIGITS = 3
+
+class CassetteError(Exception):
+    """回放失败：没有对应的录制，或重现录制时上游返回的错误"""
+
+def cassette_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """
+    计算请求的录制键：模型、消息与请求参数完全相同的请求对应同一份录制
+
+    Args:
+        model: 模型名称
+        messages: 消息列表
+        params: 其他请求参数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CassetteStore:
+    """
+    录制与回放上游流式响应
+
+    录制模式下记录每次流式请求的增量文本及其时间间隔（首块相对请求开始，
+    之后相对上一块），以gzip压缩的JSON保存；回放模式下按录制键读取，
+    以原速、加速或零延迟重新产出，使求解流程无需访问真实模型即可复现。
+
+    集成求解的多个样本等完全相同的请求按发起顺序编号，分别录制和回放。
+    """
+    def __init__(self, mode: str, directory: str, speed: float):
+        """
+        初始化
+
+        Args:
+            mode: off / record / replay
+            directory: 录制文件目录
+            speed: 回放速度倍数（1为原速，0为不等待）
+        """
+        self.mode = mode
+        self.directory = directory
+        self.speed = speed
+        # 每个录制键已发起的请求数
+        self._sequence: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == CASSETTE_RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == CASSETTE_REPLAY
+
+    def _path(self, key: str, index: int) -> str:
+        """录制文件路径"""
+        return os.path.join(self.directory, f"{key}-{index}.json.gz")
+
+    def _next_index(self, key: str) -> int:
+        """为录制键分配下一个请求序号"""
+        with self._lock:
+            index = self._sequence[key]
+            self._sequence[key] += 1
+        return index
+
+    def record(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        stream: Iterator[str],
+        start_time: float
+    ) -> Iterator[str]:
+        """
+        透传流式响应并录制
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            params: 其他请求参数
+            stream: 上游增量文本迭代器
+            start_time: 请求开始时刻（time.monotonic）
+
+        Returns:
+            Iterator[str]: 增量文本迭代器
+        """
+        key = cassette_key(model, messages, params)
+        # 在发起请求时分配序号，使序号与请求顺序一致
+        return self._record(key, self._next_index(key), model, stream, start_time)
+
+    def _record(
+        self,
+        key: str,
+        index: int,
+        model: str,
+        stream: Iterator[str],
+        start_time: float
+    ) -> Iterator[str]:
+        """透传增量文本，结束后写出录制文件"""
+        chunks = []
+        last = start_time
+        error = None
+        completed = False
+        try:
+            for content in stream:
+                now = time.monotonic()
+                chunks.append([round(now - last, DELAY_DIGITS), content])
+                last = now
+                yield content
+            completed = True
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # 调用方提前结束（如集成求解取消落后样本）时只保存已收到的部分，并标记为截断
+            self._write(key, index, {
+                "version": CASSETTE_VERSION,
+                "model": model,
+                "recorded_at": time.time(),
+                "chunks": chunks,
+                "tail": round(time.monotonic() - last, DELAY_DIGITS),
+                "error": error,
+                "truncated": not completed and error is None,
+            })
+
+    def _write(self, key: str, index: int, cassette: Dict[str, Any]) -> None:
+        """原子写入录制文件"""
+        path = self._path(key, index)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                json.dump(cassette, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.log_error(f"保存录制文件出错：{str(e)}")
+
+    def load(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        index: int = 0
+    ) -> Dict[str, Any]:
+        """
+        读取请求对应的录制
+
+        录制的同键请求少于回放时的请求数时，按序号循环复用已有的录制。
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            params: 其他请求参数
+            index: 同键请求的序号
+
+        Raises:
+            CassetteError: 没有找到录制文件
+        """
+        key = cassette_key(model, messages, params)
+        path = self._path(key, index)
+        if not os.path.exists(path):
+            count = 0
+            while os.path.exists(self._path(key, count)):
+                count += 1
+            if not count:
+                raise CassetteError(f"没有找到模型 {model} 对应的录制响应（{os.path.basename(path)}）")
+            path = self._path(key, index % count)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def replay(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        speed: Optional[float] = None
+    ) -> Iterator[str]:
+        """
+        回放录制的流式响应
+
+        与真实请求一致，首个内容块之前的错误（没有录制）在调用时立即抛出。
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            params: 其他请求参数
+            speed: 回放速度倍数，默认使用配置值
+
+        Returns:
+            Iterator[str]: 增量文本迭代器
+        """
+        key = cassette_key(model, messages, params)
+        cassette = self.load(model, messages, params, self._next_index(key))
+        return self._play(cassette, self.speed if speed is None else speed)
+
+    @staticmethod
+    def _play(cassette: Dict[str, Any], speed: float) -> Iterator[str]:
+        """按录制的时间间隔产出增量文本，最后重现流结束前的等待和录制时的错误或截断"""
+        for delay, content in cassette["chunks"]:
+            if speed > 0 and delay > 0:
+                time.sleep(delay / speed)
+            yield content
+        tail = cassette.get("tail", 0)
+        if speed > 0 and tail > 0:
+            time.sleep(tail / speed)
+        if cassette.get("error"):
+            raise CassetteError(cassette["error"])
+        if cassette.get("truncated"):
+            raise CassetteError("录制在此处被调用方提前结束，没有后续响应")
+
+# 创建全局录制回放实例
+cassette_store = CassetteStore(settings.cassette_mode, settings.cassette_dir, settings.cassette_speed)
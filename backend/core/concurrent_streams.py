@@ -0,0 +1,117 @@
+"""多路模型流并发运行模块"""
+
+import queue
+import threading
+from typing import Any, Dict, Hashable, Iterator, List, Set, Tuple
+
+from backend.core.router import StreamCancel, model_router
+
+# 事件类型
+EVENT_CHUNK = "chunk"
+EVENT_DONE = "done"
+EVENT_ERROR = "error"
+EVENT_CANCELLED = "cancelled"
+
+class ConcurrentStreams:
+    """
+    在后台线程中并发运行多路流式请求，并通过队列按到达顺序汇总增量文本
+
+    取消一路请求时立即中断其底层连接，并视为已结束：即使上游迟迟没有响应，
+    events()也不再等待该路，调用方可以及时释放调度通道。
+    """
+    def __init__(self, router=model_router):
+        """
+        初始化
+
+        Args:
+            router: 模型路由器
+        """
+        self.router = router
+        self._queue: "queue.Queue[Tuple[Hashable, str, Any]]" = queue.Queue()
+        self._cancels: Dict[Hashable, StreamCancel] = {}
+        self._finished: Set[Hashable] = set()
+        self._running = 0
+
+    def start(
+        self,
+        key: Hashable,
+        model: str,
+        messages: List[Dict[str, Any]],
+        **kwargs
+    ) -> None:
+        """
+        启动一路流式请求
+
+        Args:
+            key: 该路请求的标识
+            model: 模型名称
+            messages: 消息列表
+            **kwargs: 其他请求参数
+        """
+        cancel = StreamCancel()
+        self._cancels[key] = cancel
+        self._running += 1
+        threading.Thread(
+            target=self._run,
+            args=(key, model, messages, kwargs, cancel),
+            name=f"stream-{key}",
+            daemon=True
+        ).start()
+
+    def _run(
+        self,
+        key: Hashable,
+        model: str,
+        messages: List[Dict[str, Any]],
+        kwargs: Dict[str, Any],
+        cancel: StreamCancel
+    ) -> None:
+        """后台线程：读取流并写入队列，被取消时立即关闭上游连接"""
+        stream = None
+        try:
+            stream = self.router.stream_content(model, messages, cancel=cancel, **kwargs)
+            for content in stream:
+                if cancel.cancelled:
+                    break
+                self._queue.put((key, EVENT_CHUNK, content))
+            self._queue.put((key, EVENT_CANCELLED if cancel.cancelled else EVENT_DONE, None))
+        except Exception as e:
+            self._queue.put((key, EVENT_CANCELLED if cancel.cancelled else EVENT_ERROR, e))
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+    def cancel(self, key: Hashable) -> None:
+        """取消一路请求：中断底层连接，并立即发出cancelled事件"""
+        cancel = self._cancels.get(key)
+        if cancel is None or cancel.cancelled:
+            return
+        cancel.cancel()
+        self._queue.put((key, EVENT_CANCELLED, None))
+
+    def cancel_all(self) -> None:
+        """取消全部请求"""
+        for key in list(self._cancels):
+            self.cancel(key)
+
+    def events(self) -> Iterator[Tuple[Hashable, str, Any]]:
+        """
+        按到达顺序输出事件，直到所有请求结束
+
+        Yields:
+            Tuple[Hashable, str, Any]: (请求标识, 事件类型, 增量文本或异常)
+        """
+        try:
+            while self._running:
+                key, kind, payload = self._queue.get()
+                # 已结束（如已取消）的请求之后到达的事件直接丢弃
+                if key in self._finished:
+                    continue
+                if kind != EVENT_CHUNK:
+                    self._finished.add(key)
+                    self._running -= 1
+                yield key, kind, payload
+        finally:
+            # 调用方提前结束（例如客户端断开）时取消剩余请求
+            self.cancel_all()
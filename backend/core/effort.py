@@ -0,0 +1,123 @@
+"""按延迟预算选择推理强度的模块"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.metrics import metrics
+from backend.core.scheduler import lane_scheduler
+from backend.tracing import NULL_TRACE
+
+# 推理强度，从高到低
+EFFORT_LEVELS = ("high", "medium", "low")
+# 尚无统计数据时，各档耗时相对于通道平均服务时间的比例
+DEFAULT_EFFORT_RATIO = {"high": 1.0, "medium": 0.6, "low": 0.35}
+# 耗时均值与平均偏差的指数加权平滑系数
+EFFORT_EWMA_ALPHA = 0.2
+# 以“均值 + 该倍数 × 平均偏差”近似p95
+P95_DEVIATIONS = 2.0
+# 尚无统计数据时假定的平均偏差（相对均值的比例）
+INITIAL_DEVIATION_RATIO = 0.25
+
+class EffortPolicy:
+    """
+    推理强度策略
+
+    以模型参数档案中的推理强度为上限，结合所在通道的排队情况（新请求的预计等待时间）
+    和各档的历史耗时估算p95完成时间；超出目标时按 high → medium → low 逐级降低。
+    """
+    def __init__(self, target_p95: float):
+        """
+        初始化
+
+        Args:
+            target_p95: 目标p95完成时间（秒），0表示始终使用档案中的推理强度
+        """
+        self.target_p95 = target_p95
+        # {(模型, 推理强度): [耗时均值, 平均偏差]}
+        self._stats: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def _expected(self, model: str, effort: str, lane: str) -> float:
+        """估算指定推理强度的p95求解耗时"""
+        with self._lock:
+            stats = self._stats.get((model, effort))
+            if stats is not None:
+                mean, deviation = stats
+                return mean + P95_DEVIATIONS * deviation
+        service = lane_scheduler.get_status()[lane]["service_seconds"]
+        return service * DEFAULT_EFFORT_RATIO[effort] * (1 + P95_DEVIATIONS * INITIAL_DEVIATION_RATIO)
+
+    def choose(self, model: str, is_complex_mode: bool, trace: Any = NULL_TRACE) -> Optional[str]:
+        """
+        为一次求解请求选择推理强度，并记录所选结果
+
+        Args:
+            model: 求解模型
+            is_complex_mode: 是否为复杂模式（简单模式不发送reasoning_effort，由服务端默认）
+            trace: 请求链路
+
+        Returns:
+            Optional[str]: 推理强度，模型不支持或简单模式时返回None
+        """
+        ceiling = settings.get_model_profile(model)["reasoning_effort"]
+        if not ceiling or not is_complex_mode:
+            return None
+
+        effort = ceiling
+        if self.target_p95 > 0:
+            lane = lane_scheduler.lane_for(is_complex_mode)
+            backlog = lane_scheduler.estimate_wait(lane)
+            levels = EFFORT_LEVELS[EFFORT_LEVELS.index(ceiling):]
+            for effort in levels:
+                predicted = backlog + self._expected(model, effort, lane)
+                if predicted <= self.target_p95:
+                    break
+            if effort != ceiling:
+                logger.logger.info(
+                    f"{trace.log_prefix}{model} 推理强度降为 {effort}"
+                    f"（排队预计 {backlog:.0f}s，预计p95 {predicted:.0f}s，目标 {self.target_p95:.0f}s）"
+                )
+                metrics.incr("effort.downgraded")
+
+        metrics.incr(f"effort.{effort}")
+        trace.root.set_attribute("reasoning_effort", effort)
+        return effort
+
+    def observe(self, model: str, effort: Optional[str], seconds: float) -> None:
+        """
+        记录一次求解的耗时
+
+        Args:
+            model: 求解模型
+            effort: 使用的推理强度（None时不记录）
+            seconds: 从发起请求到完成的秒数
+        """
+        if not effort:
+            return
+        with self._lock:
+            stats = self._stats.get((model, effort))
+            if stats is None:
+                self._stats[(model, effort)] = [seconds, seconds * INITIAL_DEVIATION_RATIO]
+                return
+            mean, deviation = stats
+            stats[1] = deviation + EFFORT_EWMA_ALPHA * (abs(seconds - mean) - deviation)
+            stats[0] = mean + EFFORT_EWMA_ALPHA * (seconds - mean)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取目标及各模型、各档推理强度的耗时统计"""
+        with self._lock:
+            return {
+                "target_p95": self.target_p95,
+                "models": {
+                    f"{model}:{effort}": {
+                        "mean_seconds": round(mean, 2),
+                        "p95_seconds": round(mean + P95_DEVIATIONS * deviation, 2),
+                    }
+                    for (model, effort), (mean, deviation) in self._stats.items()
+                },
+            }
+
+# 创建全局推理强度策略实例
+effort_policy = EffortPolicy(settings.effort_target_p95)
@@ -0,0 +1,291 @@
+"""解答批量导出模块：流式生成zip包"""
+
+import os
+import re
+import time
+import zlib
+import struct
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, date
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Set, Tuple
+
+from backend.config.settings import settings
+
+# 解答文件名格式：solution_YYYYmmdd_HHMMSS[_xxxxxx].md
+SOLUTION_PATTERN = re.compile(r"^solution_(\d{8}_\d{6}(?:_[0-9a-f]{6})?)\.md$")
+# 解答中的图片引用
+IMAGE_REF_PATTERN = re.compile(r"\./(image_[\w]+\.png)")
+
+# zip格式常量
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_UTF8_FLAG = 0x0800
+ZIP64_LIMIT = 0xFFFFFFFF
+
+@dataclass
+class SolutionRecord:
+    """已保存的解答"""
+    solution_id: str
+    created_at: datetime
+    path: str
+
+def list_solutions(
+    output_dir: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    ids: Optional[Iterable[str]] = None
+) -> List[SolutionRecord]:
+    """
+    按日期范围或ID列表筛选已保存的解答
+
+    Args:
+        output_dir: 解答保存目录
+        start: 起始日期（含）
+        end: 结束日期（含）
+        ids: 解答ID列表（文件名中 solution_ 之后的部分）
+
+    Returns:
+        List[SolutionRecord]: 按时间排序的解答
+    """
+    wanted = set(ids) if ids else None
+    records = []
+    if not os.path.isdir(output_dir):
+        return records
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            match = SOLUTION_PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            solution_id = match.group(1)
+            created_at = datetime.strptime(solution_id[:15], "%Y%m%d_%H%M%S")
+            if wanted is not None and solution_id not in wanted:
+                continue
+            if start and created_at.date() < start:
+                continue
+            if end and created_at.date() > end:
+                continue
+            records.append(SolutionRecord(solution_id, created_at, entry.path))
+    records.sort(key=lambda record: record.solution_id)
+    return records
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """转换为zip使用的DOS日期和时间"""
+    moment = time.localtime(max(timestamp, 315532800))  # zip不支持1980年以前
+    dos_time = (moment.tm_hour << 11) | (moment.tm_min << 5) | (moment.tm_sec // 2)
+    dos_date = ((moment.tm_year - 1980) << 9) | (moment.tm_mon << 5) | moment.tm_mday
+    return dos_time, dos_date
+
+@dataclass
+class _ZipEntry:
+    """已压缩的zip条目"""
+    name: bytes
+    method: int
+    crc: int
+    compressed: bytes
+    size: int
+    mtime: float
+
+def _compress_entry(name: str, data: bytes, method: int, mtime: float, level: int) -> _ZipEntry:
+    """压缩单个条目（zlib在压缩时释放GIL，可在线程池中并行执行）"""
+    crc = zlib.crc32(data)
+    if method == ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+    else:
+        compressed = data
+    return _ZipEntry(name.encode("utf-8"), method, crc, compressed, len(data), mtime)
+
+class StreamingZipWriter:
+    """
+    只追加、不回写的zip写入器
+
+    每个条目在写出前已完成压缩，因此本地文件头中即可写入CRC和大小，
+    输出可以直接发送给客户端而无需可寻址的文件；偏移超过4GB时使用zip64扩展。
+    """
+    def __init__(self):
+        """初始化写入器"""
+        self.offset = 0
+        self.central_directory: List[bytes] = []
+
+    def entry(self, entry: _ZipEntry) -> bytes:
+        """
+        生成一个条目的本地文件头和数据
+
+        Args:
+            entry: 已压缩的条目
+
+        Returns:
+            bytes: 待输出的数据
+        """
+        if entry.size >= ZIP64_LIMIT or len(entry.compressed) >= ZIP64_LIMIT:
+            raise ValueError(f"单个文件过大：{entry.name.decode('utf-8')}")
+        dos_time, dos_date = _dos_datetime(entry.mtime)
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, ZIP_UTF8_FLAG, entry.method,
+            dos_time, dos_date, entry.crc, len(entry.compressed), entry.size,
+            len(entry.name), 0
+        ) + entry.name
+
+        # 中央目录记录（偏移超过4GB时写入zip64扩展字段）
+        extra = b""
+        offset = self.offset
+        version = 20
+        if offset >= ZIP64_LIMIT:
+            extra = struct.pack("<HHQ", 0x0001, 8, offset)
+            offset = ZIP64_LIMIT
+            version = 45
+        self.central_directory.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, ZIP_UTF8_FLAG,
+            entry.method, dos_time, dos_date, entry.crc, len(entry.compressed),
+            entry.size, len(entry.name), len(extra), 0, 0, 0, 0, offset
+        ) + entry.name + extra)
+
+        self.offset += len(header) + len(entry.compressed)
+        return header + entry.compressed
+
+    def close(self) -> bytes:
+        """
+        生成中央目录和结束记录
+
+        Returns:
+            bytes: 待输出的数据
+        """
+        directory = b"".join(self.central_directory)
+        directory_offset = self.offset
+        count = len(self.central_directory)
+        tail = b""
+        if count >= 0xFFFF or directory_offset >= ZIP64_LIMIT or len(directory) >= ZIP64_LIMIT:
+            zip64_offset = directory_offset + len(directory)
+            tail += struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                count, count, len(directory), directory_offset
+            )
+            tail += struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1)
+        tail += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(len(directory), ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0
+        )
+        return directory + tail
+
+class SolutionExporter:
+    """解答批量导出类：并行压缩、按内容去重图片、以有限内存流式输出zip"""
+    def __init__(self, workers: int, window: int, level: int):
+        """
+        初始化导出器
+
+        Args:
+            workers: 并行压缩线程数
+            window: 同时在途（读取并压缩中）的条目数上限
+            level: deflate压缩级别
+        """
+        self.workers = max(workers, 1)
+        self.window = max(window, 1)
+        self.level = level
+
+    def _iter_files(
+        self,
+        records: List[SolutionRecord],
+        output_dir: str
+    ) -> Iterator[Tuple[str, Callable[[], bytes], int, float]]:
+        """
+        依次列出需要写入的文件
+
+        Yields:
+            Tuple[str, Callable[[], bytes], int, float]: (包内路径, 读取数据的函数, 压缩方式, 修改时间)
+        """
+        seen_images: Set[str] = set()
+        index_lines = []
+        for record in records:
+            with open(record.path, "r", encoding="utf-8") as f:
+                markdown = f.read()
+
+            # 图片按内容哈希去重，引用改写为共享的images/目录
+            replacements = {}
+            for image_name in set(IMAGE_REF_PATTERN.findall(markdown)):
+                image_path = os.path.join(output_dir, image_name)
+                if not os.path.isfile(image_path):
+                    continue
+                with open(image_path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:32]
+                archive_name = f"images/{digest}.png"
+                replacements[f"./{image_name}"] = f"../../{archive_name}"
+                if digest not in seen_images:
+                    seen_images.add(digest)
+                    # PNG已经是压缩格式，直接存储以节省CPU
+                    yield (archive_name, lambda path=image_path: _read_bytes(path),
+                           ZIP_STORED, os.path.getmtime(image_path))
+
+            for old, new in replacements.items():
+                markdown = markdown.replace(old, new)
+            mtime = os.path.getmtime(record.path)
+            folder = f"solutions/{record.solution_id}"
+            yield (f"{folder}/solution.md", lambda data=markdown: data.encode("utf-8"),
+                   ZIP_DEFLATED, mtime)
+
+            html_path = record.path[:-3] + ".html"
+            if os.path.isfile(html_path):
+                def read_html(path=html_path, replacements=replacements) -> bytes:
+                    content = _read_bytes(path).decode("utf-8")
+                    for old, new in replacements.items():
+                        content = content.replace(old, new)
+                    return content.encode("utf-8")
+                yield f"{folder}/solution.html", read_html, ZIP_DEFLATED, mtime
+
+            index_lines.append(
+                f"- [{record.created_at:%Y-%m-%d %H:%M:%S}](./{folder}/solution.md)\n"
+            )
+
+        index = "# 解答导出\n\n" + "".join(index_lines)
+        yield "index.md", lambda: index.encode("utf-8"), ZIP_DEFLATED, time.time()
+
+    def stream(
+        self,
+        records: List[SolutionRecord],
+        output_dir: Optional[str] = None
+    ) -> Iterator[bytes]:
+        """
+        流式生成包含所选解答的zip包
+
+        条目在线程池中并行读取和压缩，按原顺序输出；在途条目数受窗口限制，
+        内存占用与导出总量无关。
+
+        Args:
+            records: 要导出的解答
+            output_dir: 解答保存目录
+
+        Yields:
+            bytes: zip数据块
+        """
+        output_dir = output_dir or settings.solutions_dir
+        writer = StreamingZipWriter()
+        pending: Deque = deque()
+
+        def load_and_compress(name: str, read: Callable[[], bytes], method: int, mtime: float):
+            return _compress_entry(name, read(), method, mtime, self.level)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export") as executor:
+            try:
+                for name, read, method, mtime in self._iter_files(records, output_dir):
+                    pending.append(executor.submit(load_and_compress, name, read, method, mtime))
+                    while len(pending) >= self.window:
+                        yield writer.entry(pending.popleft().result())
+                while pending:
+                    yield writer.entry(pending.popleft().result())
+                yield writer.close()
+            finally:
+                # 客户端中途断开时丢弃尚未执行的任务
+                for future in pending:
+                    future.cancel()
+
+def _read_bytes(path: str) -> bytes:
+    """读取文件内容"""
+    with open(path, "rb") as f:
+        return f.read()
+
+# 创建全局导出器实例
+solution_exporter = SolutionExporter(
+    settings.export_workers, settings.export_window, settings.export_compress_level
+)
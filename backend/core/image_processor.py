@@ -19,42 +19,63 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Generator, Tuple, Any, Optional
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, List, Tuple, Any, Optional
 
 from backend.config.settings import settings
 from backend.logger.log_config import logger
-from backend.core.utils import encode_image
+from backend.core.utils import encode_image_cached, normalize_images
+from backend.core.router import model_router
+from backend.tracing import NULL_TRACE
 from prompts.image_prompts import IMAGE_SYSTEM_PROMPT, get_image_prompt
 
 class ImageProcessor:
     """图片处理类"""
     def __init__(self):
-        """初始化OpenAI客户端"""
-        self.client = OpenAI(
-            base_url=settings.api_base_url,
-            api_key=settings.api_key,
+        """初始化模型路由和图片编码线程池"""
+        self.router = model_router
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.image_encode_workers,
+            thread_name_prefix="image-encode"
         )
 
+    def encode_images(self, images: List[Any]) -> List[Tuple[str, str]]:
+        """
+        并行解码、预处理并编码多张图片（已编码过的图片直接命中缓存）
+        
+        Args:
+            images: 图片列表
+            
+        Returns:
+            List[Tuple[str, str]]: 按原顺序排列的(MIME类型, base64数据)
+        """
+        if len(images) == 1:
+            return [encode_image_cached(images[0])]
+        return list(self.executor.map(encode_image_cached, images))
+
     def get_image_description(
         self,
         text_input: str,
         image: Any,
-        is_complex_mode: bool = False
+        is_complex_mode: bool = False,
+        trace: Any = NULL_TRACE
     ) -> Generator[str | Tuple[str, str], None, None]:
         """
         获取图片描述（流式输出）
         
         Args:
             text_input: 题目文本
-            image: 题目图片
+            image: 题目图片，单张或多张（文件路径、原始字节或PIL Image对象）
             is_complex_mode: 是否使用复杂模式
+            trace: 请求链路（用于记录各阶段耗时）
             
         Yields:
             str | Tuple[str, str]: 描述内容或(描述内容, 日志)
         """
         # 编码图片
-        base64_image = encode_image(image)
+        images = normalize_images(image)
+        with trace.span("image.encode", images=len(images)):
+            encoded_images = self.encode_images(images)
         
         # 获取对应模式的模型
         image_model, _ = settings.get_model_info(is_complex_mode)
@@ -70,45 +91,47 @@ class ImageProcessor:
                 "content": [
                     {
                         "type": "text",
-                        "text": get_image_prompt(text_input)
-                    },
+                        "text": get_image_prompt(text_input, len(images))
+                    }
+                ] + [
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
+                            "url": f"data:{image_mime};base64,{base64_image}"
                         }
                     }
+                    for image_mime, base64_image in encoded_images
                 ]
             }
         ]
         
+        ttft_span = trace.span("image.ttft", model=image_model)
+        stream_span = None
         try:
             # 创建流式请求
-            stream = self.client.chat.completions.create(
-                model=image_model,
-                messages=messages,
-                stream=True,
-                temperature=0.01
+            # 与求解请求一样按模型参数档案发送参数（如推理模型不支持temperature）
+            stream = self.router.stream_content(
+                image_model,
+                messages,
+                **settings.get_request_params(image_model)
             )
             
             # 处理流式响应
             description = []
             collected_chunks = []
             
-            for chunk in stream:
-                if (hasattr(chunk, 'choices') and
-                    chunk.choices and
-                    hasattr(chunk.choices[0], 'delta') and
-                    hasattr(chunk.choices[0].delta, 'content') and
-                    chunk.choices[0].delta.content is not None):
-                    
-                    content = chunk.choices[0].delta.content
-                    collected_chunks.append(content)
-                    description.append(content)
-                    yield "".join(description)
+            for content in stream:
+                if stream_span is None:
+                    ttft_span.end()
+                    stream_span = trace.span("image.stream", model=image_model)
+                collected_chunks.append(content)
+                description.append(content)
+                yield "".join(description)
             
             if not collected_chunks:
                 raise Exception("未收到模型响应")
+            stream_span.set_attribute("chunks", len(collected_chunks))
+            stream_span.end()
                 
             # 生成最终描述和日志
             final_description = "".join(description)
@@ -116,9 +139,12 @@ class ImageProcessor:
             yield final_description, log_str
             
         except Exception as e:
+            ttft_span.end(str(e))
+            if stream_span is not None:
+                stream_span.end(str(e))
             error_msg = f"图片处理出错：{str(e)}"
             log_str = logger.log_api_interaction(image_model, messages, None, error_msg)
-            logger.log_error(str(e), image_model)
+            logger.log_error(f"{trace.log_prefix}{str(e)}", image_model)
             yield error_msg, log_str
 
 # 创建全局图片处理器实例
@@ -0,0 +1,312 @@
+"""整套习题扫描件导入模块"""
+
+import io
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
+from PIL import Image, ImageSequence
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.utils import (
+    ImageTooLarge, check_image_limits, convert_formula_format, estimate_tokens
+)
+from backend.core.solver import problem_solver
+from backend.core.scheduler import lane_scheduler
+from backend.core.mode_classifier import ERROR_PATTERN
+
+# 计算投影时页面缩放到的最大宽度（像素）
+PROFILE_MAX_WIDTH = 1000
+# 灰度低于该值视为墨迹
+INK_THRESHOLD = 160
+# 行/列墨迹占比（0-255）不超过该值视为空白
+BLANK_LEVEL = 1
+# 裁剪区域四周保留的边距（像素）
+REGION_MARGIN = 12
+# 压缩包内支持的图片格式
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp')
+
+def _iter_frames(image: Image.Image, name: str) -> Iterator[Image.Image]:
+    """逐帧检查像素数后再解码，超出 IMAGE_MAX_PIXELS 的页面不会被解码"""
+    for frame in ImageSequence.Iterator(image):
+        try:
+            check_image_limits(frame)
+        except ImageTooLarge as e:
+            raise ImageTooLarge(f"{name}：{str(e)}")
+        yield frame.convert("RGB")
+
+def load_pages(path: str) -> Iterator[Image.Image]:
+    """
+    逐页读取扫描件（压缩包内的图片先按解压后大小检查，各页先按像素数检查，再解码）
+
+    Args:
+        path: 多页TIFF（或任意图片）文件路径，或包含页面图片的zip文件路径
+
+    Yields:
+        Image.Image: RGB格式的页面图片
+
+    Raises:
+        ImageTooLarge: 压缩包内图片超出 IMAGE_MAX_BYTES，或页面超出 IMAGE_MAX_PIXELS
+    """
+    try:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                entries = sorted(
+                    (info for info in archive.infolist()
+                     if info.filename.lower().endswith(IMAGE_EXTENSIONS)
+                     and not info.filename.startswith('__MACOSX')),
+                    key=lambda info: info.filename
+                )
+                for info in entries:
+                    if settings.image_max_bytes and info.file_size > settings.image_max_bytes:
+                        raise ImageTooLarge(
+                            f"{info.filename}：图片文件过大（{info.file_size / 1024 / 1024:.1f} MB），"
+                            f"上限为 {settings.image_max_bytes / 1024 / 1024:.0f} MB"
+                        )
+                    with Image.open(io.BytesIO(archive.read(info))) as image:
+                        yield from _iter_frames(image, info.filename)
+            return
+
+        with Image.open(path) as image:
+            yield from _iter_frames(image, os.path.basename(path))
+    except Image.DecompressionBombError:
+        raise ImageTooLarge("图片像素数过多")
+
+def _profile(ink: Image.Image, axis: str) -> List[int]:
+    """
+    计算墨迹投影
+
+    Args:
+        ink: 墨迹为255、背景为0的灰度图
+        axis: "rows" 为水平投影（每行），"cols" 为垂直投影（每列）
+
+    Returns:
+        List[int]: 每行/列的平均墨迹量（0-255）
+    """
+    width, height = ink.size
+    size = (1, height) if axis == "rows" else (width, 1)
+    return list(ink.resize(size, Image.BOX).getdata())
+
+def _ink_span(profile: List[int]) -> Optional[Tuple[int, int]]:
+    """返回投影中首个和最后一个有墨迹的位置"""
+    marked = [index for index, value in enumerate(profile) if value > BLANK_LEVEL]
+    if not marked:
+        return None
+    return marked[0], marked[-1] + 1
+
+def split_problems(
+    page: Image.Image,
+    min_gap_ratio: float = 0.02,
+    min_region_ratio: float = 0.04
+) -> List[Image.Image]:
+    """
+    按空白投影将页面切分为题目区域
+
+    在水平投影中寻找足够高的空白带作为题目分界；过矮的区域并入下一区域，
+    最后按垂直投影裁掉左右空白。
+
+    Args:
+        page: 页面图片
+        min_gap_ratio: 作为分界的最小空白高度（占页面高度的比例）
+        min_region_ratio: 单个题目区域的最小高度（占页面高度的比例）
+
+    Returns:
+        List[Image.Image]: 按从上到下顺序排列的题目区域
+    """
+    scale = min(1.0, PROFILE_MAX_WIDTH / page.width)
+    small = page.convert("L")
+    if scale < 1.0:
+        small = small.resize((int(page.width * scale), max(int(page.height * scale), 1)))
+    ink = small.point(lambda value: 255 if value < INK_THRESHOLD else 0)
+    rows = _profile(ink, "rows")
+    height = len(rows)
+    min_gap = max(int(height * min_gap_ratio), 1)
+    min_region = int(height * min_region_ratio)
+
+    # 寻找题目区域（被足够高的空白带隔开的墨迹段）
+    bands = []
+    start = None
+    blank_run = 0
+    for index, value in enumerate(rows):
+        if value > BLANK_LEVEL:
+            if start is None:
+                start = index
+            blank_run = 0
+        elif start is not None:
+            blank_run += 1
+            if blank_run >= min_gap:
+                bands.append((start, index - blank_run + 1))
+                start = None
+                blank_run = 0
+    if start is not None:
+        bands.append((start, height - blank_run))
+
+    # 合并过矮的区域（例如单独的页眉行或题号）
+    merged = []
+    for band in bands:
+        if merged and merged[-1][1] - merged[-1][0] < min_region:
+            merged[-1] = (merged[-1][0], band[1])
+        else:
+            merged.append(band)
+    if len(merged) > 1 and merged[-1][1] - merged[-1][0] < min_region:
+        last = merged.pop()
+        merged[-1] = (merged[-1][0], last[1])
+
+    regions = []
+    for top, bottom in merged:
+        cols = _profile(ink.crop((0, top, ink.width, bottom)), "cols")
+        span = _ink_span(cols)
+        if span is None:
+            continue
+        left, right = span
+        box = (
+            max(int(left / scale) - REGION_MARGIN, 0),
+            max(int(top / scale) - REGION_MARGIN, 0),
+            min(int(right / scale) + REGION_MARGIN, page.width),
+            min(int(bottom / scale) + REGION_MARGIN, page.height)
+        )
+        regions.append(page.crop(box))
+    return regions
+
+def _to_png(image: Image.Image) -> bytes:
+    """将图片编码为PNG字节"""
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+class ProblemSetIngestor:
+    """整套习题导入与批量求解类"""
+    def __init__(self, concurrency: int):
+        """
+        初始化导入器
+
+        Args:
+            concurrency: 同时求解的题目数量上限
+        """
+        self.concurrency = max(concurrency, 1)
+
+    @staticmethod
+    def _solve_region(image_bytes: bytes, is_complex_mode: bool, username: str = "") -> str:
+        """求解单个题目区域（经过调度通道，通道已满时等待），返回最终解答"""
+        text = "请识别并求解图片中的题目。"
+        solution = ""
+        ticket = lane_scheduler.enter_when_available(lane_scheduler.lane_for(is_complex_mode), username)
+        try:
+            for step in problem_solver.solve_problem(text, [image_bytes], is_complex_mode):
+                output = step[0] if isinstance(step, tuple) else step
+                if output:
+                    solution = output
+        finally:
+            lane_scheduler.release(ticket, estimate_tokens(text) + estimate_tokens(solution))
+        return solution
+
+    @staticmethod
+    def _format_progress(
+        pages: int,
+        found: int,
+        solved: int,
+        failed: int,
+        start_time: float,
+        finished: bool = False
+    ) -> str:
+        """生成进度信息"""
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        state = "处理完成" if finished else "正在处理"
+        return (
+            f"**{state}**：已读取 {pages} 页，识别 {found} 道题，"
+            f"完成 {solved} 道，失败 {failed} 道\n\n"
+            f"耗时 {elapsed:.1f} 秒，吞吐量 {pages / elapsed * 60:.1f} 页/分钟、"
+            f"{solved / elapsed * 60:.1f} 题/分钟"
+        )
+
+    def process(
+        self,
+        path: str,
+        is_complex_mode: bool = False,
+        output_dir: Optional[str] = None,
+        username: str = ""
+    ) -> Generator[Tuple[str, Optional[str]], None, None]:
+        """
+        切分扫描件并以有限并发批量求解，结果汇总到一个zip包
+
+        Args:
+            path: 扫描件路径（多页TIFF或zip）
+            is_complex_mode: 是否使用复杂模式
+            output_dir: 输出目录
+            username: 提交用户（各题按该用户进入调度通道）
+
+        Yields:
+            Tuple[str, Optional[str]]: (进度信息, 完成后的zip路径)
+        """
+        output_dir = output_dir or settings.solutions_dir
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        zip_path = os.path.join(output_dir, f"problemset_{timestamp}.zip")
+
+        start_time = time.monotonic()
+        pages = found = solved = failed = 0
+        index_lines = []
+        pending: Dict[Future, str] = {}
+
+        def collect(done: set, archive: zipfile.ZipFile) -> None:
+            nonlocal solved, failed
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    solution = future.result()
+                    # 求解器出错时输出错误信息而不抛出异常
+                    if ERROR_PATTERN.search(solution) or not solution.strip():
+                        failed += 1
+                    else:
+                        solved += 1
+                except Exception as e:
+                    logger.log_error(f"题目 {name} 求解出错：{str(e)}")
+                    solution = f"求解出错：{str(e)}"
+                    failed += 1
+                archive.writestr(
+                    f"{name}.md",
+                    f"# {name}\n\n![题目图片](./{name}.png)\n\n{convert_formula_format(solution)}"
+                )
+                index_lines.append(f"- [{name}](./{name}.md)\n")
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest")
+        try:
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for page in load_pages(path):
+                    pages += 1
+                    regions = split_problems(
+                        page, settings.ingest_min_gap_ratio, settings.ingest_min_region_ratio
+                    )
+                    for number, region in enumerate(regions, start=1):
+                        found += 1
+                        name = f"problem_p{pages:03d}_{number:02d}"
+                        image_bytes = _to_png(region)
+                        archive.writestr(f"{name}.png", image_bytes)
+
+                        # 限制在途任务数量，避免一次性读入全部页面
+                        while len(pending) >= self.concurrency * 2:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            collect(done, archive)
+                            yield self._format_progress(pages, found, solved, failed, start_time), None
+                        pending[executor.submit(self._solve_region, image_bytes, is_complex_mode, username)] = name
+                    yield self._format_progress(pages, found, solved, failed, start_time), None
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done, archive)
+                    yield self._format_progress(pages, found, solved, failed, start_time), None
+
+                archive.writestr("index.md", "# 习题集求解结果\n\n" + "".join(sorted(index_lines)))
+        finally:
+            # 界面关闭或出错时取消尚未开始的题目，不再等待它们执行
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        logger.logger.info(f"习题集处理完成：{pages} 页，{found} 道题，{failed} 道失败")
+        yield self._format_progress(pages, found, solved, failed, start_time, finished=True), zip_path
+
+# 创建全局导入器实例
+problem_set_ingestor = ProblemSetIngestor(settings.ingest_concurrency)
@@ -0,0 +1,90 @@
+"""运行指标模块"""
+
+import threading
+from collections import defaultdict
+from typing import Dict
+
+from backend.config.settings import settings
+from backend.core.shared_state import shared_state
+
+# 共享存储中指标计数器的键前缀
+METRICS_PREFIX = "metrics:"
+
+class Metrics:
+    """进程内缓冲、定期汇总到共享存储的运行指标"""
+    def __init__(self, flush_interval: float):
+        """
+        初始化指标收集器
+
+        Args:
+            flush_interval: 写入共享存储的间隔（秒）
+        """
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flush_thread = None
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        """累加计数器"""
+        with self._lock:
+            self._pending[name] += amount
+        self._ensure_flush_thread()
+
+    def observe(self, name: str, value: float) -> None:
+        """记录一次观测值（累计次数与总和）"""
+        with self._lock:
+            self._pending[f"{name}.count"] += 1
+            self._pending[f"{name}.sum"] += value
+        self._ensure_flush_thread()
+
+    def flush(self) -> None:
+        """将缓冲的增量写入共享存储"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        try:
+            shared_state.incr_many({METRICS_PREFIX + key: value for key, value in pending.items()})
+        except Exception:
+            # 写入失败时放回增量，留待下次写入
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+            raise
+
+    def snapshot(self) -> Dict[str, float]:
+        """读取所有工作进程汇总后的指标"""
+        self.flush()
+        counters = shared_state.get_counters(METRICS_PREFIX)
+        return {key[len(METRICS_PREFIX):]: value for key, value in counters.items()}
+
+    def _ensure_flush_thread(self) -> None:
+        """按需启动后台写入线程"""
+        if self._flush_thread is not None:
+            return
+        with self._lock:
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(
+                    target=self._flush_loop,
+                    name="metrics-flush",
+                    daemon=True
+                )
+                self._flush_thread.start()
+
+    def stop(self) -> None:
+        """停止后台写入线程，并写入剩余的增量"""
+        self._stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        """定期写入共享存储"""
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # 指标写入失败不影响主流程，下个周期重试
+                pass
+
+# 创建全局指标实例
+metrics = Metrics(settings.metrics_flush_interval)
@@ -0,0 +1,424 @@
+"""
+求解模式自动选择模块
+
+根据题目文字特征（长度、关键词、公式与小问数量）以及附图数量和复杂度，
+用逻辑回归预测是否需要复杂模式。未训练时使用内置的先验权重；
+可用记录的求解结果训练：
+
+    python -m backend.core.mode_classifier train
+    python -m backend.core.mode_classifier report
+"""
+
+import os
+import io
+import re
+import json
+import math
+import time
+import hashlib
+import argparse
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image, ImageFilter, ImageStat
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.metrics import metrics
+from backend.core.utils import normalize_images
+
+# 通常需要分析力学或较长推导的关键词
+ADVANCED_KEYWORDS = (
+    "拉格朗日", "哈密顿", "刚体", "欧拉角", "欧拉方程", "陀螺", "进动", "章动", "惯量张量",
+    "广义坐标", "广义力", "虚位移", "虚功", "达朗贝尔", "正则", "泊松括号", "循环坐标",
+    "小振动", "简正", "耦合", "非惯性", "科里奥利", "变分", "约束",
+)
+# 通常用初等方法即可求解的关键词
+BASIC_KEYWORDS = (
+    "自由落体", "匀速", "匀加速", "斜面", "抛体", "平抛", "摩擦", "速度", "加速度", "动量守恒",
+)
+# 小问编号：(1)、（1）、①、1.
+SUBQUESTION_PATTERN = re.compile(r"[(（]\s*\d+\s*[)）]|[①-⑩]|(?:^|\n)\s*\d+[.、]")
+# 公式标记
+FORMULA_PATTERN = re.compile(r"\$|\\[a-zA-Z]+|=")
+# 求解出错的标记（各阶段出错时的标题或提示）
+ERROR_PATTERN = re.compile(r"^#.*出错|处理出错：", re.M)
+# 计算附图复杂度时缩放到的尺寸
+IMAGE_PROBE_SIZE = (256, 256)
+
+# 未训练时的先验权重
+DEFAULT_WEIGHTS = {
+    "bias": -1.5,
+    "length": 1.0,
+    "advanced_keywords": 3.0,
+    "basic_keywords": -1.0,
+    "formulas": 0.8,
+    "subquestions": 0.8,
+    "images": 0.3,
+    "image_complexity": 1.0,
+}
+
+# 训练参数
+TRAIN_ITERATIONS = 500
+TRAIN_LEARNING_RATE = 0.5
+TRAIN_L2 = 1e-3
+
+def _sigmoid(value: float) -> float:
+    return 1.0 / (1.0 + math.exp(-max(min(value, 30.0), -30.0)))
+
+def problem_key(text: str) -> str:
+    """题目文字的摘要，用于在结果记录中关联同一道题的多次求解"""
+    return hashlib.sha1((text or "").strip().encode("utf-8")).hexdigest()[:16]
+
+def image_complexity(image: Any) -> float:
+    """
+    估计附图复杂度：缩小后灰度图的边缘强度均值（0-1）
+
+    JPEG通过draft直接以缩小的比例解码，开销很小。
+
+    Args:
+        image: 图片文件路径、原始图片字节或PIL Image对象
+
+    Returns:
+        float: 复杂度，无法读取时返回0
+    """
+    try:
+        if isinstance(image, Image.Image):
+            opened = image.copy()
+        else:
+            opened = Image.open(image if isinstance(image, str) else io.BytesIO(image))
+        with opened:
+            opened.draft("L", IMAGE_PROBE_SIZE)
+            gray = opened.convert("L")
+            gray.thumbnail(IMAGE_PROBE_SIZE)
+            edges = gray.filter(ImageFilter.FIND_EDGES)
+            return ImageStat.Stat(edges).mean[0] / 255.0
+    except Exception:
+        return 0.0
+
+def extract_features(text: str, images: Any = None) -> Dict[str, float]:
+    """
+    提取题目特征（均归一化到0-1附近）
+
+    Args:
+        text: 题目文本
+        images: 题目图片（单张或多张）
+
+    Returns:
+        Dict[str, float]: {特征名: 特征值}
+    """
+    text = text or ""
+    images = normalize_images(images)
+    complexity = max((image_complexity(image) for image in images), default=0.0)
+    return {
+        "bias": 1.0,
+        "length": math.log1p(len(text)) / math.log(1000),
+        "advanced_keywords": min(sum(1 for word in ADVANCED_KEYWORDS if word in text), 3) / 3,
+        "basic_keywords": min(sum(1 for word in BASIC_KEYWORDS if word in text), 3) / 3,
+        "formulas": min(len(FORMULA_PATTERN.findall(text)) / 20, 1.0),
+        "subquestions": min(len(SUBQUESTION_PATTERN.findall(text)) / 4, 1.0),
+        "images": min(len(images), 3) / 3,
+        # 线条图的边缘强度通常在0.02-0.1之间
+        "image_complexity": min(complexity * 10, 1.0),
+    }
+
+@dataclass
+class ModeDecision:
+    """一次模式选择的结果"""
+    is_complex_mode: bool
+    probability: float
+    features: Dict[str, float]
+    seconds: float
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return "复杂模式" if self.is_complex_mode else "简单模式"
+
+    def describe(self) -> str:
+        """界面展示的说明"""
+        reasons = f"，依据：{'、'.join(self.reasons)}" if self.reasons else ""
+        return f"自动选择{self.label}（复杂度 {self.probability:.2f}{reasons}）"
+
+class ModeClassifier:
+    """基于题目特征的逻辑回归模式分类器"""
+    def __init__(self, threshold: float, model_path: str, log_path: str, log_max_bytes: int = 0):
+        """
+        初始化，存在训练结果时加载训练后的权重
+
+        Args:
+            threshold: 预测为复杂模式的概率阈值
+            model_path: 训练结果（权重）文件路径
+            log_path: 求解结果记录文件路径（JSON Lines，为空时不记录）
+            log_max_bytes: 记录文件超过该大小时轮转为 .1 文件（0表示不限制）
+        """
+        self.threshold = threshold
+        self.model_path = model_path
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self._log_lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """读取训练后的权重"""
+        if not os.path.exists(self.model_path):
+            return
+        try:
+            with open(self.model_path, "r", encoding="utf-8") as f:
+                model = json.load(f)
+            self.weights.update(model["weights"])
+            self.threshold = float(model.get("threshold", self.threshold))
+        except Exception as e:
+            logger.log_error(f"读取模式分类器权重出错：{str(e)}")
+
+    def predict_proba(self, features: Dict[str, float]) -> float:
+        """预测需要复杂模式的概率"""
+        return _sigmoid(sum(self.weights.get(name, 0.0) * value for name, value in features.items()))
+
+    def decide(self, text: str, images: Any = None) -> ModeDecision:
+        """
+        为题目选择求解模式
+
+        Args:
+            text: 题目文本
+            images: 题目图片
+
+        Returns:
+            ModeDecision: 选择结果
+        """
+        start = time.perf_counter()
+        features = extract_features(text, images)
+        probability = self.predict_proba(features)
+        is_complex_mode = probability >= self.threshold
+        keywords = [word for word in ADVANCED_KEYWORDS if word in (text or "")][:3]
+        reasons = list(keywords)
+        if features["subquestions"] >= 0.5:
+            reasons.append("多个小问")
+        if features["image_complexity"] >= 0.5:
+            reasons.append("附图较复杂")
+        seconds = time.perf_counter() - start
+        metrics.observe("mode.classify_seconds", seconds)
+        metrics.incr(f"mode.auto.{'complex' if is_complex_mode else 'simple'}")
+        return ModeDecision(is_complex_mode, probability, features, seconds, reasons)
+
+    def record(
+        self,
+        text: str,
+        is_complex_mode: bool,
+        solution: str,
+        seconds: float,
+        decision: Optional[ModeDecision] = None,
+        images: Any = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        记录一次求解结果，用于训练和评估
+
+        未配置记录文件时只统计耗时指标，不提取特征。
+
+        Args:
+            text: 题目文本
+            is_complex_mode: 实际使用的模式
+            solution: 最终解答
+            seconds: 求解耗时（秒）
+            decision: 自动选择的结果（手动选择时为None）
+            images: 题目图片（手动选择时用于提取特征）
+            error: 求解过程中抛出的错误
+        """
+        mode = "complex" if is_complex_mode else "simple"
+        source = "auto" if decision is not None else "manual"
+        metrics.observe(f"mode.{source}.seconds", seconds)
+        metrics.observe(f"mode.{mode}.seconds", seconds)
+        if not self.log_path:
+            return
+        features = decision.features if decision is not None else extract_features(text, images)
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "problem": problem_key(text),
+            "mode": mode,
+            "source": source,
+            "probability": round(decision.probability, 4) if decision is not None else None,
+            "seconds": round(seconds, 3),
+            "error": bool(error) or bool(ERROR_PATTERN.search(solution)) or not solution.strip(),
+            "features": {name: round(value, 4) for name, value in features.items()},
+        }
+        try:
+            with self._log_lock:
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._rotate()
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.log_error(f"写入模式选择记录出错：{str(e)}")
+
+    def _rotate(self) -> None:
+        """记录文件超过大小上限时轮转，只保留上一份（调用方需持有锁）"""
+        if not self.log_max_bytes or not os.path.exists(self.log_path):
+            return
+        if os.path.getsize(self.log_path) >= self.log_max_bytes:
+            os.replace(self.log_path, f"{self.log_path}.1")
+
+def load_outcomes(path: str) -> List[Dict[str, Any]]:
+    """读取求解结果记录（先读轮转出的上一份，保持时间顺序）"""
+    outcomes = []
+    for file_path in (f"{path}.1", path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            outcomes.extend(json.loads(line) for line in f if line.strip())
+    return outcomes
+
+def build_training_set(outcomes: List[Dict[str, Any]]) -> List[Tuple[Dict[str, float], int]]:
+    """
+    由求解结果推断标签
+
+    同一道题（按题目文字关联）：简单模式求解出错（抛出错误、输出出错提示或没有输出），
+    或用户随后又用复杂模式重新求解，标记为需要复杂模式；简单模式顺利完成
+    且没有再用复杂模式求解，标记为简单模式即可。只用复杂模式求解过的题目
+    无法判断简单模式是否足够，不参与训练。
+
+    Args:
+        outcomes: 求解结果记录（按时间顺序）
+
+    Returns:
+        List[Tuple[Dict[str, float], int]]: (特征, 标签)列表
+    """
+    problems: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in outcomes:
+        problems[entry["problem"]].append(entry)
+
+    samples = []
+    for entries in problems.values():
+        simple = [index for index, entry in enumerate(entries) if entry["mode"] == "simple"]
+        if not simple:
+            continue
+        first = simple[0]
+        retried = any(entry["mode"] == "complex" for entry in entries[first + 1:])
+        samples.append((entries[first]["features"], 1 if (retried or entries[first]["error"]) else 0))
+    return samples
+
+def train(
+    samples: List[Tuple[Dict[str, float], int]],
+    initial: Optional[Dict[str, float]] = None
+) -> Dict[str, float]:
+    """
+    以先验权重为起点，用带L2正则的批量梯度下降训练逻辑回归
+
+    Args:
+        samples: (特征, 标签)列表
+        initial: 初始权重
+
+    Returns:
+        Dict[str, float]: 训练后的权重
+    """
+    weights = dict(initial or DEFAULT_WEIGHTS)
+    if not samples:
+        return weights
+    names = list(weights)
+    for _ in range(TRAIN_ITERATIONS):
+        gradient = dict.fromkeys(names, 0.0)
+        for features, label in samples:
+            error = _sigmoid(sum(weights[name] * features.get(name, 0.0) for name in names)) - label
+            for name in names:
+                gradient[name] += error * features.get(name, 0.0)
+        for name in names:
+            regularization = 0.0 if name == "bias" else TRAIN_L2 * weights[name]
+            weights[name] -= TRAIN_LEARNING_RATE * (gradient[name] / len(samples) + regularization)
+    return weights
+
+def format_report(outcomes: List[Dict[str, Any]], classifier: "ModeClassifier") -> str:
+    """
+    统计自动选择对平均耗时的影响，以及当前权重在可标注样本上的准确率
+
+    Args:
+        outcomes: 求解结果记录
+        classifier: 模式分类器
+
+    Returns:
+        str: 报告文本
+    """
+    if not outcomes:
+        return "没有求解结果记录"
+
+    def mean(values: List[float]) -> float:
+        return sum(values) / len(values) if values else 0.0
+
+    groups: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+    for entry in outcomes:
+        groups[(entry["source"], entry["mode"])].append(entry["seconds"])
+    lines = [f"记录数 {len(outcomes)}", ""]
+    for (source, mode), values in sorted(groups.items()):
+        lines.append(f"  {source:<8}{mode:<10}{len(values):>6} 次  平均耗时 {mean(values):.1f}s")
+
+    simple_mean = mean(groups[("auto", "simple")] + groups[("manual", "simple")])
+    complex_mean = mean(groups[("auto", "complex")] + groups[("manual", "complex")])
+    auto = [entry for entry in outcomes if entry["source"] == "auto"]
+    manual = [entry for entry in outcomes if entry["source"] == "manual"]
+    lines.append("")
+    if manual:
+        share = sum(1 for entry in manual if entry["mode"] == "complex") / len(manual)
+        lines.append(f"手动选择：复杂模式占比 {share:.0%}，平均耗时 {mean([entry['seconds'] for entry in manual]):.1f}s")
+    if auto:
+        share = sum(1 for entry in auto if entry["mode"] == "complex") / len(auto)
+        lines.append(f"自动选择：复杂模式占比 {share:.0%}，平均耗时 {mean([entry['seconds'] for entry in auto]):.1f}s")
+        if simple_mean and complex_mean:
+            # 反事实估计：若自动选择的请求全部使用复杂模式
+            saved = (1 - share) * (complex_mean - simple_mean)
+            lines.append(f"相比全部使用复杂模式，自动选择预计每题平均节省 {saved:.1f}s")
+
+    samples = build_training_set(outcomes)
+    if samples:
+        correct = sum(
+            1 for features, label in samples
+            if (classifier.predict_proba(features) >= classifier.threshold) == bool(label)
+        )
+        lines.append(f"可标注样本 {len(samples)} 个，当前权重的判断准确率 {correct / len(samples):.0%}")
+    return "\n".join(lines)
+
+# 创建全局模式分类器实例
+mode_classifier = ModeClassifier(
+    settings.mode_threshold,
+    settings.mode_model_path,
+    settings.mode_log_path,
+    settings.mode_log_max_bytes
+)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TheoryX 求解模式分类器")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--log", default=settings.mode_log_path, help="求解结果记录文件")
+    parser.add_argument("--out", default=settings.mode_model_path, help="训练结果保存路径")
+    args = parser.parse_args()
+
+    outcomes = load_outcomes(args.log)
+    if args.command == "report":
+        print(format_report(outcomes, mode_classifier))
+        return
+
+    samples = build_training_set(outcomes)
+    if not samples:
+        print("没有可用于训练的样本（需要简单模式的求解记录）")
+        return
+    weights = train(samples, mode_classifier.weights)
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({
+            "weights": weights,
+            "threshold": mode_classifier.threshold,
+            "samples": len(samples),
+            "positives": sum(label for _, label in samples),
+            "trained_at": datetime.now().isoformat(timespec="seconds"),
+        }, f, ensure_ascii=False, indent=2)
+    print(f"已用 {len(samples)} 个样本训练，权重保存在 {args.out}")
+    for name, value in weights.items():
+        print(f"  {name:<20}{value:>8.3f}")
+
+if __name__ == "__main__":
+    main()
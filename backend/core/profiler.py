@@ -0,0 +1,252 @@
+"""按请求采集性能剖析数据的模块"""
+
+import io
+import os
+import json
+import time
+import pstats
+import random
+import shutil
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, Generator, Iterator, Optional, TypeVar
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.shared_state import shared_state
+
+T = TypeVar("T")
+
+# 共享存储中运行时剖析开关的键（管理员修改后对所有工作进程生效）
+PROFILING_CONFIG_KEY = "profiling:config"
+# 重新读取运行时开关的间隔（秒）
+CONFIG_REFRESH_INTERVAL = 5.0
+# 摘要中列出的函数和内存分配位置数量
+SUMMARY_TOP_N = 40
+
+class RequestProfiler:
+    """
+    按请求的性能剖析器
+
+    通过环境变量、管理员开关或采样率启用。启用时在求解生成器每次产出前后
+    开关cProfile，并用tracemalloc记录内存分配；同时统计生成器外部（界面渲染、
+    Gradio序列化等）的耗时。未命中时直接返回原生成器，不产生额外开销。
+    """
+    def __init__(self, enabled: bool, sample_rate: float, output_dir: str, retention: int):
+        """
+        初始化
+
+        Args:
+            enabled: 是否对所有请求启用剖析
+            sample_rate: 随机采样比例（0-1）
+            output_dir: 剖析结果保存目录
+            retention: 最多保留的剖析结果数量
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.retention = retention
+        # cProfile与tracemalloc都是进程级资源，同一时刻只剖析一个请求
+        self._active = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresh_thread = None
+
+    def _refresh_config(self) -> None:
+        """读取管理员设置的运行时开关"""
+        try:
+            config = shared_state.get(PROFILING_CONFIG_KEY)
+        except Exception:
+            return
+        if config:
+            self.enabled = bool(config.get("enabled", self.enabled))
+            self.sample_rate = float(config.get("sample_rate", self.sample_rate))
+
+    def _ensure_refresh_thread(self) -> None:
+        """按需读取一次运行时开关并启动后台刷新线程，之后请求只检查内存中的开关"""
+        if self._refresh_thread is not None:
+            return
+        with self._refresh_lock:
+            if self._refresh_thread is None:
+                self._refresh_config()
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_loop,
+                    name="profiler-config",
+                    daemon=True
+                )
+                self._refresh_thread.start()
+
+    def _refresh_loop(self) -> None:
+        """定期读取运行时开关"""
+        while not self._stop.wait(CONFIG_REFRESH_INTERVAL):
+            self._refresh_config()
+
+    def stop(self) -> None:
+        """停止后台刷新线程"""
+        self._stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None) -> Dict[str, Any]:
+        """
+        修改运行时开关（写入共享存储，所有工作进程在数秒内生效）
+
+        Args:
+            enabled: 是否对所有请求启用剖析
+            sample_rate: 随机采样比例
+
+        Returns:
+            Dict[str, Any]: 修改后的配置
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        config = {"enabled": self.enabled, "sample_rate": self.sample_rate}
+        shared_state.set(PROFILING_CONFIG_KEY, config)
+        return config
+
+    def should_profile(self) -> bool:
+        """判断当前请求是否需要剖析（不访问共享存储）"""
+        self._ensure_refresh_thread()
+        return self.enabled or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def wrap(
+        self,
+        generator: Iterator[T],
+        request_id: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Iterator[T]:
+        """
+        按需为求解生成器附加剖析
+
+        Args:
+            generator: 求解生成器
+            request_id: 请求ID（用作结果目录名）
+            metadata: 附加记录的请求信息
+
+        Returns:
+            Iterator[T]: 未命中采样时原样返回，否则返回带剖析的生成器
+        """
+        if not self.should_profile():
+            return generator
+        return self._profiled(generator, request_id, metadata or {})
+
+    def _profiled(
+        self,
+        generator: Iterator[T],
+        request_id: str,
+        metadata: Dict[str, Any]
+    ) -> Generator[T, None, None]:
+        """在每次产出前后开关剖析器，结束后写出结果"""
+        # 在首次迭代时才占用剖析器，从未被迭代的生成器不会一直持有锁
+        if not self._active.acquire(blocking=False):
+            logger.logger.info(f"已有请求正在剖析，跳过请求 {request_id}")
+            yield from generator
+            return
+
+        profile = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        inside = 0.0
+        steps = 0
+        error = None
+        try:
+            while True:
+                step_start = time.perf_counter()
+                profile.enable()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    profile.disable()
+                    inside += time.perf_counter() - step_start
+                steps += 1
+                yield item
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            # 调用方提前结束时同时关闭被包装的生成器
+            close = getattr(generator, "close", None)
+            if close:
+                close()
+            total = time.perf_counter() - start
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                self._write(request_id, profile, snapshot, peak, {
+                    **metadata,
+                    "request_id": request_id,
+                    "created_at": datetime.now().isoformat(timespec="seconds"),
+                    "total_seconds": round(total, 4),
+                    "solver_seconds": round(inside, 4),
+                    # 生成器外部的耗时：界面渲染、Gradio序列化与传输等
+                    "consumer_seconds": round(total - inside, 4),
+                    "steps": steps,
+                    "peak_traced_bytes": peak,
+                    "error": error,
+                })
+            except Exception as e:
+                logger.log_error(f"写入剖析结果出错：{str(e)}")
+            finally:
+                self._active.release()
+
+    def _write(
+        self,
+        request_id: str,
+        profile: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        peak: int,
+        summary: Dict[str, Any]
+    ) -> None:
+        """写出剖析结果并清理超出保留数量的旧结果"""
+        directory = os.path.join(self.output_dir, request_id)
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(directory, "profile.pstats"))
+
+        report = io.StringIO()
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_TOP_N)
+        report.write(f"\n内存分配（峰值 {peak / 1024 / 1024:.2f} MiB），按代码行统计前 {SUMMARY_TOP_N} 项：\n")
+        for stat in snapshot.statistics("lineno")[:SUMMARY_TOP_N]:
+            report.write(f"{stat}\n")
+        with open(os.path.join(directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        logger.logger.info(
+            f"请求 {request_id} 剖析完成：总耗时 {summary['total_seconds']}s，"
+            f"求解 {summary['solver_seconds']}s，结果保存在 {directory}"
+        )
+        self._prune()
+
+    def _prune(self) -> None:
+        """只保留最新的若干个剖析结果"""
+        if self.retention <= 0:
+            return
+        entries = sorted(
+            (entry for entry in os.scandir(self.output_dir) if entry.is_dir()),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in entries[self.retention:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+# 创建全局剖析器实例
+request_profiler = RequestProfiler(
+    settings.profile_enabled,
+    settings.profile_sample_rate,
+    settings.profile_dir,
+    settings.profile_retention
+)
@@ -0,0 +1,170 @@
+"""用户用量配额模块"""
+
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from backend.config.settings import settings
+from backend.core.shared_state import shared_state
+
+# 共享存储中用量计数器的键前缀，完整格式为 quota:<小时序号>:<用户名>
+QUOTA_PREFIX = "quota:"
+
+def _hour_prefix(hour: int) -> str:
+    """指定小时的计数器键前缀（小时序号补零，保证按字典序有序）"""
+    return f"{QUOTA_PREFIX}{hour:010d}:"
+
+class UsageTracker:
+    """
+    按用户统计每小时token用量
+
+    检查和记录只操作内存中的字典（O(1)）；后台线程定期把增量写入共享存储，
+    并读回所有工作进程汇总后的用量。
+    """
+    def __init__(self, tokens_per_hour: int, flush_interval: float):
+        """
+        初始化
+
+        Args:
+            tokens_per_hour: 每个用户每小时的token额度（0表示不限制）
+            flush_interval: 与共享存储同步的间隔（秒）
+        """
+        self.tokens_per_hour = tokens_per_hour
+        self.flush_interval = flush_interval
+        self._hour = self._current_hour()
+        self._used: Dict[str, float] = defaultdict(float)
+        self._pending: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        # 串行化同步：避免一次同步已取出但尚未写入的增量被另一次同步读漏
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flush_thread = None
+
+    @staticmethod
+    def _current_hour() -> int:
+        """当前的小时序号"""
+        return int(time.time() // 3600)
+
+    def _roll(self) -> None:
+        """进入新的小时后清零（调用方需持有锁）"""
+        hour = self._current_hour()
+        if hour != self._hour:
+            self._hour = hour
+            self._used = defaultdict(float)
+            self._pending = defaultdict(float)
+
+    def check(self, username: str) -> bool:
+        """
+        检查用户是否仍有额度
+
+        Args:
+            username: 用户名
+
+        Returns:
+            bool: 未超出额度时返回True
+        """
+        if not self.tokens_per_hour:
+            return True
+        self._ensure_flush_thread()
+        with self._lock:
+            self._roll()
+            return self._used.get(username, 0.0) < self.tokens_per_hour
+
+    def record(self, username: str, tokens: float) -> None:
+        """
+        记录用户消耗的token
+
+        Args:
+            username: 用户名
+            tokens: token数
+        """
+        if not tokens:
+            return
+        with self._lock:
+            self._roll()
+            self._used[username] += tokens
+            self._pending[username] += tokens
+        self._ensure_flush_thread()
+
+    def usage(self, username: str) -> Tuple[float, int]:
+        """
+        查询用户本小时的用量
+
+        Returns:
+            Tuple[float, int]: (已用token数, 每小时额度)
+        """
+        with self._lock:
+            self._roll()
+            return self._used.get(username, 0.0), self.tokens_per_hour
+
+    def seconds_until_reset(self) -> int:
+        """距离额度重置的秒数"""
+        return int((self._current_hour() + 1) * 3600 - time.time()) + 1
+
+    def flush(self) -> None:
+        """写入本进程的增量，并读回全部工作进程的汇总用量"""
+        with self._flush_lock:
+            with self._lock:
+                self._roll()
+                hour = self._hour
+                pending, self._pending = self._pending, defaultdict(float)
+
+            prefix = _hour_prefix(hour)
+            try:
+                shared_state.incr_many({prefix + user: tokens for user, tokens in pending.items()})
+            except Exception:
+                # 写入失败时放回增量，留待下次同步
+                with self._lock:
+                    if hour == self._hour:
+                        for user, tokens in pending.items():
+                            self._pending[user] += tokens
+                raise
+            totals = shared_state.get_counters(prefix)
+            # 清理已过期小时的计数器
+            shared_state.delete_counters(QUOTA_PREFIX, _hour_prefix(hour - 1))
+
+            with self._lock:
+                if hour != self._hour:
+                    return
+                used = defaultdict(float)
+                for key, tokens in totals.items():
+                    used[key[len(prefix):]] = tokens
+                # 加上同步期间新产生、尚未写入的用量
+                for user, tokens in self._pending.items():
+                    used[user] += tokens
+                self._used = used
+
+    def _ensure_flush_thread(self) -> None:
+        """按需启动后台同步线程"""
+        if self._flush_thread is not None:
+            return
+        with self._lock:
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(
+                    target=self._flush_loop,
+                    name="quota-flush",
+                    daemon=True
+                )
+                self._flush_thread.start()
+
+    def stop(self) -> None:
+        """停止后台同步线程，并写入剩余的增量"""
+        self._stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        """启动时先同步一次，之后定期同步"""
+        while True:
+            try:
+                self.flush()
+            except Exception:
+                # 同步失败不影响主流程，下个周期重试
+                pass
+            if self._stop.wait(self.flush_interval):
+                return
+
+# 创建全局用量统计实例
+usage_tracker = UsageTracker(settings.user_tokens_per_hour, settings.quota_flush_interval)
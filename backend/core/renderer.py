@@ -0,0 +1,303 @@
+"""解答渲染模块：服务端将Markdown与公式渲染为HTML"""
+
+import re
+import html
+import uuid
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from markdown_it import MarkdownIt
+from latex2mathml.converter import convert as latex_to_mathml
+
+from backend.config.settings import settings
+
+# 公式匹配规则（按优先级）：(正则, 是否为行间公式)
+MATH_PATTERNS = [
+    (re.compile(r"\$\$(.+?)\$\$", re.S), True),
+    (re.compile(r"\\\[(.+?)\\\]", re.S), True),
+    (re.compile(r"\\\((.+?)\\\)", re.S), False),
+    (re.compile(r"(?<![\\$])\$(?!\$)([^\n$]+?)(?<!\\)\$"), False),
+]
+# 公式占位符（仅包含字母数字，不会被Markdown解析改写；每次渲染带随机标记，
+# 输入中恰好出现的同形文本不会被当作占位符）
+PLACEHOLDER = "MATHPLACEHOLDER{}X{}END"
+PLACEHOLDER_PATTERN = r"MATHPLACEHOLDER{}X(\d+)END"
+# 行内代码和围栏代码块（其中的$不是公式），及其占位符
+CODE_PATTERN = re.compile(
+    r"^[ ]{0,3}(`{3,}|~{3,}).*?(?:^[ ]{0,3}\1[ \t]*$|\Z)|(?<!`)(`+)(?!`).+?(?<!`)\2(?!`)",
+    re.M | re.S
+)
+CODE_PLACEHOLDER = "CODEPLACEHOLDER{}X{}END"
+CODE_PLACEHOLDER_PATTERN = r"CODEPLACEHOLDER{}X(\d+)END"
+
+# 公式渲染结果中允许的MathML标签和属性，其余标签按文本显示、其余属性丢弃
+MATHML_TAGS = frozenset({
+    "math", "mrow", "mi", "mn", "mo", "ms", "mtext", "mspace", "mstyle", "mfrac",
+    "msqrt", "mroot", "msub", "msup", "msubsup", "munder", "mover", "munderover",
+    "mmultiscripts", "mprescripts", "none", "mtable", "mtr", "mtd", "menclose",
+    "mpadded", "mphantom", "merror", "semantics",
+})
+MATHML_ATTRIBUTES = frozenset({
+    "xmlns", "display", "mathvariant", "mathsize", "mathcolor", "mathbackground",
+    "displaystyle", "scriptlevel", "stretchy", "fence", "separator", "form", "lspace",
+    "rspace", "minsize", "maxsize", "movablelimits", "largeop", "symmetric", "accent",
+    "accentunder", "width", "height", "depth", "voffset", "linethickness", "notation",
+    "columnalign", "columnlines", "columnspacing", "rowalign", "rowlines", "rowspacing",
+    "frame", "framespacing", "equalrows", "equalcolumns", "linebreak",
+})
+
+class MathMLSanitizer(HTMLParser):
+    """
+    按白名单重建MathML
+
+    latex2mathml 不转义 \\text{}、\\mbox{} 中的文本，并会把 \\href、\\style、\\class
+    的参数原样写入属性；公式源码来自模型输出，间接受用户题目影响，因此只保留白名单中的
+    标签和属性，其他标签以转义后的原文显示。
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+
+    def _open_tag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> Optional[str]:
+        """生成白名单标签的开始标签，不在白名单中时返回None"""
+        if tag not in MATHML_TAGS:
+            return None
+        kept = "".join(
+            f' {name}="{html.escape(value or "")}"'
+            for name, value in attrs if name in MATHML_ATTRIBUTES
+        )
+        return f"<{tag}{kept}>"
+
+    def handle_starttag(self, tag, attrs):
+        opened = self._open_tag(tag, attrs)
+        self.parts.append(opened if opened else html.escape(self.get_starttag_text()))
+
+    def handle_startendtag(self, tag, attrs):
+        opened = self._open_tag(tag, attrs)
+        self.parts.append(f"{opened}</{tag}>" if opened else html.escape(self.get_starttag_text()))
+
+    def handle_endtag(self, tag):
+        self.parts.append(f"</{tag}>" if tag in MATHML_TAGS else html.escape(f"</{tag}>"))
+
+    def handle_data(self, data):
+        self.parts.append(html.escape(data, quote=False))
+
+def sanitize_mathml(markup: str) -> str:
+    """
+    按白名单清理MathML片段
+
+    Args:
+        markup: latex2mathml 的输出
+
+    Returns:
+        str: 可安全嵌入HTML的MathML
+    """
+    sanitizer = MathMLSanitizer()
+    sanitizer.feed(markup)
+    sanitizer.close()
+    return "".join(sanitizer.parts)
+
+def _restore_placeholders(pattern: str, nonce: str, values: List[str], text: str) -> str:
+    """
+    将占位符还原为原内容
+
+    Args:
+        pattern: 占位符正则模板
+        nonce: 本次渲染的随机标记
+        values: 按编号排列的原内容
+        text: 包含占位符的文本
+
+    Returns:
+        str: 还原后的文本（编号超出范围时保留原文）
+    """
+    def restore(match: re.Match) -> str:
+        index = int(match.group(1))
+        return values[index] if index < len(values) else match.group(0)
+    return re.sub(pattern.format(nonce), restore, text)
+
+def split_blocks(text: str) -> Tuple[List[str], str]:
+    """
+    按空行将文本切分为块，代码块和$$行间公式内部的空行不作为分界
+
+    Args:
+        text: Markdown文本
+
+    Returns:
+        Tuple[List[str], str]: (已完成的块, 末尾尚未结束的块)
+    """
+    blocks = []
+    current = []
+    in_fence = False
+    in_math = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith(("```", "~~~")):
+            in_fence = not in_fence
+        elif not in_fence and line.count("$$") % 2:
+            in_math = not in_math
+
+        # 只有完整的空行（已收到换行符）才作为分界
+        if not stripped and line.endswith("\n") and not in_fence and not in_math:
+            if current:
+                blocks.append("".join(current))
+                current = []
+        else:
+            current.append(line)
+    return blocks, "".join(current)
+
+class MarkdownRenderer:
+    """Markdown渲染器：公式预渲染为MathML，已完成的块按内容缓存"""
+    def __init__(self, cache_size: int):
+        """
+        初始化渲染器
+
+        Args:
+            cache_size: 块渲染结果缓存的条目上限
+        """
+        self.cache_size = cache_size
+        # 不允许模型输出中的原始HTML，避免注入
+        self.parser = MarkdownIt("commonmark", {"html": False}).enable("table")
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def render_math(tex: str, display: bool) -> str:
+        """
+        将LaTeX公式渲染为MathML（按白名单清理），无法转换时原样显示源码
+
+        Args:
+            tex: 公式源码
+            display: 是否为行间公式
+
+        Returns:
+            str: HTML片段
+        """
+        try:
+            return sanitize_mathml(latex_to_mathml(tex.strip(), display="block" if display else "inline"))
+        except Exception:
+            css_class = "math-block" if display else "math-inline"
+            return f'<code class="{css_class}">{html.escape(tex.strip())}</code>'
+
+    def _render_uncached(self, block: str) -> str:
+        """渲染单个块"""
+        if block.lstrip().startswith(("```", "~~~")):
+            return self.parser.render(block)
+
+        formulas = []
+        code_spans = []
+        nonce = uuid.uuid4().hex
+
+        def protect(match: re.Match) -> str:
+            code_spans.append(match.group(0))
+            return CODE_PLACEHOLDER.format(nonce, len(code_spans) - 1)
+
+        def extract(match: re.Match, display: bool) -> str:
+            formulas.append(self.render_math(match.group(1), display))
+            placeholder = PLACEHOLDER.format(nonce, len(formulas) - 1)
+            return f"\n\n{placeholder}\n\n" if display else placeholder
+
+        # 代码中的$不是公式，先替换为占位符，提取公式后再还原
+        block = CODE_PATTERN.sub(protect, block)
+        for pattern, display in MATH_PATTERNS:
+            block = pattern.sub(lambda match: extract(match, display), block)
+        block = _restore_placeholders(CODE_PLACEHOLDER_PATTERN, nonce, code_spans, block)
+
+        rendered = self.parser.render(block)
+        return _restore_placeholders(PLACEHOLDER_PATTERN, nonce, formulas, rendered)
+
+    def render_block(self, block: str) -> str:
+        """
+        渲染单个块（结果缓存）
+
+        Args:
+            block: 块的Markdown文本
+
+        Returns:
+            str: HTML片段
+        """
+        with self._lock:
+            cached = self._cache.get(block)
+            if cached is not None:
+                self._cache.move_to_end(block)
+                return cached
+
+        rendered = self._render_uncached(block)
+        with self._lock:
+            self._cache[block] = rendered
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rendered
+
+    def render(self, text: str) -> str:
+        """
+        渲染完整文本
+
+        Args:
+            text: Markdown文本
+
+        Returns:
+            str: HTML
+        """
+        blocks, tail = split_blocks(text)
+        parts = [self.render_block(block) for block in blocks]
+        if tail:
+            parts.append(self._render_uncached(tail))
+        return f'<div class="rendered-solution">{"".join(parts)}</div>'
+
+class IncrementalRenderer:
+    """流式输出的增量渲染器：只重新渲染末尾尚未结束的块"""
+    def __init__(self, renderer: "MarkdownRenderer" = None):
+        """
+        初始化
+
+        Args:
+            renderer: 底层渲染器，默认使用全局实例
+        """
+        self.renderer = renderer or markdown_renderer
+        self._done_length = 0
+        self._done_source = ""
+        self._done_html: List[str] = []
+
+    def render(self, text: str) -> str:
+        """
+        渲染当前完整输出
+
+        Args:
+            text: 当前的完整Markdown文本
+
+        Returns:
+            str: HTML
+        """
+        # 输出被整体替换（例如切换阶段）时重新开始
+        if not text.startswith(self._done_source):
+            self._done_length = 0
+            self._done_source = ""
+            self._done_html = []
+
+        # 已完成的块结束于空行，此处解析状态必然为初始状态
+        remainder = text[self._done_length:]
+        blocks, tail = split_blocks(remainder)
+        if blocks:
+            self._done_html.extend(self.renderer.render_block(block) for block in blocks)
+            self._done_length = len(text) - len(tail)
+            self._done_source = text[:self._done_length]
+
+        tail_html = self.renderer._render_uncached(tail) if tail.strip() else ""
+        return f'<div class="rendered-solution">{"".join(self._done_html)}{tail_html}</div>'
+
+def render_markdown(text: str) -> str:
+    """
+    将Markdown文本渲染为HTML（公式预渲染为MathML）
+
+    Args:
+        text: Markdown文本
+
+    Returns:
+        str: HTML
+    """
+    return markdown_renderer.render(text)
+
+# 创建全局渲染器实例
+markdown_renderer = MarkdownRenderer(settings.render_cache_size)
@@ -0,0 +1,540 @@
+"""模型端点路由模块"""
+
+import time
+import socket
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set
+import httpx
+import openai
+from openai import OpenAI
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.core.shared_state import shared_state
+from backend.core.metrics import metrics
+from backend.core.stream_parser import iter_chunk_content, iter_raw_sse_content
+from backend.core.cassette import CassetteError, cassette_store
+from backend.core.utils import estimate_tokens
+from prompts.continue_prompts import CONTINUE_PROMPT
+
+# 尚无延迟样本时使用的默认估计值（秒）
+DEFAULT_LATENCY = 1.0
+# 共享存储中端点冷却截止时间的键前缀（多工作进程间共享健康状态）
+COOLDOWN_PREFIX = "router:cooldown:"
+# 续写时与已输出内容比对去重的最大窗口（字符）和最短重叠长度
+RESUME_OVERLAP_WINDOW = 400
+RESUME_MIN_OVERLAP = 8
+# 可通过续写恢复的暂时性错误（回放时录制中的错误同样视为暂时性错误，以复现续写流程）
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    CassetteError,
+)
+
+def is_transient_error(error: BaseException) -> bool:
+    """判断流中断是否为网络断开、超时或上游5xx等暂时性错误"""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def trim_overlap(tail: str, continuation: str) -> int:
+    """
+    计算续写内容开头与已输出内容结尾重复的字符数
+
+    Args:
+        tail: 已输出内容的结尾
+        continuation: 续写内容的开头
+
+    Returns:
+        int: 续写内容开头需要跳过的字符数（重叠不足最短长度时为0）
+    """
+    for size in range(min(len(tail), len(continuation)), RESUME_MIN_OVERLAP - 1, -1):
+        if tail.endswith(continuation[:size]):
+            return size
+    return 0
+
+class StreamCancel:
+    """
+    流式请求的取消句柄
+
+    可在其他线程调用cancel()：关闭底层连接的套接字，使阻塞在读取上的线程立即返回，
+    并阻止之后的故障转移和续写。
+    """
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._responses: Set[httpx.Response] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def attach(self, response: httpx.Response) -> None:
+        """登记正在读取的响应；已取消时立即中断"""
+        with self._lock:
+            self._responses.add(response)
+        if self.cancelled:
+            self._abort(response)
+
+    def detach(self, response: httpx.Response) -> None:
+        """响应读取结束后注销"""
+        with self._lock:
+            self._responses.discard(response)
+
+    def cancel(self) -> None:
+        """取消请求并中断所有已登记的响应"""
+        self._cancelled.set()
+        with self._lock:
+            responses = list(self._responses)
+        for response in responses:
+            self._abort(response)
+
+    @staticmethod
+    def _abort(response: httpx.Response) -> None:
+        """关闭响应底层的套接字（只做shutdown，连接的清理仍由读取线程完成）"""
+        network_stream = response.extensions.get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class Endpoint:
+    """单个OpenAI兼容端点及其健康状态"""
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        weight: float = 1.0,
+        models: Optional[Dict[str, float]] = None,
+        max_retries: int = 2
+    ):
+        """
+        初始化端点
+
+        Args:
+            name: 端点名称
+            base_url: API地址
+            api_key: API密钥
+            weight: 端点权重，越大越优先
+            models: 支持的模型及其权重，为None时支持全部模型
+            max_retries: SDK内部重试次数
+        """
+        self.name = name
+        self.weight = weight
+        self.models = models
+        self.client = OpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=max_retries,
+        )
+
+        # 健康状态（EWMA统计）
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.lock = threading.Lock()
+
+    def supports(self, model: str) -> bool:
+        """判断端点是否提供指定模型"""
+        return self.models is None or model in self.models
+
+    @property
+    def healthy(self) -> bool:
+        """端点是否处于可用状态"""
+        return time.monotonic() >= self.cooldown_until
+
+    def score(self, model: str) -> float:
+        """
+        计算端点得分，越小越优先
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            float: 综合延迟、错误率和权重的得分
+        """
+        weight = self.weight * (self.models.get(model, 1.0) if self.models else 1.0)
+        latency = self.ewma_latency if self.ewma_latency is not None else DEFAULT_LATENCY
+        return latency * (1 + 4 * self.error_rate) / max(weight, 1e-6)
+
+    def record_success(self, latency: float, alpha: float) -> None:
+        """记录一次成功请求的首token延迟"""
+        with self.lock:
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+            self.error_rate = (1 - alpha) * self.error_rate
+            self.cooldown_until = 0.0
+
+    def record_failure(self, alpha: float, cooldown: float) -> None:
+        """记录一次失败请求，并使端点进入冷却期"""
+        with self.lock:
+            self.error_rate = alpha + (1 - alpha) * self.error_rate
+            self.cooldown_until = time.monotonic() + cooldown
+
+class ModelRouter:
+    """多端点模型路由类"""
+    def __init__(self):
+        """根据配置初始化端点列表"""
+        # 多端点时由路由器负责故障转移，关闭SDK内部重试
+        max_retries = 0 if len(settings.endpoints) > 1 else 2
+        self.endpoints = [
+            Endpoint(
+                name=item['name'],
+                base_url=item['base_url'],
+                api_key=item['api_key'],
+                weight=item['weight'],
+                models=item['models'],
+                max_retries=max_retries
+            )
+            for item in settings.endpoints
+        ]
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_lock = threading.Lock()
+
+    def _rank(self, model: str) -> List[Endpoint]:
+        """按健康状态和得分对支持该模型的端点排序"""
+        candidates = [ep for ep in self.endpoints if ep.supports(model)]
+        if not candidates:
+            raise Exception(f"没有可用端点提供模型 {model}")
+        if len(candidates) == 1:
+            return candidates
+
+        # 合并其他工作进程记录的冷却状态
+        shared_cooldowns = shared_state.get_prefix(COOLDOWN_PREFIX)
+        now = time.time()
+
+        def is_down(endpoint: Endpoint) -> bool:
+            return (not endpoint.healthy or
+                    shared_cooldowns.get(COOLDOWN_PREFIX + endpoint.name, 0) > now)
+
+        return sorted(candidates, key=lambda ep: (is_down(ep), ep.score(model)))
+
+    def _mark_failure(self, endpoint: Endpoint) -> None:
+        """记录端点失败，并同步到共享存储"""
+        endpoint.record_failure(settings.router_ewma_alpha, settings.router_cooldown)
+        metrics.incr(f"router.{endpoint.name}.errors")
+        if len(self.endpoints) > 1:
+            shared_state.set(
+                COOLDOWN_PREFIX + endpoint.name,
+                time.time() + settings.router_cooldown,
+                ttl=settings.router_cooldown
+            )
+
+    def _open_stream(
+        self,
+        endpoint: Endpoint,
+        model: str,
+        messages: List[Dict[str, Any]],
+        cancel: Optional[StreamCancel] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        在指定端点上发起流式请求，输出增量文本
+
+        启用快速路径时直接解析原始SSE字节流，否则使用SDK的数据块对象。
+        传入取消句柄时登记底层响应，取消后读取立即结束。
+        """
+        if not settings.stream_fast_path:
+            stream = endpoint.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **kwargs
+            )
+            if cancel is not None:
+                cancel.attach(stream.response)
+            try:
+                yield from iter_chunk_content(stream)
+            finally:
+                if cancel is not None:
+                    cancel.detach(stream.response)
+                stream.close()
+            return
+
+        with endpoint.client.chat.completions.with_streaming_response.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            **kwargs
+        ) as response:
+            if cancel is not None:
+                cancel.attach(response.http_response)
+            try:
+                yield from iter_raw_sse_content(response.iter_lines())
+            finally:
+                if cancel is not None:
+                    cancel.detach(response.http_response)
+
+    def stream_content(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        cancel: Optional[StreamCancel] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        选择最快的健康端点创建流式请求
+
+        在收到首个内容token之前出错会自动切换到下一个端点；之后因暂时性错误中断时，
+        以已输出内容作为assistant前缀重新请求续写（最多 STREAM_MAX_RESUMES 次），
+        拼接时去掉与已输出内容重复的开头。
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            cancel: 取消句柄（取消后立即中断连接，不再续写）
+            **kwargs: 透传给 chat.completions.create 的其他参数
+
+        Returns:
+            Iterator[str]: 增量文本迭代器
+        """
+        stream = self._open_with_failover(model, messages, cancel=cancel, **kwargs)
+        if settings.stream_max_resumes <= 0:
+            return stream
+        return self._resumable(model, messages, kwargs, stream, cancel)
+
+    def _resumable(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        kwargs: Dict[str, Any],
+        stream: Iterator[str],
+        cancel: Optional[StreamCancel] = None,
+        prefix: str = ""
+    ) -> Iterator[str]:
+        """透传流式响应，暂时性中断时续写（已取消时不再续写，prefix 为流开始前已生成的内容）"""
+        output: List[str] = [prefix] if prefix else []
+        resumes = 0
+        try:
+            while True:
+                try:
+                    for content in stream:
+                        output.append(content)
+                        yield content
+                    return
+                except Exception as e:
+                    if (not output or not is_transient_error(e)
+                            or resumes >= settings.stream_max_resumes
+                            or (cancel is not None and cancel.cancelled)):
+                        raise
+                    error = e
+
+                resumes += 1
+                partial = "".join(output)
+                output = [partial]
+                saved = estimate_tokens(partial)
+                metrics.incr("resume.count")
+                metrics.incr("resume.tokens_saved", saved)
+                logger.logger.warning(
+                    f"模型 {model} 的流在输出 {len(partial)} 个字符后中断"
+                    f"（{type(error).__name__}: {str(error)}），第 {resumes} 次续写，节省约 {saved} tokens"
+                )
+                stream = self._open_continuation(model, messages, partial, kwargs, cancel)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def continue_content(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        partial: str,
+        cancel: Optional[StreamCancel] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        以已生成的内容作为assistant前缀请求续写（如任务重试时从阶段性保存的输出继续）
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            partial: 已生成的内容
+            cancel: 取消句柄
+            **kwargs: 透传给 chat.completions.create 的其他参数
+
+        Returns:
+            Iterator[str]: 续写部分的增量文本迭代器（已去掉与已生成内容重复的开头）
+        """
+        stream = self._open_continuation(model, messages, partial, kwargs, cancel)
+        if settings.stream_max_resumes <= 0:
+            return stream
+        return self._resumable(model, messages, kwargs, stream, cancel, prefix=partial)
+
+    def _open_continuation(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        partial: str,
+        kwargs: Dict[str, Any],
+        cancel: Optional[StreamCancel] = None
+    ) -> Iterator[str]:
+        """创建续写请求，并跳过续写开头与已生成内容重复的部分"""
+        continuation = self._open_with_failover(model, messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ], cancel=cancel, **kwargs)
+        return self._skip_overlap(partial[-RESUME_OVERLAP_WINDOW:], continuation)
+
+    @staticmethod
+    def _skip_overlap(tail: str, stream: Iterator[str]) -> Iterator[str]:
+        """缓冲续写开头的若干字符，去掉与已输出内容重复的部分后继续透传"""
+        try:
+            buffer = ""
+            error = None
+            try:
+                for content in stream:
+                    buffer += content
+                    if len(buffer) >= RESUME_OVERLAP_WINDOW:
+                        break
+            except Exception as e:
+                # 缓冲期间再次中断：先输出已收到的部分，再交由上层决定是否继续续写
+                error = e
+            skip = trim_overlap(tail, buffer)
+            if skip:
+                metrics.incr("resume.overlap_chars", skip)
+            if buffer[skip:]:
+                yield buffer[skip:]
+            if error is not None:
+                raise error
+            yield from stream
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def _open_with_failover(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        cancel: Optional[StreamCancel] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        按得分依次尝试端点，直到收到首个内容块
+
+        启用录制时透传并保存响应；启用回放时直接返回录制的响应，不访问端点。
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            cancel: 取消句柄
+            **kwargs: 透传给 chat.completions.create 的其他参数
+
+        Returns:
+            Iterator[str]: 增量文本迭代器
+        """
+        if cassette_store.replaying:
+            return cassette_store.replay(model, messages, kwargs)
+
+        self._ensure_probe()
+        errors = []
+        request_start = time.monotonic()
+
+        for endpoint in self._rank(model):
+            start_time = time.monotonic()
+            first_content = None
+            iterator = self._open_stream(endpoint, model, messages, cancel=cancel, **kwargs)
+            try:
+                # 预读首个内容块，期间出错仍可故障转移
+                first_content = next(iterator, None)
+            except Exception as e:
+                if cancel is not None and cancel.cancelled:
+                    raise
+                self._mark_failure(endpoint)
+                logger.log_error(f"端点 {endpoint.name} 请求失败：{str(e)}", model)
+                errors.append(f"{endpoint.name}: {str(e)}")
+                continue
+
+            latency = time.monotonic() - start_time
+            endpoint.record_success(latency, settings.router_ewma_alpha)
+            metrics.observe(f"router.{endpoint.name}.ttft", latency)
+            stream = self._iterate(endpoint, first_content, iterator)
+            if cassette_store.recording:
+                return cassette_store.record(model, messages, kwargs, stream, request_start)
+            return stream
+
+        raise Exception(f"所有端点均请求失败：{'; '.join(errors)}")
+
+    def _iterate(
+        self,
+        endpoint: Endpoint,
+        first_content: Optional[str],
+        iterator: Iterator[str]
+    ) -> Iterator[str]:
+        """先输出预读的内容，再继续读取剩余流"""
+        try:
+            if first_content is None:
+                return
+            yield first_content
+            yield from iterator
+        except Exception:
+            self._mark_failure(endpoint)
+            raise
+        finally:
+            iterator.close()
+
+    def _ensure_probe(self) -> None:
+        """按需启动后台健康探测线程"""
+        if len(self.endpoints) < 2 or settings.router_probe_interval <= 0:
+            return
+        with self._probe_lock:
+            if self._probe_thread is None:
+                self._probe_thread = threading.Thread(
+                    target=self._probe_loop,
+                    name="model-router-probe",
+                    daemon=True
+                )
+                self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        """定期探测各端点的可用性"""
+        while True:
+            time.sleep(settings.router_probe_interval)
+            for endpoint in self.endpoints:
+                self.probe(endpoint)
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        """
+        对端点进行一次轻量健康探测
+
+        Args:
+            endpoint: 待探测的端点
+
+        Returns:
+            bool: 端点是否可用
+        """
+        try:
+            endpoint.client.with_options(timeout=5, max_retries=0).models.list()
+        except Exception as e:
+            self._mark_failure(endpoint)
+            logger.logger.warning(f"端点 {endpoint.name} 健康探测失败：{str(e)}")
+            return False
+
+        with endpoint.lock:
+            endpoint.cooldown_until = 0.0
+            endpoint.error_rate = (1 - settings.router_ewma_alpha) * endpoint.error_rate
+        shared_state.set(COOLDOWN_PREFIX + endpoint.name, 0)
+        return True
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """获取各端点的当前状态"""
+        return [
+            {
+                'name': ep.name,
+                'healthy': ep.healthy,
+                'ewma_latency': ep.ewma_latency,
+                'error_rate': round(ep.error_rate, 4),
+                'weight': ep.weight
+            }
+            for ep in self.endpoints
+        ]
+
+# 创建全局路由器实例
+model_router = ModelRouter()
@@ -0,0 +1,375 @@
+"""求解请求调度模块：按模式分通道排队与限流，通道内按用户公平调度"""
+
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, Optional
+
+from backend.config.settings import settings
+from backend.core.metrics import metrics
+from backend.core.quota import usage_tracker
+
+# 通道名称
+LANE_SIMPLE = "simple"
+LANE_COMPLEX = "complex"
+
+# 尚无统计数据时的初始服务时间估计（秒）
+DEFAULT_SERVICE_SECONDS = {LANE_SIMPLE: 20.0, LANE_COMPLEX: 120.0}
+# 服务时间指数加权平均的平滑系数
+SERVICE_EWMA_ALPHA = 0.2
+# 批量与后台任务未被接纳时的最长重试间隔（秒），期间有请求结束时提前重试
+RETRY_INTERVAL = 5.0
+
+# 拒绝原因
+REJECT_BUSY = "busy"
+REJECT_USER_LIMIT = "user_limit"
+REJECT_QUOTA = "quota"
+
+class AdmissionRejected(Exception):
+    """请求未被接纳（系统繁忙、用户排队过多或额度用尽）"""
+    def __init__(self, message: str, reason: str = REJECT_BUSY, retry_after: float = 0.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+@dataclass
+class Ticket:
+    """排队凭据"""
+    lane: str
+    user: str = ""
+    cost: float = 1.0
+    created_at: float = field(default_factory=time.monotonic)
+    admitted: bool = False
+    admitted_at: float = 0.0
+    released: bool = False
+
+@dataclass
+class Lane:
+    """调度通道"""
+    name: str
+    concurrency: int
+    max_queue: int
+    service_seconds: float
+    active: int = 0
+    waiting: int = 0
+    # 各用户的排队请求（按轮转顺序排列）及其差额计数
+    queues: "OrderedDict[str, Deque[Ticket]]" = field(default_factory=OrderedDict)
+    deficits: Dict[str, float] = field(default_factory=dict)
+
+class LaneScheduler:
+    """
+    按模式划分的多通道调度器
+
+    每个通道独立限制并发数和排队长度；通道内按用户做差额轮询（DRR）调度，
+    并限制每个用户同时运行和排队的请求数。未启用认证时所有请求属于同一用户，
+    退化为先进先出。
+
+    通道并发数和用户上限都只在本进程内计数：多进程部署时每个进程各自放行，
+    实际上限为配置值乘以进程数（token额度由UsageTracker在进程间汇总，不受影响）。
+    """
+    def __init__(
+        self,
+        lanes: Dict[str, Lane],
+        max_wait: float = 0.0,
+        user_max_active: int = 0,
+        user_max_queued: int = 0,
+        quantum: float = 1.0
+    ):
+        """
+        初始化调度器
+
+        Args:
+            lanes: 通道配置
+            max_wait: 预计等待超过该秒数时直接拒绝（0表示不限制）
+            user_max_active: 每个用户同时运行的请求数上限（0表示不限制）
+            user_max_queued: 每个用户排队中的请求数上限（0表示不限制）
+            quantum: DRR每轮为用户增加的额度
+        """
+        self.lanes = lanes
+        self.max_wait = max_wait
+        self.user_max_active = user_max_active
+        self.user_max_queued = user_max_queued
+        self.quantum = quantum
+        self._user_active: Dict[str, int] = defaultdict(int)
+        self._user_queued: Dict[str, int] = defaultdict(int)
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        """同时运行和排队的请求总数上限"""
+        return sum(lane.concurrency + lane.max_queue for lane in self.lanes.values())
+
+    @staticmethod
+    def lane_for(is_complex_mode: bool) -> str:
+        """根据求解模式选择通道"""
+        return LANE_COMPLEX if is_complex_mode else LANE_SIMPLE
+
+    def _estimate(self, lane: Lane, position: int) -> float:
+        """估算排在第position位（从0开始）的请求还需等待的秒数"""
+        if lane.active + position < lane.concurrency:
+            return 0.0
+        rounds = position // max(lane.concurrency, 1) + 1
+        return rounds * lane.service_seconds
+
+    def _user_at_cap(self, user: str) -> bool:
+        """用户运行中的请求是否已达上限"""
+        return bool(user and self.user_max_active
+                    and self._user_active.get(user, 0) >= self.user_max_active)
+
+    def _next_ticket(self, lane: Lane) -> Optional[Ticket]:
+        """
+        按差额轮询选出下一个放行的请求（调用方需持有锁）
+
+        轮到的用户额度不足时为其增加quantum并移到队尾；已达并发上限的用户被跳过。
+        """
+        queues = lane.queues
+        skipped = 0
+        while queues and skipped < len(queues):
+            user, queue = next(iter(queues.items()))
+            if self._user_at_cap(user):
+                queues.move_to_end(user)
+                skipped += 1
+                continue
+            skipped = 0
+            ticket = queue[0]
+            deficit = lane.deficits.get(user, 0.0)
+            if deficit < ticket.cost:
+                lane.deficits[user] = deficit + self.quantum
+                queues.move_to_end(user)
+                continue
+
+            queue.popleft()
+            lane.deficits[user] = deficit - ticket.cost
+            if not queue:
+                del queues[user]
+                del lane.deficits[user]
+            elif lane.deficits[user] < queue[0].cost:
+                queues.move_to_end(user)
+            return ticket
+        return None
+
+    def _admit(self, lane: Lane) -> None:
+        """在有空闲并发时放行排队的请求（调用方需持有锁）"""
+        admitted = False
+        while lane.active < lane.concurrency:
+            ticket = self._next_ticket(lane)
+            if ticket is None:
+                break
+            ticket.admitted = True
+            ticket.admitted_at = time.monotonic()
+            lane.active += 1
+            lane.waiting -= 1
+            self._user_queued[ticket.user] -= 1
+            self._user_active[ticket.user] += 1
+            admitted = True
+            metrics.observe(f"lane.{lane.name}.wait_seconds", ticket.admitted_at - ticket.created_at)
+        if admitted:
+            self._cond.notify_all()
+
+    def enter(self, lane_name: str, user: str = "", cost: float = 1.0) -> Ticket:
+        """
+        申请进入通道
+
+        Args:
+            lane_name: 通道名称
+            user: 用户名（未启用认证时为空）
+            cost: 请求的调度成本（DRR中消耗的额度）
+
+        Returns:
+            Ticket: 排队凭据
+
+        Raises:
+            AdmissionRejected: 通道已满、预计等待过长、用户排队过多或额度用尽
+        """
+        if user and not usage_tracker.check(user):
+            metrics.incr("quota.rejected")
+            raise AdmissionRejected(
+                "本小时的用量额度已用完，请稍后再试", REJECT_QUOTA,
+                usage_tracker.seconds_until_reset()
+            )
+
+        with self._cond:
+            lane = self.lanes[lane_name]
+            if user and self.user_max_queued and self._user_queued[user] >= self.user_max_queued:
+                metrics.incr(f"lane.{lane_name}.rejected")
+                raise AdmissionRejected(
+                    f"您已有 {self._user_queued[user]} 个请求在排队，请等待完成后再提交",
+                    REJECT_USER_LIMIT, lane.service_seconds
+                )
+            position = lane.waiting
+            if lane.active >= lane.concurrency and position >= lane.max_queue:
+                metrics.incr(f"lane.{lane_name}.rejected")
+                raise AdmissionRejected(
+                    "当前请求较多，请稍后再试", REJECT_BUSY, self._estimate(lane, position)
+                )
+            if self.max_wait and self._estimate(lane, position) > self.max_wait:
+                metrics.incr(f"lane.{lane_name}.rejected")
+                raise AdmissionRejected(
+                    "当前请求较多，请稍后再试", REJECT_BUSY, self._estimate(lane, position)
+                )
+
+            ticket = Ticket(lane_name, user, cost)
+            lane.queues.setdefault(user, deque()).append(ticket)
+            lane.waiting += 1
+            self._user_queued[user] += 1
+            self._admit(lane)
+            return ticket
+
+    def enter_when_available(self, lane_name: str, user: str = "", cost: float = 1.0) -> Ticket:
+        """
+        申请进入通道并等待放行，用于批量导入和后台任务等无需立即返回的请求
+
+        通道已满或用户排队过多时稍后重试，而不是立即拒绝。
+
+        Args:
+            lane_name: 通道名称
+            user: 用户名（未启用认证时为空）
+            cost: 请求的调度成本
+
+        Returns:
+            Ticket: 已放行的排队凭据
+
+        Raises:
+            AdmissionRejected: 用户额度用尽
+        """
+        while True:
+            try:
+                ticket = self.enter(lane_name, user, cost)
+                break
+            except AdmissionRejected as e:
+                if e.reason == REJECT_QUOTA:
+                    raise
+                with self._cond:
+                    self._cond.wait(RETRY_INTERVAL)
+        for _ in self.wait(ticket):
+            pass
+        return ticket
+
+    def _position(self, lane: Lane, ticket: Ticket) -> int:
+        """估算排队请求前面还有多少个请求（按轮询，每个用户每轮放行一个）"""
+        index = lane.queues[ticket.user].index(ticket)
+        return sum(min(len(queue), index + 1) for queue in lane.queues.values()) - 1
+
+    def wait(self, ticket: Ticket, poll_interval: float = 1.0) -> Iterator[float]:
+        """
+        等待放行，期间定期给出预计剩余等待时间
+
+        Args:
+            ticket: 排队凭据
+            poll_interval: 更新预计等待时间的间隔（秒）
+
+        Yields:
+            float: 预计剩余等待秒数
+        """
+        lane = self.lanes[ticket.lane]
+        while True:
+            with self._cond:
+                if ticket.admitted:
+                    return
+                estimate = self._estimate(lane, self._position(lane, ticket))
+            yield estimate
+            with self._cond:
+                if not ticket.admitted:
+                    self._cond.wait(poll_interval)
+
+    def release(self, ticket: Ticket, tokens: float = 0) -> None:
+        """
+        释放凭据（请求结束或在排队中被放弃），重复释放不产生影响
+
+        Args:
+            ticket: 排队凭据
+            tokens: 本次请求消耗的token数（计入用户用量）
+        """
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.user:
+                usage_tracker.record(ticket.user, tokens)
+            lane = self.lanes[ticket.lane]
+            if ticket.admitted:
+                lane.active -= 1
+                self._user_active[ticket.user] -= 1
+                if not self._user_active[ticket.user]:
+                    del self._user_active[ticket.user]
+                service = time.monotonic() - ticket.admitted_at
+                lane.service_seconds += SERVICE_EWMA_ALPHA * (service - lane.service_seconds)
+                metrics.observe(f"lane.{lane.name}.service_seconds", service)
+            else:
+                queue = lane.queues.get(ticket.user)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    lane.waiting -= 1
+                    self._user_queued[ticket.user] -= 1
+                    if not queue:
+                        del lane.queues[ticket.user]
+                        lane.deficits.pop(ticket.user, None)
+            if not self._user_queued.get(ticket.user, 1):
+                del self._user_queued[ticket.user]
+            # 用户并发数变化可能使其他通道中的请求得以放行
+            for other in self.lanes.values():
+                self._admit(other)
+            # 唤醒等待重试的批量与后台任务
+            self._cond.notify_all()
+
+    def get_user_status(self, user: str) -> Dict[str, float]:
+        """
+        获取用户当前的请求数和本小时用量
+
+        Args:
+            user: 用户名
+
+        Returns:
+            Dict[str, float]: 运行中、排队中请求数及token用量
+        """
+        used, limit = usage_tracker.usage(user)
+        with self._cond:
+            return {
+                "active": self._user_active.get(user, 0),
+                "queued": self._user_queued.get(user, 0),
+                "max_active": self.user_max_active,
+                "max_queued": self.user_max_queued,
+                "tokens_used": used,
+                "tokens_per_hour": limit,
+            }
+
+    def estimate_wait(self, lane_name: str) -> float:
+        """新请求进入通道时的预计等待秒数"""
+        with self._cond:
+            lane = self.lanes[lane_name]
+            return self._estimate(lane, lane.waiting)
+
+    def get_status(self) -> Dict[str, Dict[str, float]]:
+        """获取各通道状态"""
+        with self._cond:
+            return {
+                name: {
+                    "active": lane.active,
+                    "waiting": lane.waiting,
+                    "waiting_users": len(lane.queues),
+                    "concurrency": lane.concurrency,
+                    "max_queue": lane.max_queue,
+                    "service_seconds": round(lane.service_seconds, 2),
+                    "estimated_wait": self._estimate(lane, lane.waiting),
+                }
+                for name, lane in self.lanes.items()
+            }
+
+# 创建全局调度器实例
+lane_scheduler = LaneScheduler(
+    {
+        LANE_SIMPLE: Lane(
+            LANE_SIMPLE, settings.lane_simple_concurrency, settings.lane_simple_max_queue,
+            DEFAULT_SERVICE_SECONDS[LANE_SIMPLE]
+        ),
+        LANE_COMPLEX: Lane(
+            LANE_COMPLEX, settings.lane_complex_concurrency, settings.lane_complex_max_queue,
+            DEFAULT_SERVICE_SECONDS[LANE_COMPLEX]
+        ),
+    },
+    settings.lane_max_wait,
+    settings.user_max_active,
+    settings.user_max_queued,
+    settings.fair_quantum
+)
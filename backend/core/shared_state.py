@@ -0,0 +1,138 @@
+"""跨进程共享状态模块"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from backend.config.settings import settings
+
+class SharedState:
+    """基于本地SQLite的跨进程键值与计数器存储"""
+    def __init__(self, db_path: str):
+        """
+        初始化共享状态存储（数据库文件在首次使用时创建，导入模块不会写入文件）
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """创建数据库连接"""
+        if not self._initialized:
+            self._init_db()
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        """创建目录和数据表"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS kv (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS counters (
+                        key TEXT PRIMARY KEY,
+                        value REAL NOT NULL DEFAULT 0
+                    )
+                """)
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入JSON可序列化的值
+
+        Args:
+            key: 键
+            value: 值
+            ttl: 过期时间（秒），为None时永不过期
+        """
+        expires_at = time.time() + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取值，不存在或已过期时返回默认值"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+
+    def get_prefix(self, prefix: str) -> Dict[str, Any]:
+        """读取指定前缀下全部未过期的值"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM kv WHERE key >= ? AND key < ? "
+                "AND (expires_at IS NULL OR expires_at >= ?)",
+                (prefix, prefix + "\uffff", time.time())
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def incr_many(self, deltas: Dict[str, float]) -> None:
+        """
+        在一个事务中批量累加计数器
+
+        Args:
+            deltas: {计数器名: 增量}
+        """
+        if not deltas:
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO counters (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                list(deltas.items())
+            )
+            conn.execute("COMMIT")
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        """累加单个计数器"""
+        self.incr_many({key: amount})
+
+    def get_counters(self, prefix: str = "") -> Dict[str, float]:
+        """读取指定前缀下的全部计数器"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM counters WHERE key >= ? AND key < ?",
+                (prefix, prefix + "\uffff")
+            ).fetchall()
+        return dict(rows)
+
+    def delete_counters(self, start: str, end: str) -> None:
+        """删除键位于[start, end)范围内的计数器"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM counters WHERE key >= ? AND key < ?", (start, end))
+
+# 创建全局共享状态实例
+shared_state = SharedState(settings.shared_state_path)
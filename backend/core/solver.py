@@ -1,22 +1,32 @@
 """题目求解模块"""
 
+import time
+from collections import Counter
 from typing import Generator, Tuple, Optional, Any
-from openai import OpenAI
 
 from backend.config.settings import settings
 from backend.logger.log_config import logger
-from backend.core.utils import convert_formula_format
+from backend.core.utils import (
+    FormulaStreamConverter, estimate_tokens, extract_final_answers,
+    normalize_answer, normalize_images
+)
+from backend.core.concurrent_streams import ConcurrentStreams, EVENT_CHUNK, EVENT_DONE, EVENT_ERROR
 from backend.core.image_processor import image_processor
-from prompts.solver_prompts import SOLVER_SYSTEM_PROMPT, get_solver_prompt
+from backend.core.router import model_router
+from backend.core.metrics import metrics
+from backend.core.effort import effort_policy
+from backend.tracing import NULL_TRACE
+from prompts.solver_prompts import SOLVER_SYSTEM_PROMPT, ENSEMBLE_ANSWER_PROMPT, get_solver_prompt
+
+# 草稿模式中两路请求的标识
+DRAFT = "draft"
+FINAL = "final"
 
 class ProblemSolver:
     """题目求解类"""
     def __init__(self):
-        """初始化OpenAI客户端"""
-        self.client = OpenAI(
-            base_url=settings.api_base_url,
-            api_key=settings.api_key,
-        )
+        """初始化模型路由"""
+        self.router = model_router
 
     def _update_output(
         self,
@@ -48,19 +58,360 @@ class ProblemSolver:
         # 只显示实际内容，不显示API调用记录
         yield "\n\n".join(current_output).rstrip('---\n\n'), ""
 
+    def _build_request_params(
+        self,
+        solver_model: str,
+        is_complex_mode: bool,
+        temperature: float = 0.01,
+        trace: Any = NULL_TRACE
+    ) -> dict:
+        """
+        按模型参数档案构建求解请求的附加参数，推理强度由延迟预算策略选择
+        
+        Args:
+            solver_model: 求解模型
+            is_complex_mode: 是否使用复杂模式
+            temperature: 采样温度（模型不支持时不发送）
+            trace: 请求链路（记录所选推理强度）
+            
+        Returns:
+            dict: 透传给 chat.completions.create 的参数
+        """
+        effort = effort_policy.choose(solver_model, is_complex_mode, trace)
+        return settings.get_request_params(solver_model, temperature, effort)
+
+    def _solve_ensemble(
+        self,
+        messages: list,
+        is_complex_mode: bool,
+        current_output: list,
+        start_time: float,
+        trace: Any = NULL_TRACE
+    ) -> Generator[Tuple[str, str], None, None]:
+        """
+        并发运行多路求解采样，首个产出内容的样本实时流式展示，
+        全部结束（或提前达成多数一致、超出预算）后汇总最终答案的一致性
+        
+        Args:
+            messages: 求解消息列表
+            is_complex_mode: 是否使用复杂模式
+            current_output: 当前输出列表
+            start_time: 求解开始时间
+            trace: 请求链路
+            
+        Yields:
+            Tuple[str, str]: (输出内容, 日志内容)
+        """
+        models = settings.get_ensemble_models(is_complex_mode)
+        quorum = len(models) // 2 + 1
+        ttft_span = trace.span("solver.ttft", samples=len(models))
+        stream_span = None
+        streams = ConcurrentStreams(self.router)
+        for index, model in enumerate(models):
+            # 第一路保持低温度，其余路提高温度以获得多样的推导
+            temperature = 0.01 if index == 0 else settings.ensemble_temperature
+            streams.start(index, model, messages,
+                          **self._build_request_params(model, is_complex_mode, temperature, trace))
+        
+        texts = [[] for _ in models]
+        status = ["进行中"] * len(models)
+        answers = [None] * len(models)
+        errors = [None] * len(models)
+        lead = None
+        converter = FormulaStreamConverter()
+        total_tokens = 0
+        over_budget = False
+        
+        for index, kind, payload in streams.events():
+            if kind == EVENT_CHUNK:
+                texts[index].append(payload)
+                total_tokens += estimate_tokens(payload)
+                if lead is None:
+                    lead = index
+                    ttft_span.set_attribute("model", models[lead])
+                    ttft_span.end()
+                    stream_span = trace.span("solver.stream", model=models[lead], ensemble=True)
+                elif status[lead] == "出错" and index != lead:
+                    # 展示中的样本已出错且当时没有可替换的样本：改为展示首个继续输出的样本
+                    lead = index
+                    converter = FormulaStreamConverter()
+                    converter.feed("".join(texts[lead][:-1]))
+                if index == lead:
+                    converter.feed(payload)
+                    if converter.buffer:
+                        yield from self._update_output(
+                            f"# {models[lead]} 求解过程（集成采样 {lead + 1}/{len(models)}）\n\n"
+                            f"{converter.text}",
+                            current_output,
+                            replace_last=True
+                        )
+                # 超出预算时只保留展示中的样本
+                if (settings.ensemble_max_tokens and not over_budget and
+                        total_tokens > settings.ensemble_max_tokens):
+                    over_budget = True
+                    for other in range(len(models)):
+                        if other != lead and status[other] == "进行中":
+                            streams.cancel(other)
+                            status[other] = "超出预算"
+            elif kind == EVENT_DONE:
+                status[index] = "完成"
+                # 去除同一样本中重复出现的答案
+                boxed = list(dict.fromkeys(extract_final_answers("".join(texts[index]))))
+                answers[index] = (
+                    "; ".join(normalize_answer(answer) for answer in boxed),
+                    "；".join(boxed)
+                ) if boxed else None
+                # 多数样本答案一致后提前结束其余样本
+                votes = Counter(answer[0] for answer in answers if answer)
+                if votes and votes.most_common(1)[0][1] >= quorum:
+                    for other in range(len(models)):
+                        if other != lead and status[other] == "进行中":
+                            streams.cancel(other)
+                            status[other] = "提前停止"
+            elif kind == EVENT_ERROR:
+                status[index] = "出错"
+                errors[index] = str(payload)
+                logger.log_error(f"集成采样 {index + 1} 出错：{str(payload)}", models[index])
+                candidates = [other for other in range(len(models))
+                              if status[other] in ("完成", "进行中") and texts[other]]
+                if index == lead and candidates:
+                    # 展示中的样本出错：改为展示已完成（其次是输出最多）的样本
+                    lead = max(candidates, key=lambda other: (status[other] == "完成", len(texts[other])))
+                    converter = FormulaStreamConverter()
+                    converter.feed("".join(texts[lead]))
+                    yield from self._update_output(
+                        f"# {models[lead]} 求解过程（集成采样 {lead + 1}/{len(models)}）\n\n"
+                        f"{converter.text}",
+                        current_output,
+                        replace_last=True
+                    )
+            elif status[index] == "进行中":
+                status[index] = "已取消"
+        
+        if lead is None:
+            ttft_span.end("所有采样均未收到模型响应")
+            metrics.incr("solve.errors")
+            yield from self._update_output(
+                "# 集成求解出错\n\n所有采样均未收到模型响应",
+                current_output,
+                replace_last=True,
+                add_separator=False
+            )
+            return
+        
+        stream_span.set_attribute("model", models[lead])
+        stream_span.set_attribute("tokens", total_tokens)
+        stream_span.end()
+        postprocess_span = trace.span("solver.postprocess", ensemble=True)
+        final_content = (f"# {models[lead]} 求解过程（集成采样 {lead + 1}/{len(models)}）\n\n"
+                         f"{converter.text}")
+        if status[lead] == "出错":
+            # 没有其他可展示的样本时保留已输出内容并注明出错
+            final_content += f"\n\n# {models[lead]} 求解出错\n\n模型响应处理出错：{errors[lead]}"
+        yield from self._update_output(final_content, current_output, replace_last=True)
+        
+        # 汇总一致性
+        votes = Counter(answer[0] for answer in answers if answer)
+        rows = ["| 样本 | 模型 | 最终答案 | 状态 |", "| --- | --- | --- | --- |"]
+        for index, model in enumerate(models):
+            shown = f"${answers[index][1]}$" if answers[index] else "-"
+            rows.append(f"| {index + 1} | {model} | {shown} | {status[index]} |")
+        summary = ["# 集成结果", "\n".join(rows)]
+        if votes:
+            majority_key, majority_count = votes.most_common(1)[0]
+            majority_display = next(answer[1] for answer in answers
+                                    if answer and answer[0] == majority_key)
+            answered = sum(votes.values())
+            summary.append(f"**一致性**：{majority_count}/{answered} 个给出答案的样本一致"
+                           f"（共 {len(models)} 个样本）")
+            summary.append(f"**多数答案**：$\\boxed{{{majority_display}}}$")
+            metrics.observe("ensemble.agreement", majority_count / len(models))
+        else:
+            summary.append("**一致性**：未能从样本中提取到最终答案")
+        
+        logger.log_api_interaction(models[lead], messages, final_content)
+        logger.logger.info(
+            f"{trace.log_prefix}集成求解完成，估算消耗 {total_tokens} tokens，状态：{status}"
+        )
+        metrics.observe("solve.seconds", time.monotonic() - start_time)
+        yield from self._update_output(
+            "\n\n".join(summary),
+            current_output,
+            add_separator=False
+        )
+        postprocess_span.end()
+
+    def _solve_speculative(
+        self,
+        messages: list,
+        current_output: list,
+        start_time: float,
+        trace: Any = NULL_TRACE
+    ) -> Generator[Tuple[str, str], None, None]:
+        """
+        复杂模式下同时运行简单模式求解器（草稿）和复杂模式求解器，
+        先流式展示草稿，复杂模式开始输出时整体替换草稿并取消草稿请求
+        
+        Args:
+            messages: 求解消息列表
+            current_output: 当前输出列表
+            start_time: 求解开始时间
+            trace: 请求链路
+            
+        Yields:
+            Tuple[str, str]: (输出内容, 日志内容)
+        """
+        _, draft_model = settings.get_model_info(False)
+        _, solver_model = settings.get_model_info(True)
+        draft_span = trace.span("solver.draft", model=draft_model)
+        ttft_span = trace.span("solver.ttft", model=solver_model)
+        stream_span = None
+        
+        streams = ConcurrentStreams(self.router)
+        request_params = self._build_request_params(solver_model, True, trace=trace)
+        request_start = time.monotonic()
+        streams.start(DRAFT, draft_model, messages,
+                      **self._build_request_params(draft_model, False))
+        streams.start(FINAL, solver_model, messages, **request_params)
+        
+        draft = FormulaStreamConverter()
+        converter = FormulaStreamConverter()
+        draft_state = "正在生成"
+        draft_started = False
+        superseded = False
+        error = None
+        collected_chunks = 0
+        
+        for key, kind, payload in streams.events():
+            if key == DRAFT:
+                if superseded:
+                    continue
+                if kind == EVENT_CHUNK:
+                    if not draft_started:
+                        draft_started = True
+                        metrics.observe("speculative.draft_ttft", time.monotonic() - start_time)
+                    draft.feed(payload)
+                    if not draft.buffer:
+                        continue
+                elif kind == EVENT_DONE:
+                    draft_state = "已完成"
+                    draft_span.end()
+                else:
+                    draft_state = "生成失败"
+                    draft_span.end(str(payload))
+                    logger.log_error(f"{trace.log_prefix}草稿生成出错：{str(payload)}", draft_model)
+                yield from self._update_output(
+                    f"# {draft_model} 草稿（{draft_state}，{solver_model} 正在求解，完成后将替换）"
+                    f"\n\n{draft.text}",
+                    current_output,
+                    replace_last=True
+                )
+                continue
+            
+            if kind == EVENT_CHUNK:
+                if not superseded:
+                    # 复杂模式开始输出：取消草稿请求，下面一次性替换草稿内容
+                    superseded = True
+                    streams.cancel(DRAFT)
+                    draft_span.set_attribute("superseded", draft_state == "正在生成")
+                    draft_span.end()
+                    ttft_span.end()
+                    stream_span = trace.span("solver.stream", model=solver_model)
+                    metrics.incr("speculative.superseded")
+                    metrics.observe("speculative.final_ttft", time.monotonic() - start_time)
+                collected_chunks += 1
+                converter.feed(payload)
+                if converter.buffer:
+                    yield from self._update_output(
+                        f"# {solver_model} 求解过程\n\n{converter.text}",
+                        current_output,
+                        replace_last=True
+                    )
+            elif kind == EVENT_ERROR:
+                error = str(payload)
+            elif kind == EVENT_DONE and not collected_chunks:
+                error = "未收到模型响应"
+        
+        if error is not None or not collected_chunks:
+            error = error or "未收到模型响应"
+            ttft_span.end(error)
+            draft_span.end()
+            if stream_span is not None:
+                stream_span.end(error)
+            error_msg = f"模型 {solver_model} 求解出错：{error}"
+            logger.log_error(f"{trace.log_prefix}{error_msg}")
+            metrics.incr("solve.errors")
+            if superseded:
+                content = f"# {solver_model} 求解出错\n\n{converter.text}\n\n{error_msg}"
+            elif draft.buffer:
+                # 复杂模式未能给出解答时保留草稿，并明确标注
+                content = (f"# {draft_model} 草稿（{solver_model} 求解失败，以下仅供参考）"
+                           f"\n\n{draft.text}\n\n---\n\n{error_msg}")
+            else:
+                content = f"# {solver_model} 求解出错\n\n{error_msg}"
+            yield from self._update_output(content, current_output, replace_last=True)
+            return
+        
+        stream_span.set_attribute("chunks", collected_chunks)
+        stream_span.end()
+        with trace.span("solver.postprocess"):
+            final_content = f"# {solver_model} 求解过程\n\n{converter.text}"
+            logger.log_api_interaction(solver_model, messages, final_content)
+            logger.logger.info(f"{trace.log_prefix}{solver_model} 求解完成（草稿模式）")
+        effort_policy.observe(
+            solver_model, request_params.get("reasoning_effort"), time.monotonic() - request_start
+        )
+        metrics.observe("solve.seconds", time.monotonic() - start_time)
+        yield from self._update_output(final_content, current_output, replace_last=True)
+
+    @staticmethod
+    def _parse_checkpoint(output: str, solver_model: str) -> Tuple[Optional[str], str]:
+        """
+        从上次保存的输出中取出已完成的图片描述和已生成的求解内容
+        
+        Args:
+            output: 上次保存的输出
+            solver_model: 求解模型（只续写同一模型生成的内容）
+            
+        Returns:
+            Tuple[Optional[str], str]: (图片描述，未完成时为None; 已生成的求解内容)
+        """
+        header = f"# {solver_model} 求解过程\n\n"
+        index = output.find(header)
+        if index < 0:
+            return None, ""
+        partial = output[index + len(header):]
+        # 去掉上次追加的出错信息
+        partial = partial.split(f"\n\n---\n\n\n\n# {solver_model} 求解出错")[0]
+        
+        description = None
+        desc_header = "# 图片描述\n\n"
+        if output.startswith(desc_header):
+            # 求解已开始说明图片描述已经完成
+            description = output[len(desc_header):index].rstrip("-\n")
+        return description, partial if partial.strip() else ""
+
     def solve_problem(
         self,
         text_input: str,
         image: Optional[Any] = None,
-        is_complex_mode: bool = False
+        is_complex_mode: bool = False,
+        ensemble: bool = False,
+        trace: Any = NULL_TRACE,
+        speculative: bool = False,
+        resume_output: str = ""
     ) -> Generator[Tuple[str, str], None, None]:
         """
         处理完整题目求解流程
         
         Args:
             text_input: 题目文本
-            image: 题目图片（可选）
+            image: 题目图片（可选，单张或多张）
             is_complex_mode: 是否使用复杂模式
+            ensemble: 是否使用多路采样集成求解
+            trace: 请求链路（用于记录各阶段耗时，默认不记录）
+            speculative: 复杂模式下是否先用简单模式求解器生成草稿
+            resume_output: 上次中断时保存的输出（单模型求解时复用其中的图片描述并续写已生成的内容）
             
         Yields:
             Tuple[str, str]: (解答内容, 日志内容)
@@ -68,12 +419,24 @@ class ProblemSolver:
         api_logs = []
         full_result = []
         current_output = []
+        start_time = time.monotonic()
+        metrics.incr("solve.requests")
+        
+        # 获取求解器模型
+        _, solver_model = settings.get_model_info(is_complex_mode)
+        resumed_desc, partial = self._parse_checkpoint(resume_output, solver_model)
+        if ensemble or speculative:
+            partial = ""
         
         # 处理图片描述
-        if image is not None:
+        images = normalize_images(image)
+        if images and resumed_desc is not None:
+            full_result.append(resumed_desc)
+            yield from self._update_output(f"# 图片描述\n\n{resumed_desc}", current_output)
+        elif images:
             try:
                 description_gen = image_processor.get_image_description(
-                    text_input, image, is_complex_mode
+                    text_input, images, is_complex_mode, trace
                 )
                 latest_desc = []
                 
@@ -82,6 +445,7 @@ class ProblemSolver:
                     if isinstance(desc, tuple):  # 如果是最终结果
                         final_desc, _ = desc
                         if "出错" in final_desc:  # 如果是错误信息
+                            metrics.incr("solve.errors")
                             api_logs.append(f"# API调用错误\n{final_desc}")
                             yield final_desc, "\n\n".join(api_logs)
                             return
@@ -96,18 +460,17 @@ class ProblemSolver:
                 
                 if latest_desc:
                     full_result.append(latest_desc[0])
-                    logger.logger.info("图片描述完成")
+                    logger.logger.info(f"{trace.log_prefix}图片描述完成")
                 else:
                     raise Exception("未获取到图片描述")
                     
             except Exception as e:
                 error_msg = f"图片处理出错：{str(e)}"
-                logger.log_error(error_msg)
+                logger.log_error(f"{trace.log_prefix}{error_msg}")
+                metrics.incr("solve.errors")
                 yield error_msg, ""
                 return
         
-        # 获取求解器模型
-        _, solver_model = settings.get_model_info(is_complex_mode)
         yield from self._update_output(
             f"# {solver_model} 求解过程\n\n",
             current_output,
@@ -129,81 +492,53 @@ class ProblemSolver:
             }
         ]
         
+        if ensemble:
+            # 各路样本按最终答案投票，要求以 \boxed{} 给出最终答案
+            messages[0]["content"] = SOLVER_SYSTEM_PROMPT + ENSEMBLE_ANSWER_PROMPT
+            yield from self._solve_ensemble(
+                messages, is_complex_mode, current_output, start_time, trace
+            )
+            return
+        
+        # 两种模式使用同一求解模型时草稿没有意义
+        if (speculative and is_complex_mode
+                and settings.get_model_info(False)[1] != solver_model):
+            yield from self._solve_speculative(messages, current_output, start_time, trace)
+            return
+        
+        ttft_span = trace.span("solver.ttft", model=solver_model)
+        stream_span = None
         try:
-            # 根据模式决定是否添加 reasoning_effort
-            if is_complex_mode and solver_model == "o3-mini":
-                stream = self.client.chat.completions.create(
-                    model=solver_model,
-                    messages=messages,
-                    reasoning_effort="high",
-                    stream=True,
-                    temperature=0.01
+            request_params = self._build_request_params(solver_model, is_complex_mode, trace=trace)
+            request_start = time.monotonic()
+            collected_chunks = []
+            converter = FormulaStreamConverter()
+            if partial:
+                # 从上次保存的内容继续生成，避免重新求解
+                logger.logger.info(f"{trace.log_prefix}从已保存的 {len(partial)} 个字符继续求解")
+                collected_chunks.append(partial)
+                converter.feed(partial)
+                stream = self.router.continue_content(
+                    solver_model, messages, partial, **request_params
                 )
             else:
-                stream = self.client.chat.completions.create(
-                    model=solver_model,
-                    messages=messages,
-                    stream=True,
-                    temperature=0.01
-                )
+                stream = self.router.stream_content(solver_model, messages, **request_params)
                 
             # 流式接收并更新输出
-            collected_chunks = []
-            buffer = []
-            formula_buffer = []
-            in_formula = False
-            latex_start = ""  # 记录LaTeX公式的开始标记
             
             try:
-                for chunk in stream:
-                    if not (hasattr(chunk, 'choices') and
-                           chunk.choices and
-                           hasattr(chunk.choices[0], 'delta') and
-                           hasattr(chunk.choices[0].delta, 'content') and
-                           chunk.choices[0].delta.content is not None):
-                        continue
-                        
-                    content = chunk.choices[0].delta.content
+                for content in stream:
+                    if stream_span is None:
+                        ttft_span.end()
+                        stream_span = trace.span("solver.stream", model=solver_model)
                     collected_chunks.append(content)
                     
                     # 处理LaTeX公式
-                    for char in content:
-                        if not in_formula:
-                            if char == '\\':
-                                latex_start = char
-                                continue
-                            elif latex_start:
-                                latex_start += char
-                                if latex_start == "\\[" or latex_start == "\\(":
-                                    in_formula = True
-                                    formula_buffer = []
-                                    buffer.append("$$" if latex_start == "\\[" else "$")
-                                    latex_start = ""
-                                elif len(latex_start) > 1:
-                                    buffer.extend(list(latex_start))
-                                    latex_start = ""
-                            else:
-                                buffer.append(char)
-                        else:
-                            formula_buffer.append(char)
-                            if (len(formula_buffer) >= 2 and
-                                formula_buffer[-2] == '\\' and
-                                formula_buffer[-1] == ']'):
-                                in_formula = False
-                                buffer.extend(formula_buffer[:-2])
-                                buffer.append("$$")
-                                formula_buffer = []
-                            elif (len(formula_buffer) >= 2 and
-                                  formula_buffer[-2] == '\\' and
-                                  formula_buffer[-1] == ')'):
-                                in_formula = False
-                                buffer.extend(formula_buffer[:-2])
-                                buffer.append("$")
-                                formula_buffer = []
+                    converter.feed(content)
                     
                     # 输出当前缓冲区内容
-                    if buffer:
-                        current_content = f"# {solver_model} 求解过程\n\n{''.join(buffer)}"
+                    if converter.buffer:
+                        current_content = f"# {solver_model} 求解过程\n\n{converter.text}"
                         yield from self._update_output(
                             current_content,
                             current_output,
@@ -212,16 +547,34 @@ class ProblemSolver:
                 
                 if not collected_chunks:
                     raise Exception("未收到模型响应")
+                if stream_span is None:
+                    # 续写时模型可能没有新的输出
+                    ttft_span.end()
+                    stream_span = trace.span("solver.stream", model=solver_model)
+                stream_span.set_attribute("chunks", len(collected_chunks))
+                stream_span.end()
                     
                 # 生成最终输出和日志
-                final_content = f"# {solver_model} 求解过程\n\n{''.join(buffer)}"
-                log_str = logger.log_api_interaction(solver_model, messages, final_content)
-                logger.logger.info(f"{solver_model} 求解完成")
-                full_result.append(final_content)
+                with trace.span("solver.postprocess"):
+                    final_content = f"# {solver_model} 求解过程\n\n{converter.text}"
+                    log_str = logger.log_api_interaction(solver_model, messages, final_content)
+                    logger.logger.info(f"{trace.log_prefix}{solver_model} 求解完成")
+                    full_result.append(final_content)
+                effort_policy.observe(
+                    solver_model, request_params.get("reasoning_effort"),
+                    time.monotonic() - request_start
+                )
+                metrics.observe("solve.seconds", time.monotonic() - start_time)
                 
             except Exception as e:
+                ttft_span.end(str(e))
+                if stream_span is not None:
+                    stream_span.end(str(e))
                 error_msg = f"模型响应处理出错：{str(e)}"
-                logger.log_error(f"Stream处理错误 - 模型: {solver_model}, 错误: {str(e)}")
+                logger.log_error(
+                    f"{trace.log_prefix}Stream处理错误 - 模型: {solver_model}, 错误: {str(e)}"
+                )
+                metrics.incr("solve.errors")
                 yield from self._update_output(
                     f"# {solver_model} 求解出错\n\n{error_msg}",
                     current_output,
@@ -229,8 +582,10 @@ class ProblemSolver:
                 )
         
         except Exception as e:
+            ttft_span.end(str(e))
             error_msg = f"模型 {solver_model} 求解出错：{str(e)}"
-            logger.log_error(error_msg)
+            logger.log_error(f"{trace.log_prefix}{error_msg}")
+            metrics.incr("solve.errors")
             yield from self._update_output(
                 f"# {solver_model} 求解出错\n\n{error_msg}",
                 current_output,
@@ -0,0 +1,92 @@
+"""流式响应解析模块"""
+
+import json
+from typing import Any, Iterable, Iterator, Optional
+from openai.types.chat import ChatCompletionChunk
+
+def get_chunk_content(chunk: Any) -> Optional[str]:
+    """
+    从SDK数据块对象中取出增量文本
+
+    Args:
+        chunk: ChatCompletionChunk对象
+
+    Returns:
+        Optional[str]: 增量文本，没有内容时返回None
+    """
+    choices = getattr(chunk, 'choices', None)
+    if not choices:
+        return None
+    delta = getattr(choices[0], 'delta', None)
+    return getattr(delta, 'content', None)
+
+def iter_chunk_content(stream: Any) -> Iterator[str]:
+    """
+    标准路径：遍历SDK构建的数据块对象，输出增量文本
+
+    Args:
+        stream: SDK返回的流对象
+
+    Yields:
+        str: 增量文本
+    """
+    try:
+        for chunk in stream:
+            content = get_chunk_content(chunk)
+            if content:
+                yield content
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+def parse_sse_payload(payload: str) -> Optional[str]:
+    """
+    快速解析单条SSE数据，只读取 choices[0].delta.content
+
+    遇到非预期结构时回退到SDK模型校验；仍无法解析则忽略该条数据。
+
+    Args:
+        payload: "data:" 之后的JSON文本
+
+    Returns:
+        Optional[str]: 增量文本，没有内容时返回None
+    """
+    try:
+        return json.loads(payload)["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        pass
+
+    # 回退：按SDK的数据结构处理
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get("error"):
+        error = data["error"]
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        raise Exception(f"流式响应返回错误：{message}")
+    try:
+        return get_chunk_content(ChatCompletionChunk.model_validate(data))
+    except Exception:
+        return None
+
+def iter_raw_sse_content(lines: Iterable[str]) -> Iterator[str]:
+    """
+    快速路径：直接解析HTTP响应中的SSE文本行，不构建数据块对象
+
+    Args:
+        lines: 按行迭代的响应文本
+
+    Yields:
+        str: 增量文本
+    """
+    for line in lines:
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].lstrip()
+        if payload == "[DONE]":
+            return
+        content = parse_sse_payload(payload)
+        if content:
+            yield content
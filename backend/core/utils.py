@@ -1,23 +1,45 @@
 """工具函数模块"""
 
 import os
+import re
 import base64
 import io
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from PIL import Image
-from typing import Union, Optional
+from PIL import Image, ImageOps
+from typing import Any, List, Tuple, Union, Optional
 
-def encode_image(image: Union[str, Image.Image]) -> str:
+from backend.config.settings import settings
+from backend.core.renderer import render_markdown
+
+# 图片编码结果缓存：{内容键: (MIME类型, base64数据)}，按数据总字节数淘汰
+_encode_cache: "OrderedDict[Tuple, Tuple[str, str]]" = OrderedDict()
+_encode_cache_bytes = 0
+_encode_cache_lock = threading.Lock()
+# 保存解答时按文件头识别的图片扩展名
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+def encode_image(image: Union[str, bytes, Image.Image]) -> str:
     """
     将图片编码为base64格式
     
     Args:
-        image: 图片文件路径或PIL Image对象
+        image: 图片文件路径、原始图片字节或PIL Image对象
         
     Returns:
         str: base64编码的图片数据
     """
-    if isinstance(image, str):  # 如果是文件路径
+    if isinstance(image, bytes):  # 如果是原始上传字节，直接编码
+        return base64.b64encode(image).decode('utf-8')
+    elif isinstance(image, str):  # 如果是文件路径
         with open(image, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     else:  # 如果是PIL.Image对象
@@ -25,6 +47,204 @@ def encode_image(image: Union[str, Image.Image]) -> str:
         image.save(buffered, format="PNG")
         return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
+def _sniff_image_mime(header: bytes) -> Optional[str]:
+    """根据文件头识别常见图片格式的MIME类型，无法识别时返回None"""
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+def get_image_mime(image: Union[str, bytes, Image.Image]) -> str:
+    """
+    根据文件头判断图片的MIME类型
+    
+    Args:
+        image: 图片文件路径、原始图片字节或PIL Image对象
+        
+    Returns:
+        str: MIME类型，无法识别时返回image/png
+    """
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            header = image_file.read(12)
+    elif isinstance(image, bytes):
+        header = image[:12]
+    else:  # PIL.Image对象统一编码为PNG
+        return "image/png"
+    return _sniff_image_mime(header) or "image/png"
+
+def normalize_images(images: Any) -> List[Union[str, bytes, Image.Image]]:
+    """
+    将单张图片、图片列表或Gradio画廊的值统一为图片列表
+    
+    Args:
+        images: None、单张图片，或由图片、(图片, 标题)元组组成的列表
+        
+    Returns:
+        List[Union[str, bytes, Image.Image]]: 图片列表（文件路径、原始字节或PIL Image对象）
+    """
+    if images is None:
+        return []
+    if not isinstance(images, (list, tuple)):
+        images = [images]
+        
+    result = []
+    for item in images:
+        if isinstance(item, (list, tuple)):  # 画廊的(图片, 标题)元组
+            item = item[0] if item else None
+        if isinstance(item, dict):  # 文件数据字典
+            item = item.get('path') or item.get('name')
+        if item is not None:
+            result.append(item)
+    return result
+
+class ImageTooLarge(ValueError):
+    """图片文件或像素数超出限制"""
+
+def _open_image(image: Union[str, bytes]) -> Image.Image:
+    """惰性打开图片（只读取文件头，不解码像素）"""
+    return Image.open(image if isinstance(image, str) else io.BytesIO(image))
+
+def check_image_limits(image: Union[str, bytes, Image.Image]) -> Tuple[int, int]:
+    """
+    检查图片的文件大小和像素数，只读取文件头，不解码像素
+    
+    Args:
+        image: 图片文件路径、原始图片字节或PIL Image对象
+        
+    Returns:
+        Tuple[int, int]: 图片尺寸(宽, 高)
+        
+    Raises:
+        ImageTooLarge: 超出 IMAGE_MAX_BYTES 或 IMAGE_MAX_PIXELS
+    """
+    if isinstance(image, Image.Image):
+        size = image.size
+    else:
+        num_bytes = os.path.getsize(image) if isinstance(image, str) else len(image)
+        if settings.image_max_bytes and num_bytes > settings.image_max_bytes:
+            raise ImageTooLarge(
+                f"图片文件过大（{num_bytes / 1024 / 1024:.1f} MB），"
+                f"上限为 {settings.image_max_bytes / 1024 / 1024:.0f} MB"
+            )
+        try:
+            with _open_image(image) as opened:
+                size = opened.size
+        except Image.DecompressionBombError:
+            raise ImageTooLarge("图片像素数过多")
+        
+    if settings.image_max_pixels and size[0] * size[1] > settings.image_max_pixels:
+        raise ImageTooLarge(
+            f"图片像素数过多（{size[0]}×{size[1]}），"
+            f"上限为 {settings.image_max_pixels / 1_000_000:.0f} MP"
+        )
+    return size
+
+def prepare_image(image: Union[str, bytes, Image.Image]) -> Tuple[str, bytes]:
+    """
+    将图片准备为发送给模型的字节：尺寸不超过 IMAGE_MAX_SIDE 时原样使用上传的字节，
+    否则在解码时直接缩小（JPEG通过draft按1/2、1/4、1/8比例解码），
+    再缩放到目标尺寸并重新编码，中间对象用完立即释放
+    
+    Args:
+        image: 图片文件路径、原始图片字节或PIL Image对象
+        
+    Returns:
+        Tuple[str, bytes]: (MIME类型, 图片字节)
+        
+    Raises:
+        ImageTooLarge: 超出大小或像素数限制
+    """
+    width, height = check_image_limits(image)
+    max_side = settings.image_max_side
+    if not max_side or max(width, height) <= max_side:
+        if isinstance(image, Image.Image):
+            buffered = io.BytesIO()
+            image.save(buffered, format="PNG")
+            return "image/png", buffered.getvalue()
+        if isinstance(image, str):
+            with open(image, "rb") as image_file:
+                return get_image_mime(image), image_file.read()
+        return get_image_mime(image), image
+        
+    scale = max_side / max(width, height)
+    target = (max(round(width * scale), 1), max(round(height * scale), 1))
+    if isinstance(image, Image.Image):
+        # 已解码的图片直接缩放为新图片，不修改调用方持有的对象
+        source_format = image.format
+        opened = image.resize(target, Image.LANCZOS)
+    else:
+        opened = _open_image(image)
+        source_format = opened.format
+    try:
+        # JPEG在解码阶段就按1/2、1/4、1/8中不小于目标尺寸的最大比例缩小
+        opened.draft(None, target)
+        opened.thumbnail((max_side, max_side), Image.LANCZOS)
+        # 重新编码会丢失EXIF，先按拍摄方向旋转
+        resized = ImageOps.exif_transpose(opened)
+        buffered = io.BytesIO()
+        if source_format == "JPEG":
+            resized.convert("RGB").save(buffered, format="JPEG", quality=90)
+            mime = "image/jpeg"
+        else:
+            resized.save(buffered, format="PNG")
+            mime = "image/png"
+        del resized
+    finally:
+        opened.close()
+    return mime, buffered.getvalue()
+
+def _image_cache_key(image: Union[str, bytes, Image.Image]) -> Optional[Tuple]:
+    """生成图片内容的缓存键（已解码的PIL图片不缓存，返回None）"""
+    if isinstance(image, str):
+        stat = os.stat(image)
+        return ('path', image, stat.st_mtime_ns, stat.st_size)
+    if isinstance(image, bytes):
+        return ('bytes', hashlib.sha1(image).hexdigest())
+    # 为像素数据计算哈希的开销与重新编码相当
+    return None
+
+def encode_image_cached(image: Union[str, bytes, Image.Image]) -> Tuple[str, str]:
+    """
+    编码图片并按内容缓存，相同图片不会重复编码（过大的图片先缩小，见prepare_image）
+    
+    Args:
+        image: 图片文件路径、原始图片字节或PIL Image对象
+        
+    Returns:
+        Tuple[str, str]: (MIME类型, base64编码的图片数据)
+    """
+    global _encode_cache_bytes
+    key = _image_cache_key(image)
+    if key is not None:
+        with _encode_cache_lock:
+            cached = _encode_cache.get(key)
+            if cached is not None:
+                _encode_cache.move_to_end(key)
+                return cached
+            
+    mime, data = prepare_image(image)
+    result = (mime, base64.b64encode(data).decode('utf-8'))
+    del data
+    size = len(result[1])
+    if key is None or size > settings.image_cache_bytes:
+        return result
+    with _encode_cache_lock:
+        previous = _encode_cache.pop(key, None)
+        if previous is not None:
+            _encode_cache_bytes -= len(previous[1])
+        _encode_cache[key] = result
+        _encode_cache_bytes += size
+        while _encode_cache_bytes > settings.image_cache_bytes:
+            _, evicted = _encode_cache.popitem(last=False)
+            _encode_cache_bytes -= len(evicted[1])
+    return result
+
 def convert_formula_format(text: str) -> str:
     """
     转换公式格式，将\\[...\\]转换为$$...$$，将\\(...\\)转换为$...$
@@ -65,12 +285,146 @@ def convert_formula_format(text: str) -> str:
             i += 1
     return result
 
+class FormulaStreamConverter:
+    """流式转换LaTeX公式标记：\\[...\\]转为$$...$$，\\(...\\)转为$...$"""
+    def __init__(self):
+        """初始化转换状态"""
+        self.buffer = []
+        self.formula_buffer = []
+        self.in_formula = False
+        self.latex_start = ""  # 记录LaTeX公式的开始标记
+
+    def feed(self, content: str) -> None:
+        """
+        输入一段流式文本
+        
+        Args:
+            content: 新收到的文本片段
+        """
+        buffer = self.buffer
+        for char in content:
+            if not self.in_formula:
+                if char == '\\':
+                    self.latex_start = char
+                    continue
+                elif self.latex_start:
+                    self.latex_start += char
+                    if self.latex_start == "\\[" or self.latex_start == "\\(":
+                        self.in_formula = True
+                        self.formula_buffer = []
+                        buffer.append("$$" if self.latex_start == "\\[" else "$")
+                        self.latex_start = ""
+                    elif len(self.latex_start) > 1:
+                        buffer.extend(list(self.latex_start))
+                        self.latex_start = ""
+                else:
+                    buffer.append(char)
+            else:
+                formula_buffer = self.formula_buffer
+                formula_buffer.append(char)
+                if (len(formula_buffer) >= 2 and
+                    formula_buffer[-2] == '\\' and
+                    formula_buffer[-1] == ']'):
+                    self.in_formula = False
+                    buffer.extend(formula_buffer[:-2])
+                    buffer.append("$$")
+                    self.formula_buffer = []
+                elif (len(formula_buffer) >= 2 and
+                      formula_buffer[-2] == '\\' and
+                      formula_buffer[-1] == ')'):
+                    self.in_formula = False
+                    buffer.extend(formula_buffer[:-2])
+                    buffer.append("$")
+                    self.formula_buffer = []
+
+    @property
+    def text(self) -> str:
+        """已完成转换的文本（不含尚未闭合的公式）"""
+        return ''.join(self.buffer)
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数：中日韩字符约1个token，其余字符约4个字符1个token
+    
+    Args:
+        text: 文本
+        
+    Returns:
+        int: 估算的token数
+    """
+    cjk = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def extract_boxed_answers(text: str) -> List[str]:
+    """
+    提取文本中所有 \\boxed{...} 的内容（支持嵌套花括号）
+    
+    Args:
+        text: 解答文本
+        
+    Returns:
+        List[str]: 按出现顺序排列的答案
+    """
+    answers = []
+    marker = "\\boxed{"
+    start = text.find(marker)
+    while start != -1:
+        index = start + len(marker)
+        depth = 1
+        while index < len(text) and depth:
+            if text[index] == '{':
+                depth += 1
+            elif text[index] == '}':
+                depth -= 1
+            index += 1
+        if depth == 0:
+            answers.append(text[start + len(marker):index - 1].strip())
+        start = text.find(marker, index)
+    return answers
+
+# 行间公式（$$...$$ 或 \[...\]）
+DISPLAY_MATH_PATTERN = re.compile(r"\$\$(.+?)\$\$|\\\[(.+?)\\\]", re.S)
+
+def extract_final_answers(text: str) -> List[str]:
+    """
+    提取解答的最终答案：优先取 \\boxed{...}，没有时取最后一个行间公式
+    
+    Args:
+        text: 解答文本
+        
+    Returns:
+        List[str]: 最终答案列表，无法提取时为空
+    """
+    boxed = extract_boxed_answers(text)
+    if boxed:
+        return boxed
+    formulas = DISPLAY_MATH_PATTERN.findall(text)
+    if not formulas:
+        return []
+    last = next(part for part in formulas[-1] if part).strip()
+    return [last] if last else []
+
+def normalize_answer(answer: str) -> str:
+    """
+    规范化答案以便比较（去除空白、排版命令和末尾标点）
+    
+    Args:
+        answer: 答案文本
+        
+    Returns:
+        str: 规范化后的答案
+    """
+    answer = answer.replace("\\dfrac", "\\frac").replace("\\tfrac", "\\frac")
+    for token in ("\\left", "\\right", "\\displaystyle", "\\,", "\\!", "\\;"):
+        answer = answer.replace(token, "")
+    return "".join(answer.split()).rstrip("。.,，;；")
+
 import zipfile
 import tempfile
 
 def save_solution(
     text_input: str,
-    image: Union[str, Image.Image, None],
+    image: Any,
     solution_content: str,
     output_dir: str = "solutions"
 ) -> tuple[str, str]:
@@ -79,7 +433,7 @@ def save_solution(
     
     Args:
         text_input: 题目文本
-        image: 题目图片（可选）
+        image: 题目图片（可选，单张或多张）
         solution_content: 解答内容
         output_dir: 输出目录
         
@@ -89,22 +443,37 @@ def save_solution(
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 生成时间戳
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 生成时间戳（附加随机后缀，避免多个工作进程同一秒写入时重名）
+    timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
     
     # 保存图片（如果有）
-    if image is not None:
-        image_filename = f"image_{timestamp}.png"
+    images = normalize_images(image)
+    image_paths = []
+    image_content = ""
+    for index, item in enumerate(images, start=1):
+        suffix = f"_{index}" if len(images) > 1 else ""
+        # 上传的原始字节按识别出的格式原样保存，无法识别的格式和PIL图片保存为PNG
+        data = None
+        if isinstance(item, str):
+            with open(item, "rb") as image_file:
+                data = image_file.read()
+        elif isinstance(item, bytes):
+            data = item
+        extension = IMAGE_EXTENSIONS.get(_sniff_image_mime(data[:12])) if data else None
+        image_filename = f"image_{timestamp}{suffix}{extension or '.png'}"
         image_path = os.path.join(output_dir, image_filename)
-        if isinstance(image, str):
-            Image.open(image).save(image_path)
+        if extension:
+            with open(image_path, "wb") as image_file:
+                image_file.write(data)
+        elif data is not None:
+            with Image.open(io.BytesIO(data)) as opened:
+                opened.save(image_path, format="PNG")
         else:
-            image.save(image_path)
+            item.save(image_path, format="PNG")
+        image_paths.append(image_path)
             
         # 处理图片引用
-        image_content = f"![题目图片](./{image_filename})\n\n"
-    else:
-        image_content = ""
+        image_content += f"![题目图片{index if len(images) > 1 else ''}](./{image_filename})\n\n"
     
     # 生成解答文件名
     filename = f"solution_{timestamp}.md"
@@ -123,6 +492,16 @@ def save_solution(
     with open(file_path, "w", encoding="utf-8") as f:
         f.write("".join(content))
     
+    # 生成预渲染的HTML版本（公式已渲染为MathML，浏览器无需再排版）
+    html_filename = f"solution_{timestamp}.html"
+    html_path = os.path.join(output_dir, html_filename)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(
+            '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+            '<title>理论力学题目求解</title>\n</head>\n<body>\n'
+            f'{render_markdown("".join(content))}\n</body>\n</html>\n'
+        )
+    
     # 创建临时zip文件
     zip_filename = f"solution_{timestamp}.zip"
     zip_path = os.path.join(output_dir, zip_filename)
@@ -131,8 +510,9 @@ def save_solution(
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
         # 添加markdown文件
         zipf.write(file_path, os.path.basename(file_path))
+        zipf.write(html_path, html_filename)
         # 如果有图片，也添加到zip中
-        if image is not None:
+        for image_path in image_paths:
             zipf.write(image_path, os.path.basename(image_path))
     
     return zip_path, zip_filename
\ No newline at end of file
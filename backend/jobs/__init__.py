@@ -0,0 +1,6 @@
+"""异步任务模块"""
+
+from .store import job_store
+from .worker import JobWorkerPool
+
+__all__ = ['job_store', 'JobWorkerPool']
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""单独启动任务工作进程池"""
+
+import time
+
+from backend.config.settings import settings
+from backend.core.quota import usage_tracker
+from backend.jobs.worker import JobWorkerPool
+
+if __name__ == "__main__":
+    pool = JobWorkerPool(max(settings.job_workers, 1))
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
+        usage_tracker.stop()
\ No newline at end of file
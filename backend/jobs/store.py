@@ -0,0 +1,297 @@
+"""任务持久化存储模块"""
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend.config.settings import settings
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+class JobStore:
+    """基于SQLite的任务队列"""
+    def __init__(self, db_path: str):
+        """
+        初始化任务存储（数据库文件在首次使用时创建，导入模块不会写入文件）
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """创建数据库连接（每次操作独立连接，可跨进程使用）"""
+        if not self._initialized:
+            self._init_db()
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        """创建目录和任务表"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                self._create_tables(conn)
+            finally:
+                conn.close()
+            self._initialized = True
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection) -> None:
+        """创建任务表"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                username TEXT,
+                text TEXT NOT NULL,
+                complex_mode INTEGER NOT NULL DEFAULT 0,
+                output TEXT NOT NULL DEFAULT '',
+                log TEXT NOT NULL DEFAULT '',
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_images (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (job_id, position)
+            )
+        """)
+
+    def submit(
+        self,
+        text: str,
+        images: Optional[List[bytes]] = None,
+        complex_mode: bool = False,
+        username: Optional[str] = None
+    ) -> str:
+        """
+        提交新任务
+
+        Args:
+            text: 题目文本
+            images: 题目图片原始字节列表（可选）
+            complex_mode: 是否使用复杂模式
+            username: 提交用户
+
+        Returns:
+            str: 任务ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO jobs (id, status, username, text, complex_mode, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, username, text, int(complex_mode), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_images (job_id, position, data) VALUES (?, ?, ?)",
+                [(job_id, position, data) for position, data in enumerate(images or [])]
+            )
+            conn.execute("COMMIT")
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        原子地领取最早的排队任务
+
+        Args:
+            worker: 工作进程标识
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务数据，无任务时返回None
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (STATUS_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (STATUS_RUNNING, worker, time.time(), row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            image_rows = conn.execute(
+                "SELECT data FROM job_images WHERE job_id = ? ORDER BY position",
+                (row["id"],)
+            ).fetchall()
+        job = dict(row)
+        job["attempts"] += 1
+        job["worker"] = worker
+        job["images"] = [image_row["data"] for image_row in image_rows]
+        return job
+
+    def checkpoint(self, job_id: str, worker: str, output: str, log: str = "") -> bool:
+        """
+        保存任务的阶段性输出（仅在该工作进程仍持有租约时写入）
+
+        Args:
+            job_id: 任务ID
+            worker: 工作进程标识
+            output: 当前输出
+            log: 当前日志
+
+        Returns:
+            bool: 租约已失效（任务被回收或重新领取）时返回False
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET output = ?, log = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (output, log, time.time(), job_id, worker, STATUS_RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, worker: str, output: str, log: str = "") -> bool:
+        """标记任务完成（仅在该工作进程仍持有租约时写入）"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, output = ?, log = ?, updated_at = ?, "
+                "finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (STATUS_DONE, output, log, now, now, job_id, worker, STATUS_RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """标记任务失败（仅在该工作进程仍持有租约时写入）"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (STATUS_FAILED, error, now, now, job_id, worker, STATUS_RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """
+        续租：刷新运行中任务的更新时间
+
+        Args:
+            job_id: 任务ID
+            worker: 工作进程标识
+
+        Returns:
+            bool: 任务仍由该工作进程持有时返回True（已被回收或重新领取时返回False）
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (time.time(), job_id, STATUS_RUNNING, worker)
+            )
+            return cursor.rowcount > 0
+
+    def requeue_stale(self, lease_timeout: float) -> int:
+        """
+        将中断的运行中任务重新放回队列
+
+        Args:
+            lease_timeout: 超过该秒数未更新（未续租）的任务视为中断
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL "
+                "WHERE status = ? AND updated_at < ?",
+                (STATUS_QUEUED, STATUS_RUNNING, time.time() - lease_timeout)
+            )
+            return cursor.rowcount
+
+    def running_workers(self) -> List[str]:
+        """列出持有运行中任务的工作进程标识"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE status = ? AND worker IS NOT NULL",
+                (STATUS_RUNNING,)
+            ).fetchall()
+        return [row["worker"] for row in rows]
+
+    def requeue_worker(self, worker: str) -> int:
+        """
+        立即将指定工作进程持有的运行中任务放回队列（用于已确认退出的工作进程，无需等待租约过期）
+
+        Args:
+            worker: 工作进程标识
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND worker = ?",
+                (STATUS_QUEUED, STATUS_RUNNING, worker)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务（不含图片数据）
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务数据，不存在时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, username, complex_mode, output, log, error, attempts, "
+                "created_at, updated_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def count(self, status: str) -> int:
+        """统计指定状态的任务数"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+# 创建全局任务存储实例
+job_store = JobStore(settings.job_db_path)
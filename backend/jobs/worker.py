@@ -0,0 +1,256 @@
+"""任务工作进程池模块"""
+
+import os
+import time
+import socket
+import threading
+import multiprocessing
+from typing import List, Optional
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+from backend.jobs.store import job_store
+
+def _heartbeat_loop(
+    job_id: str,
+    worker_id: str,
+    stop: threading.Event,
+    lease_lost: threading.Event
+) -> None:
+    """
+    定期续租，避免推理模型长时间没有输出时租约过期、任务被其他工作进程重复执行
+
+    Args:
+        job_id: 任务ID
+        worker_id: 工作进程标识
+        stop: 任务结束时设置的停止事件
+        lease_lost: 租约失效时设置的事件（通知任务中止执行）
+    """
+    while not stop.wait(settings.job_heartbeat_interval):
+        try:
+            if not job_store.heartbeat(job_id, worker_id):
+                logger.logger.warning(f"任务 {job_id} 的租约已失效，停止续租")
+                lease_lost.set()
+                return
+        except Exception as e:
+            # 续租失败时下个周期重试
+            logger.log_error(f"任务 {job_id} 续租出错：{str(e)}")
+
+def run_job(job: dict, worker_id: str) -> None:
+    """
+    执行单个任务，并定期保存阶段性输出
+
+    Args:
+        job: 任务数据
+        worker_id: 工作进程标识
+    """
+    # 延迟导入，避免主进程在创建进程池时初始化模型客户端
+    from backend.core.solver import problem_solver
+    from backend.core.scheduler import lane_scheduler
+    from backend.core.utils import estimate_tokens
+
+    job_id = job["id"]
+    logger.logger.info(f"工作进程 {worker_id} 开始执行任务 {job_id}（第{job['attempts']}次）")
+    # 重试时从上次保存的输出继续
+    resume_output = job.get("output") or ""
+    output, log = resume_output, job.get("log") or ""
+    last_checkpoint = 0.0
+    stop_heartbeat = threading.Event()
+    lease_lost = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat_loop,
+        args=(job_id, worker_id, stop_heartbeat, lease_lost),
+        name=f"job-heartbeat-{job_id[:8]}",
+        daemon=True
+    )
+    heartbeat.start()
+    ticket = None
+
+    try:
+        # 与界面和API请求一样经过调度通道（按用户公平调度，并计入用户用量）
+        ticket = lane_scheduler.enter_when_available(
+            lane_scheduler.lane_for(bool(job["complex_mode"])), job.get("username") or ""
+        )
+        for step in problem_solver.solve_problem(
+            job["text"], job["images"], bool(job["complex_mode"]),
+            resume_output=resume_output
+        ):
+            solution, step_log = step if isinstance(step, tuple) else (step, "")
+            if solution:
+                output = solution
+            if step_log:
+                log = step_log
+
+            now = time.monotonic()
+            if now - last_checkpoint >= settings.job_checkpoint_interval:
+                if not job_store.checkpoint(job_id, worker_id, output, log):
+                    lease_lost.set()
+                last_checkpoint = now
+            if lease_lost.is_set():
+                # 任务已被回收或由其他工作进程重新领取，停止执行，避免重复消耗
+                logger.logger.warning(f"任务 {job_id} 的租约已失效，中止执行")
+                return
+
+        if job_store.finish(job_id, worker_id, output, log):
+            logger.logger.info(f"任务 {job_id} 执行完成")
+        else:
+            logger.logger.warning(f"任务 {job_id} 的租约已失效，丢弃执行结果")
+    except Exception as e:
+        logger.log_error(f"任务 {job_id} 执行出错：{str(e)}")
+        if job_store.checkpoint(job_id, worker_id, output, log):
+            job_store.fail(job_id, worker_id, str(e))
+    finally:
+        if ticket is not None:
+            lane_scheduler.release(ticket, estimate_tokens(job["text"]) + estimate_tokens(output))
+        stop_heartbeat.set()
+        heartbeat.join()
+
+def worker_loop(worker_id: str) -> None:
+    """
+    工作进程主循环：不断领取并执行排队任务（单次出错只记录日志，不会退出进程）
+
+    Args:
+        worker_id: 工作进程标识
+    """
+    while True:
+        try:
+            # 回收超时未更新（工作进程崩溃）的任务
+            job_store.requeue_stale(settings.job_lease_timeout)
+
+            job = job_store.claim(worker_id)
+            if job is None:
+                time.sleep(settings.job_poll_interval)
+                continue
+
+            if job["attempts"] > settings.job_max_attempts:
+                job_store.fail(
+                    job["id"], worker_id, f"超过最大重试次数（{settings.job_max_attempts}）"
+                )
+                continue
+
+            run_job(job, worker_id)
+        except Exception as e:
+            # 如数据库暂时被锁定，稍后重试
+            logger.log_error(f"工作进程 {worker_id} 出错：{str(e)}")
+            time.sleep(settings.job_poll_interval)
+
+def _worker_prefix() -> str:
+    """当前进程池的工作进程标识前缀（主机名:进程号）"""
+    return f"{socket.gethostname()}:{os.getpid()}-"
+
+def _is_orphaned(worker_id: str) -> bool:
+    """
+    判断任务持有者是否为本机已退出的进程池（如服务重启），这类任务无需等待租约过期
+
+    Args:
+        worker_id: 工作进程标识
+
+    Returns:
+        bool: 持有者所在进程池已不存在时返回True
+    """
+    host, _, rest = worker_id.rpartition(":")
+    if host != socket.gethostname():
+        return False
+    try:
+        pid = int(rest.split("-", 1)[0])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # 无权限等情况视为进程仍存在
+        return False
+    return False
+
+class JobWorkerPool:
+    """任务工作进程池"""
+    def __init__(self, num_workers: int):
+        """
+        初始化进程池
+
+        Args:
+            num_workers: 工作进程数量
+        """
+        self.num_workers = num_workers
+        self.processes: List[multiprocessing.Process] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """恢复中断任务、启动工作进程，并在后台重启意外退出的工作进程"""
+        # 本机已退出的进程池（如服务重启前）持有的任务立即恢复；
+        # 工作进程尚未启动，使用本进程标识的任务也来自重启前（容器内进程号可能相同）
+        prefix = _worker_prefix()
+        resumed = sum(
+            job_store.requeue_worker(worker)
+            for worker in job_store.running_workers()
+            if worker.startswith(prefix) or _is_orphaned(worker)
+        )
+        # 其他进程池中的任务只在租约过期后回收，仍在运行的任务不受影响
+        resumed += job_store.requeue_stale(settings.job_lease_timeout)
+        if resumed:
+            logger.logger.info(f"恢复 {resumed} 个中断的任务")
+
+        self.processes = [self._spawn(f"{prefix}{index}", index) for index in range(self.num_workers)]
+        self._stop.clear()
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="job-worker-monitor", daemon=True
+        )
+        self._monitor.start()
+        logger.logger.info(f"已启动 {self.num_workers} 个任务工作进程")
+
+    def _spawn(self, worker_id: str, index: int) -> multiprocessing.Process:
+        """启动单个工作进程"""
+        process = self._context.Process(
+            target=worker_loop,
+            args=(worker_id,),
+            name=f"job-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def check_workers(self) -> int:
+        """
+        重启已退出的工作进程，其持有的任务立即放回队列
+
+        Returns:
+            int: 重启的工作进程数
+        """
+        restarted = 0
+        prefix = _worker_prefix()
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or self._stop.is_set():
+                continue
+            worker_id = f"{prefix}{index}"
+            requeued = job_store.requeue_worker(worker_id)
+            logger.logger.warning(
+                f"工作进程 {worker_id} 已退出（退出码 {process.exitcode}），"
+                f"重新启动并恢复 {requeued} 个任务"
+            )
+            self.processes[index] = self._spawn(worker_id, index)
+            restarted += 1
+        return restarted
+
+    def _monitor_loop(self) -> None:
+        """定期检查工作进程是否存活"""
+        while not self._stop.wait(settings.job_poll_interval):
+            try:
+                self.check_workers()
+            except Exception as e:
+                logger.log_error(f"检查任务工作进程出错：{str(e)}")
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """停止全部工作进程，运行中的任务会在下次启动时恢复"""
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+            self._monitor = None
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout)
+        self.processes = []
\ No newline at end of file
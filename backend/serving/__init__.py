@@ -0,0 +1,5 @@
+"""部署模块"""
+
+from .multiworker import run_multiworker
+
+__all__ = ['run_multiworker']
\ No newline at end of file
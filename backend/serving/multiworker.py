@@ -0,0 +1,240 @@
+"""多进程部署模块"""
+
+import asyncio
+import multiprocessing
+from typing import List, Optional
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+
+# 单次转发的读取块大小
+PIPE_CHUNK_SIZE = 64 * 1024
+# 请求头结束标记
+HEADER_END = b"\r\n\r\n"
+# 记录界面会话所在工作进程的Cookie名称
+STICKY_COOKIE = b"theoryx_worker"
+
+def _run_worker(app_factory: str, port: int) -> None:
+    """
+    工作进程入口：在本地端口上运行完整应用
+
+    Args:
+        app_factory: 应用工厂的导入路径，例如 "main:create_app"
+        port: 监听端口
+    """
+    import uvicorn
+
+    uvicorn.run(app_factory, factory=True, host="127.0.0.1", port=port, log_level="warning")
+
+class LocalProxy:
+    """
+    本地TCP反向代理
+
+    /api/ 请求按最少连接数分配到各工作进程；其余请求（Gradio界面）首次按最少连接数
+    分配，并在响应中设置Cookie记录所选工作进程，之后同一浏览器的请求固定到该进程，
+    保证同一会话的队列请求落在同一进程上（同一出口IP后的多个用户仍会被分散）。
+
+    转发时要求工作进程在响应后关闭连接，客户端的下一个请求会使用新连接并重新选择
+    工作进程，使保持连接（keep-alive）上的后续请求同样遵循分配策略。
+    """
+    def __init__(self, ports: List[int]):
+        """
+        初始化代理
+
+        Args:
+            ports: 各工作进程的本地端口
+        """
+        self.ports = ports
+        self.active = [0] * len(ports)
+
+    def _pick(self, path: bytes, sticky: Optional[int] = None) -> List[int]:
+        """
+        返回按优先级排序的后端下标列表
+
+        Args:
+            path: 请求路径
+            sticky: 界面请求的Cookie中记录的工作进程下标
+
+        Returns:
+            List[int]: 后端下标列表（记录的进程不可用时依次尝试其余进程）
+        """
+        ranked = sorted(range(len(self.ports)), key=lambda i: self.active[i])
+        if path.startswith(b"/api/") or sticky is None:
+            return ranked
+        return [sticky] + [index for index in ranked if index != sticky]
+
+    def _sticky_worker(self, head: bytes) -> Optional[int]:
+        """从请求头的Cookie中读取界面会话所在的工作进程下标"""
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() != b"cookie":
+                continue
+            for cookie in value.split(b";"):
+                key, _, index = cookie.strip().partition(b"=")
+                if key == STICKY_COOKIE and index.isdigit() and int(index) < len(self.ports):
+                    return int(index)
+        return None
+
+    @staticmethod
+    def _set_cookie(head: bytes, index: int) -> bytes:
+        """在响应头中加入记录工作进程的Cookie"""
+        cookie = b"Set-Cookie: %s=%d; Path=/; HttpOnly; SameSite=Lax" % (STICKY_COOKIE, index)
+        return head[:-len(HEADER_END)] + b"\r\n" + cookie + HEADER_END
+
+    @staticmethod
+    async def _pipe(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        half_close: bool = False
+    ) -> None:
+        """
+        单向转发数据直到连接关闭
+
+        Args:
+            reader: 数据来源
+            writer: 数据去向
+            half_close: 读到EOF时只关闭写方向（客户端发完请求后半关闭连接时，仍需转发响应）
+        """
+        try:
+            while True:
+                data = await reader.read(PIPE_CHUNK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            if half_close and writer.can_write_eof():
+                writer.write_eof()
+                return
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+    async def _forward_response(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        sticky: Optional[int] = None
+    ) -> None:
+        """
+        转发工作进程的响应
+
+        Args:
+            reader: 工作进程连接
+            writer: 客户端连接
+            sticky: 需要写入Cookie的工作进程下标（None表示原样转发）
+        """
+        if sticky is not None:
+            try:
+                head = await reader.readuntil(HEADER_END)
+                writer.write(self._set_cookie(head, sticky))
+            except asyncio.IncompleteReadError as e:
+                writer.write(e.partial)
+            except (asyncio.LimitOverrunError, ConnectionError):
+                pass
+        await self._pipe(reader, writer)
+
+    @staticmethod
+    def _close_after_response(head: bytes) -> bytes:
+        """
+        改写请求头，要求工作进程在响应后关闭连接
+
+        协议升级请求（如WebSocket）本身就是独占的长连接，保持不变。
+
+        Args:
+            head: 请求行和请求头（以空行结尾）
+
+        Returns:
+            bytes: 改写后的请求头
+        """
+        lines = head[:-len(HEADER_END)].split(b"\r\n")
+        if any(line.lower().startswith(b"upgrade:") for line in lines[1:]):
+            return head
+        kept = [lines[0]] + [
+            line for line in lines[1:] if not line.lower().startswith(b"connection:")
+        ]
+        return b"\r\n".join(kept + [b"Connection: close"]) + HEADER_END
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个客户端连接（只转发一个请求）"""
+        try:
+            head = await reader.readuntil(HEADER_END)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        request_line = head.split(b"\r\n", 1)[0]
+        parts = request_line.split(b" ")
+        path = parts[1] if len(parts) > 1 else b"/"
+        is_ui = not path.startswith(b"/api/")
+        sticky = self._sticky_worker(head) if is_ui else None
+
+        for index in self._pick(path, sticky):
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(
+                    "127.0.0.1", self.ports[index]
+                )
+            except OSError:
+                continue
+            self.active[index] += 1
+            try:
+                upstream_writer.write(self._close_after_response(head))
+                await asyncio.gather(
+                    self._pipe(reader, upstream_writer, half_close=True),
+                    self._forward_response(
+                        upstream_reader, writer, index if is_ui and index != sticky else None
+                    )
+                )
+            finally:
+                self.active[index] -= 1
+                upstream_writer.close()
+            return
+
+        writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n")
+        writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        """在公开端口上运行代理"""
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+def run_multiworker(
+    app_factory: str,
+    num_workers: int,
+    host: str = "0.0.0.0",
+    port: Optional[int] = None
+) -> None:
+    """
+    启动多个应用工作进程，并通过本地代理对外提供单一端口
+
+    端点冷却状态、用户额度、指标和解答文件通过本地存储在各进程间共享；调度通道的并发数与
+    排队数、渲染缓存和图片编码缓存按进程独立计算，实际并发上限为配置值乘以进程数。
+
+    Args:
+        app_factory: 应用工厂的导入路径
+        num_workers: 工作进程数量
+        host: 对外监听地址
+        port: 对外监听端口
+    """
+    port = port or settings.server_port
+    ports = [settings.worker_base_port + index for index in range(num_workers)]
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_port in ports:
+        process = context.Process(
+            target=_run_worker,
+            args=(app_factory, worker_port),
+            name=f"app-worker-{worker_port}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    logger.logger.info(f"已启动 {num_workers} 个应用工作进程，对外端口 {port}")
+
+    try:
+        asyncio.run(LocalProxy(ports).serve(host, port))
+    finally:
+        for process in processes:
+            process.terminate()
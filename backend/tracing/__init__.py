@@ -0,0 +1,5 @@
+"""请求链路追踪模块"""
+
+from .tracer import tracer, Trace, Span, NULL_TRACE
+
+__all__ = ['tracer', 'Trace', 'Span', 'NULL_TRACE']
\ No newline at end of file
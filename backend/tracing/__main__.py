@@ -0,0 +1,24 @@
+"""
+汇总本地链路数据
+
+用法：
+    python -m backend.tracing [traces目录或文件 ...] --top 10
+"""
+
+import argparse
+
+from backend.tracing.summary import format_report, load_traces, summarize
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="汇总链路数据：各阶段耗时、关键路径与长尾请求")
+    parser.add_argument("paths", nargs="*", default=["traces"], help="traces目录或jsonl文件")
+    parser.add_argument("--top", type=int, default=10, help="列出的长尾请求数量")
+    parser.add_argument("--root", default="solve", help="统计的根span名称（all表示全部）")
+    args = parser.parse_args()
+
+    traces = load_traces(args.paths)
+    summaries = summarize(traces, None if args.root == "all" else args.root)
+    print(format_report(summaries, args.top))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""链路数据汇总：各阶段耗时分布、关键路径与长尾请求"""
+
+import os
+import json
+import glob
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+@dataclass
+class SpanRecord:
+    """从文件读取的span"""
+    span_id: str
+    parent_id: str
+    name: str
+    start_ns: int
+    end_ns: int
+    attributes: Dict[str, str] = field(default_factory=dict)
+    error: bool = False
+
+    @property
+    def seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+def _attribute_value(value: Dict[str, object]) -> str:
+    """取出OTLP属性值"""
+    return str(next(iter(value.values()))) if value else ""
+
+def load_traces(paths: Iterable[str]) -> Dict[str, List[SpanRecord]]:
+    """
+    读取OTLP JSON文件（目录中的 *.jsonl 或单个文件），按trace分组
+
+    Args:
+        paths: 文件或目录路径
+
+    Returns:
+        Dict[str, List[SpanRecord]]: {trace ID: span列表}
+    """
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path])
+
+    traces: Dict[str, List[SpanRecord]] = defaultdict(list)
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                for resource_spans in request.get("resourceSpans", []):
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        for span in scope_spans.get("spans", []):
+                            traces[span["traceId"]].append(SpanRecord(
+                                span["spanId"],
+                                span.get("parentSpanId", ""),
+                                span["name"],
+                                int(span["startTimeUnixNano"]),
+                                int(span["endTimeUnixNano"]),
+                                {item["key"]: _attribute_value(item["value"])
+                                 for item in span.get("attributes", [])},
+                                span.get("status", {}).get("code") == 2
+                            ))
+    return traces
+
+def critical_path(span: SpanRecord, children: Dict[str, List[SpanRecord]]) -> List[SpanRecord]:
+    """
+    计算span的关键路径：从结束时刻向前，依次选取在当前时刻之前最晚结束的子span并递归展开
+
+    Args:
+        span: 起始span
+        children: {父span ID: 子span列表}
+
+    Returns:
+        List[SpanRecord]: 按时间顺序排列的关键路径上的叶子span
+    """
+    path: List[SpanRecord] = []
+    cursor = span.end_ns
+    for child in sorted(children.get(span.span_id, []), key=lambda item: item.end_ns, reverse=True):
+        if child.end_ns <= cursor:
+            path = critical_path(child, children) + path
+            cursor = child.start_ns
+    return path or [span]
+
+def percentile(values: List[float], ratio: float) -> float:
+    """计算分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(ratio * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+@dataclass
+class TraceSummary:
+    """单个请求的汇总"""
+    trace_id: str
+    request_id: str
+    root_name: str
+    seconds: float
+    path: List[SpanRecord]
+    stage_seconds: Dict[str, float]
+    error: bool
+
+def summarize(traces: Dict[str, List[SpanRecord]], root_name: Optional[str] = "solve") -> List[TraceSummary]:
+    """
+    汇总每个请求
+
+    Args:
+        traces: 按trace分组的span
+        root_name: 只统计该名称的根span（为None时统计全部根span）
+
+    Returns:
+        List[TraceSummary]: 请求汇总列表
+    """
+    summaries = []
+    for trace_id, spans in traces.items():
+        children: Dict[str, List[SpanRecord]] = defaultdict(list)
+        for span in spans:
+            if span.parent_id:
+                children[span.parent_id].append(span)
+        for root in (span for span in spans if not span.parent_id):
+            if root_name and root.name != root_name:
+                continue
+            stage_seconds: Dict[str, float] = defaultdict(float)
+            for span in spans:
+                if span.parent_id:
+                    stage_seconds[span.name] += span.seconds
+            summaries.append(TraceSummary(
+                trace_id,
+                root.attributes.get("request.id", trace_id[:12]),
+                root.name,
+                root.seconds,
+                critical_path(root, children),
+                dict(stage_seconds),
+                root.error or any(span.error for span in spans)
+            ))
+    return summaries
+
+def format_report(summaries: List[TraceSummary], top: int = 10) -> str:
+    """
+    生成文本报告
+
+    Args:
+        summaries: 请求汇总列表
+        top: 列出的长尾请求数量
+
+    Returns:
+        str: 报告文本
+    """
+    if not summaries:
+        return "没有找到链路数据"
+
+    lines = []
+    totals = [summary.seconds for summary in summaries]
+    errors = sum(1 for summary in summaries if summary.error)
+    lines.append(f"请求数 {len(summaries)}，出错 {errors}")
+    lines.append(f"总耗时  p50 {percentile(totals, 0.5):.2f}s  p95 {percentile(totals, 0.95):.2f}s  "
+                 f"p99 {percentile(totals, 0.99):.2f}s  max {max(totals):.2f}s")
+
+    # 各阶段耗时分布
+    stages: Dict[str, List[float]] = defaultdict(list)
+    for summary in summaries:
+        for name, seconds in summary.stage_seconds.items():
+            stages[name].append(seconds)
+    lines.append("")
+    lines.append(f"{'阶段':<24}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, values in sorted(stages.items(), key=lambda item: -percentile(item[1], 0.95)):
+        lines.append(f"{name:<24}{len(values):>6}{percentile(values, 0.5):>9.2f}s"
+                     f"{percentile(values, 0.95):>9.2f}s{percentile(values, 0.99):>9.2f}s"
+                     f"{max(values):>9.2f}s")
+
+    # 关键路径：最常见的阶段序列，以及各阶段在关键路径上的平均占比
+    path_counter = Counter(" → ".join(span.name for span in summary.path) for summary in summaries)
+    share: Dict[str, float] = defaultdict(float)
+    for summary in summaries:
+        for span in summary.path:
+            share[span.name] += span.seconds / max(summary.seconds, 1e-9)
+    lines.append("")
+    lines.append("最常见的关键路径：")
+    for path, count in path_counter.most_common(3):
+        lines.append(f"  {count:>4} 次  {path}")
+    lines.append("关键路径上各阶段的平均耗时占比：")
+    for name, value in sorted(share.items(), key=lambda item: -item[1]):
+        lines.append(f"  {name:<24}{value / len(summaries) * 100:>6.1f}%")
+
+    # 长尾请求：超过p95的请求，按耗时降序，并给出耗时最长的关键路径阶段
+    threshold = percentile(totals, 0.95)
+    outliers = sorted(
+        (summary for summary in summaries if summary.seconds >= threshold),
+        key=lambda summary: -summary.seconds
+    )[:top]
+    lines.append("")
+    lines.append(f"长尾请求（≥ p95 {threshold:.2f}s）：")
+    for summary in outliers:
+        slowest = max(summary.path, key=lambda span: span.seconds)
+        mode = " 出错" if summary.error else ""
+        lines.append(f"  {summary.request_id}  {summary.seconds:>8.2f}s  "
+                     f"最慢阶段 {slowest.name} {slowest.seconds:.2f}s{mode}")
+    return "\n".join(lines)
@@ -0,0 +1,228 @@
+"""请求链路追踪模块"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from backend.config.settings import settings
+from backend.logger.log_config import logger
+
+# OTLP中的span类型与状态码
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+def trace_id_for(request_id: str) -> str:
+    """由请求ID确定性地生成32位十六进制的trace ID（同一请求的各次导出归入同一trace）"""
+    return uuid.uuid5(uuid.NAMESPACE_OID, request_id).hex
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """转换为OTLP JSON的属性值"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class Span:
+    """一段计时区间"""
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent_id: str = "",
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        """
+        初始化并开始计时
+
+        Args:
+            trace: 所属链路
+            name: 名称
+            parent_id: 父span ID
+            attributes: 属性
+        """
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性"""
+        self.attributes[key] = value
+
+    def end(self, error: Optional[str] = None) -> None:
+        """结束计时（重复调用无效）"""
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        self.error = error
+        self.trace._finished.append(self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.end(repr(exc_value) if exc_value is not None else None)
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        """转换为OTLP JSON格式"""
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": STATUS_CODE_ERROR if self.error else STATUS_CODE_OK},
+        }
+        if self.error:
+            span["status"]["message"] = self.error
+        return span
+
+class Trace:
+    """一次请求的链路，根span覆盖整个请求"""
+    def __init__(self, tracer: "Tracer", name: str, request_id: str, attributes: Dict[str, Any]):
+        """
+        初始化并开始根span
+
+        Args:
+            tracer: 追踪器
+            name: 根span名称
+            request_id: 请求ID
+            attributes: 根span属性
+        """
+        self.tracer = tracer
+        self.request_id = request_id
+        self.trace_id = trace_id_for(request_id)
+        self._finished: List[Span] = []
+        self.root = Span(self, name, attributes={"request.id": request_id, **attributes})
+
+    @property
+    def log_prefix(self) -> str:
+        """日志行前缀，用于将日志与请求关联"""
+        return f"[{self.request_id}] "
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """
+        开始一个子span（可作为上下文管理器使用，或手动调用end）
+
+        Args:
+            name: 名称
+            parent: 父span，默认为根span
+            **attributes: 属性
+
+        Returns:
+            Span: 已开始计时的span
+        """
+        return Span(self, name, (parent or self.root).span_id, attributes)
+
+    def end(self, error: Optional[str] = None) -> None:
+        """结束根span并导出整条链路"""
+        if self.root.end_ns:
+            return
+        self.root.end(error)
+        self.tracer.export(self)
+
+class _NullSpan:
+    """未启用追踪时使用的空span"""
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self, error: Optional[str] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+class _NullTrace:
+    """未启用追踪时使用的空链路"""
+    request_id = ""
+    log_prefix = ""
+    root = _NullSpan()
+
+    def span(self, name: str, parent: Any = None, **attributes) -> _NullSpan:
+        return _NULL_SPAN
+
+    def end(self, error: Optional[str] = None) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACE = _NullTrace()
+
+class Tracer:
+    """链路追踪器：以OTLP JSON格式（每行一条ExportTraceServiceRequest）写入本地文件"""
+    def __init__(self, enabled: bool, output_dir: str, service_name: str):
+        """
+        初始化
+
+        Args:
+            enabled: 是否启用
+            output_dir: 输出目录，按天生成 traces-YYYYmmdd.jsonl
+            service_name: 服务名称
+        """
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str, request_id: str, **attributes) -> Any:
+        """
+        开始一条链路
+
+        Args:
+            name: 根span名称
+            request_id: 请求ID
+            **attributes: 根span属性
+
+        Returns:
+            Trace: 链路；未启用时返回不做任何记录的空链路
+        """
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(self, name, request_id, attributes)
+
+    def export(self, trace: Trace) -> None:
+        """将链路中已结束的span写入文件"""
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "theoryx.tracing"},
+                    "spans": [span.to_otlp(trace.trace_id) for span in trace._finished],
+                }],
+            }]
+        }
+        line = json.dumps(request, ensure_ascii=False) + "\n"
+        path = os.path.join(self.output_dir, f"traces-{datetime.now().strftime('%Y%m%d')}.jsonl")
+        try:
+            with self._lock:
+                os.makedirs(self.output_dir, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as e:
+            logger.log_error(f"写入链路数据出错：{str(e)}")
+
+# 创建全局追踪器实例
+tracer = Tracer(settings.tracing_enabled, settings.trace_dir, settings.trace_service_name)
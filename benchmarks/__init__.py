@@ -0,0 +1 @@
+"""性能测试与压测脚本"""
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+流式数据块解析开销基准测试
+
+对比SDK标准路径（构建ChatCompletionChunk对象）与原始SSE快速路径的
+每个数据块CPU耗时。HTTP响应由内存中的MockTransport提供，不访问网络。
+
+用法：
+    python -m benchmarks.chunk_parsing --chunks 20000 --rounds 5
+"""
+
+import json
+import time
+import argparse
+import httpx
+from openai import OpenAI
+
+from backend.core.stream_parser import iter_chunk_content, iter_raw_sse_content
+
+def build_sse_body(num_chunks: int) -> bytes:
+    """构造模拟的SSE响应体"""
+    base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": "bench"}
+    lines = []
+    for index in range(num_chunks):
+        delta = {"content": f"力学{index % 10}"} if index else {"role": "assistant", "content": ""}
+        chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        lines.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+def make_client(body: bytes) -> OpenAI:
+    """创建使用内存响应的客户端"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body)
+
+    return OpenAI(
+        api_key="bench",
+        base_url="http://bench.local/v1",
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+def run_standard(client: OpenAI) -> int:
+    """标准路径"""
+    stream = client.chat.completions.create(model="bench", messages=[], stream=True)
+    return sum(1 for _ in iter_chunk_content(stream))
+
+def run_fast(client: OpenAI) -> int:
+    """快速路径"""
+    with client.chat.completions.with_streaming_response.create(
+        model="bench", messages=[], stream=True
+    ) as response:
+        return sum(1 for _ in iter_raw_sse_content(response.iter_lines()))
+
+def measure(func, client: OpenAI, rounds: int, num_chunks: int) -> float:
+    """返回每个数据块的平均CPU耗时（微秒），取多轮中的最小值"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        count = func(client)
+        elapsed = time.process_time() - start
+        assert count == num_chunks - 1, f"解析到 {count} 个数据块，预期 {num_chunks - 1}"
+        best = min(best, elapsed)
+    return best / num_chunks * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式数据块解析开销基准测试")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    client = make_client(build_sse_body(args.chunks))
+    standard = measure(run_standard, client, args.rounds, args.chunks)
+    fast = measure(run_fast, client, args.rounds, args.chunks)
+
+    print(f"数据块数: {args.chunks}  轮数: {args.rounds}")
+    print(f"标准路径（SDK对象）: {standard:.2f} µs/块")
+    print(f"快速路径（原始SSE）: {fast:.2f} µs/块")
+    print(f"加速比: {standard / fast:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+HTTP API压测脚本
+
+用法：
+    python -m benchmarks.load_test --url http://127.0.0.1:7860 --requests 200 --concurrency 32
+"""
+
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+def run_request(client: httpx.Client, url: str, stream: bool) -> float:
+    """发送一次求解请求，返回耗时（秒）"""
+    start = time.perf_counter()
+    if stream:
+        with client.stream("POST", f"{url}/api/solve/stream", data={"text": "单摆的周期"}) as response:
+            response.raise_for_status()
+            for _ in response.iter_bytes():
+                pass
+    else:
+        response = client.post(f"{url}/api/solve", data={"text": "单摆的周期"})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TheoryX HTTP API压测")
+    parser.add_argument("--url", default="http://127.0.0.1:7860")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream", action="store_true", help="使用SSE流式接口")
+    parser.add_argument("--user", default=None, help="认证用户名")
+    parser.add_argument("--password", default=None, help="认证密码")
+    args = parser.parse_args()
+
+    auth = (args.user, args.password) if args.user else None
+    limits = httpx.Limits(max_connections=args.concurrency)
+    with httpx.Client(timeout=300, auth=auth, limits=limits) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            latencies = list(executor.map(
+                lambda _: run_request(client, args.url, args.stream),
+                range(args.requests)
+            ))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"请求数: {len(latencies)}  并发: {args.concurrency}  总耗时: {elapsed:.2f}s")
+    print(f"吞吐量: {len(latencies) / elapsed:.1f} req/s")
+    print(f"延迟 p50: {statistics.median(latencies) * 1000:.0f}ms  p95: {p95 * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
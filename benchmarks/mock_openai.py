@@ -0,0 +1,58 @@
+"""
+模拟的OpenAI兼容流式接口，用于离线压测
+
+用法：
+    uvicorn benchmarks.mock_openai:app --port 8999
+    然后将 OPENAI_API_BASE_URL 设为 http://127.0.0.1:8999/v1
+"""
+
+import os
+import json
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# 每个数据块之间的延迟（秒）与每块字符数
+CHUNK_DELAY = float(os.getenv('MOCK_CHUNK_DELAY', '0.005'))
+CHUNK_SIZE = int(os.getenv('MOCK_CHUNK_SIZE', '4'))
+# 模拟回复内容
+MOCK_TEXT = (
+    "解：取广义坐标 \\(\\theta\\)，系统拉格朗日量为 \\[ L = T - V = \\frac{1}{2} m l^2 \\dot{\\theta}^2 "
+    "+ m g l \\cos\\theta \\] 由拉格朗日方程得 \\[ \\ddot{\\theta} + \\frac{g}{l} \\sin\\theta = 0 \\] "
+    "小角度近似下周期为 \\(T = 2\\pi\\sqrt{l/g}\\)。\n\n"
+) * int(os.getenv('MOCK_REPEAT', '10'))
+
+app = FastAPI()
+
+@app.get("/v1/models")
+async def list_models() -> dict:
+    """模型列表（用于健康探测）"""
+    return {"object": "list", "data": []}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request) -> StreamingResponse:
+    """按固定节奏流式返回模拟内容"""
+    body = await request.json()
+    base = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": body.get("model", "mock")
+    }
+
+    def format_chunk(delta: dict, finish_reason=None) -> str:
+        chunk = {**base, "choices": [
+            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        ]}
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    async def generate():
+        yield format_chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(MOCK_TEXT), CHUNK_SIZE):
+            if CHUNK_DELAY:
+                await asyncio.sleep(CHUNK_DELAY)
+            yield format_chunk({"content": MOCK_TEXT[start:start + CHUNK_SIZE]})
+        yield format_chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
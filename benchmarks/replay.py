@@ -0,0 +1,65 @@
+"""
+基于录制响应的求解流程基准测试
+
+先以 CASSETTE_MODE=record 正常求解一次（界面、HTTP API或本脚本均可）录制上游响应，
+再用本脚本以回放模式重复运行同一题目。回放不访问模型端点，测得的耗时减去
+录制中的上游耗时，即为本项目自身的流程开销（公式转换、日志、指标等）。
+
+用法：
+    CASSETTE_MODE=record python -m benchmarks.replay --text "单摆的周期" --rounds 1
+    python -m benchmarks.replay --text "单摆的周期" --image problem.png --speed 0 --rounds 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TheoryX 录制回放基准测试")
+    parser.add_argument("--text", required=True, help="题目文本（需与录制时一致）")
+    parser.add_argument("--image", action="append", default=[], help="题目图片路径，可重复")
+    parser.add_argument("--complex", action="store_true", help="使用复杂模式")
+    parser.add_argument("--ensemble", action="store_true", help="使用集成求解")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="回放速度倍数（1为原速，0为不等待）")
+    parser.add_argument("--dir", default=None, help="录制文件目录")
+    args = parser.parse_args()
+
+    # 须在导入配置之前设置，未显式指定录制模式时默认回放
+    os.environ.setdefault("CASSETTE_MODE", "replay")
+    os.environ["CASSETTE_SPEED"] = str(args.speed)
+    if args.dir:
+        os.environ["CASSETTE_DIR"] = args.dir
+
+    from backend.core.solver import problem_solver
+    from backend.core.cassette import cassette_store
+
+    images = args.image or None
+    latencies = []
+    first_output = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        first = None
+        solution = ""
+        for solution, _ in problem_solver.solve_problem(
+            args.text, images, args.complex, ensemble=args.ensemble
+        ):
+            if first is None and solution:
+                first = time.perf_counter() - start
+        latencies.append(time.perf_counter() - start)
+        first_output.append(first or 0.0)
+        if "出错" in solution[:40]:
+            print(solution, file=sys.stderr)
+            sys.exit(1)
+
+    latencies.sort()
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"模式: {cassette_store.mode}  速度: {args.speed}  轮数: {len(latencies)}")
+    print(f"总耗时 p50: {statistics.median(latencies) * 1000:.1f}ms  p95: {p95 * 1000:.1f}ms")
+    print(f"首次输出 p50: {statistics.median(first_output) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 """前端UI组件"""
 
 import os
+import time
+import uuid
 import gradio as gr
 from pathlib import Path
+from urllib.parse import urlencode
 from typing import Generator, Tuple
 
 from backend.core.solver import problem_solver
-from backend.core.utils import save_solution
+from backend.core.utils import (
+    ImageTooLarge, check_image_limits, estimate_tokens, normalize_images, save_solution
+)
+from backend.core.renderer import IncrementalRenderer
+from backend.core.ingestion import problem_set_ingestor
+from backend.core.scheduler import AdmissionRejected, lane_scheduler
+from backend.core.profiler import request_profiler
+from backend.core.mode_classifier import mode_classifier
+from backend.tracing import tracer
 from backend.config.settings import settings
 
 class SolverUI:
@@ -25,11 +36,31 @@ class SolverUI:
                 
                 with gr.Row():
                     with gr.Column(scale=1, elem_classes="input-column"):
-                        # 模式选择
+                        # 模式选择（启用自动选择时按题目特征决定，手动选项不生效）
+                        auto_mode_select = gr.Checkbox(
+                            label="自动选择求解模式",
+                            value=settings.auto_mode,
+                            info="根据题目长度、关键词和附图复杂度判断是否需要复杂模式"
+                        )
                         mode_select = gr.Checkbox(
                             label="启用复杂问题求解模式",
                             value=False,
-                            info=self._get_mode_info()
+                            info=self._get_mode_info(),
+                            interactive=not settings.auto_mode
+                        )
+                        
+                        # 复杂模式草稿
+                        speculative_select = gr.Checkbox(
+                            label="复杂模式下先显示快速草稿",
+                            value=settings.speculative_draft,
+                            info="同时用简单模式求解器生成草稿，复杂模式开始输出后自动替换"
+                        )
+                        
+                        # 集成求解
+                        ensemble_select = gr.Checkbox(
+                            label="启用集成求解（多路采样投票）",
+                            value=False,
+                            info=f"并发运行 {settings.ensemble_size} 路求解，展示最先返回的一路，并汇总最终答案的一致性"
                         )
                         
                         # 题目输入
@@ -39,10 +70,13 @@ class SolverUI:
                             placeholder="请输入题目文字描述...",
                         )
                         
-                        # 图片输入
-                        image_input = gr.Image(
-                            label="题目图片（可选）",
-                            type="pil",
+                        # 图片输入（支持多张附图）
+                        image_input = gr.Gallery(
+                            label="题目图片（可选，可上传多张）",
+                            type="filepath",
+                            interactive=True,
+                            columns=3,
+                            height="auto",
                         )
                         
                         # 按钮组
@@ -50,6 +84,30 @@ class SolverUI:
                             solve_btn = gr.Button("求解")
                             save_btn = gr.Button("下载结果")
                             file_output = gr.File(label="下载解答文件（包含图片）")
+                        
+                        # 当前用户的请求数与用量（仅在启用认证时显示）
+                        usage_display = gr.Markdown(visible=settings.auth_enabled)
+                        
+                        # 整套习题批量处理
+                        with gr.Accordion("批量处理整套习题（多页TIFF或图片zip）", open=False):
+                            problem_set_input = gr.File(
+                                label="上传扫描件",
+                                file_types=[".tif", ".tiff", ".zip"],
+                                type="filepath",
+                            )
+                            ingest_btn = gr.Button("批量求解")
+                            ingest_progress = gr.Markdown()
+                            ingest_output = gr.File(label="下载全部解答")
+                        
+                        # 已保存解答的批量导出（通过HTTP API流式下载）
+                        with gr.Accordion("批量导出已保存的解答", open=False,
+                                          visible=settings.api_enabled):
+                            with gr.Row():
+                                export_start = gr.Textbox(label="起始日期", placeholder="YYYY-MM-DD")
+                                export_end = gr.Textbox(label="结束日期", placeholder="YYYY-MM-DD")
+                            export_ids = gr.Textbox(label="解答ID（可选，逗号分隔）")
+                            export_btn = gr.Button("生成下载链接")
+                            export_link = gr.HTML()
                 
                 # 输出区域
                 with gr.Column(scale=1, elem_classes="output-column"):
@@ -62,41 +120,76 @@ class SolverUI:
                     )
                     
                     with gr.Group(visible=True):
-                        solution_output = gr.Markdown(
+                        # 服务端渲染的解答（公式已预渲染，浏览器无需重新排版）
+                        solution_output = gr.HTML(
                             label="求解过程",
                             elem_classes="output-box",
                             show_label=False
                         )
                     
+                    # 解答的Markdown原文和请求ID（用于保存）
+                    solution_state = gr.State("")
+                    request_state = gr.State("")
+                    
                     # 隐藏日志输出
                     log_output = gr.Markdown(visible=False)
             
             # 设置事件处理
             solve_btn.click(
                 fn=self._handle_solve,
-                inputs=[text_input, image_input, mode_select],
-                outputs=[solution_output, log_output, status_indicator],
+                inputs=[text_input, image_input, mode_select, ensemble_select, speculative_select,
+                        auto_mode_select],
+                outputs=[solution_output, log_output, status_indicator, solution_state, request_state],
                 scroll_to_output=True,
+                # 实际的并发与排队由各模式的调度通道控制，Gradio队列只需容纳全部通道
+                concurrency_limit=lane_scheduler.capacity,
+                concurrency_id="solve",
+            ).then(
+                fn=self._get_usage_markdown,
+                outputs=usage_display
+            )
+            
+            iface.load(fn=self._get_usage_markdown, outputs=usage_display)
+            
+            auto_mode_select.change(
+                fn=lambda auto: gr.update(interactive=not auto),
+                inputs=auto_mode_select,
+                outputs=mode_select
             )
             
             save_btn.click(
                 fn=self._handle_save,
-                inputs=[text_input, image_input, solution_output],
+                inputs=[text_input, image_input, solution_state, request_state],
                 outputs=file_output
             )
+            
+            ingest_btn.click(
+                fn=self._handle_ingest,
+                inputs=[problem_set_input, mode_select],
+                outputs=[ingest_progress, ingest_output]
+            )
+            
+            export_btn.click(
+                fn=self._handle_export,
+                inputs=[export_start, export_end, export_ids],
+                outputs=export_link
+            )
         
         return iface
 
-    def _get_status_html(self, status: str) -> str:
+    def _get_status_html(self, status: str, detail: str = "") -> str:
         """生成状态HTML"""
         status_map = {
             "准备求解": "preparing",
+            "排队中": "queued",
+            "系统繁忙": "busy",
             "正在思考": "thinking",
             "正在求解": "solving",
             "求解完成": "completed"
         }
         status_class = status_map.get(status, "preparing")
-        return f'<div class="status-indicator status-{status_class}">{status}</div>'
+        text = f"{status}（{detail}）" if detail else status
+        return f'<div class="status-indicator status-{status_class}">{text}</div>'
 
     def _get_mode_info(self) -> str:
         """获取模式信息提示"""
@@ -119,19 +212,97 @@ class SolverUI:
             }
             </style>""")
 
-    def _handle_solve(self, text_input, image_input, is_complex_mode):
+    @staticmethod
+    def _get_username(request: gr.Request = None) -> str:
+        """获取当前登录的用户名（未启用认证时为空）"""
+        if not settings.auth_enabled or request is None:
+            return ""
+        return request.username or ""
+
+    def _get_usage_markdown(self, request: gr.Request = None) -> str:
+        """生成当前用户的用量信息"""
+        username = self._get_username(request)
+        if not username:
+            return ""
+        status = lane_scheduler.get_user_status(username)
+        quota = (f"{status['tokens_used']:.0f} / {status['tokens_per_hour']}"
+                 if status["tokens_per_hour"] else f"{status['tokens_used']:.0f}（不限）")
+        return (f"**{username}**：运行中 {status['active']} 个，排队中 {status['queued']} 个请求；"
+                f"本小时已用 token {quota}")
+
+    def _handle_solve(self, text_input, image_input, is_complex_mode, is_ensemble=False,
+                      is_speculative=False, is_auto_mode=False, request: gr.Request = None):
         """处理求解请求"""
+        request_id = uuid.uuid4().hex[:12]
+        start_time = time.monotonic()
+        
+        trace = tracer.start_trace(
+            "solve", request_id,
+            ensemble=bool(is_ensemble), speculative=bool(is_speculative), images=len(image_input or [])
+        )
         current_solution = ""
         current_log = ""
         status_html = self._get_status_html("准备求解")
         has_started_solving = False
+        renderer = IncrementalRenderer()
+        render_seconds = 0.0
+        error = None
         
+        # 排队和自动选择模式之前只读取文件头检查图片大小，超出限制时立即返回提示，不解码图片
         try:
+            for image in normalize_images(image_input):
+                check_image_limits(image)
+        except ImageTooLarge as e:
+            trace.end(str(e))
+            yield (gr.update(value=renderer.render(str(e))), gr.update(value=""),
+                  gr.update(value=self._get_status_html("准备求解")), "", request_id)
+            return
+        
+        # 自动选择模式：按题目特征决定使用简单还是复杂模式
+        decision = None
+        mode_detail = ""
+        if is_auto_mode:
+            decision = mode_classifier.decide(text_input, image_input)
+            is_complex_mode = decision.is_complex_mode
+            mode_detail = decision.describe()
+            trace.root.set_attribute("mode.auto_probability", round(decision.probability, 4))
+        trace.root.set_attribute("complex_mode", bool(is_complex_mode))
+        
+        # 按模式进入调度通道（通道内按用户公平调度），无法接纳时立即返回提示
+        try:
+            ticket = lane_scheduler.enter(
+                lane_scheduler.lane_for(is_complex_mode), self._get_username(request)
+            )
+        except AdmissionRejected as e:
+            trace.root.set_attribute("rejected", e.reason)
+            trace.end(str(e))
+            yield (gr.update(value=renderer.render(str(e))), gr.update(value=""),
+                  gr.update(value=self._get_status_html("系统繁忙")), "", request_id)
+            return
+        
+        try:
+            # 排队等待，期间显示预计等待时间
+            with trace.span("queue.wait", lane=ticket.lane):
+                for estimate in lane_scheduler.wait(ticket):
+                    yield (gr.update(), gr.update(),
+                          gr.update(value=self._get_status_html("排队中", f"预计等待约 {estimate:.0f} 秒")),
+                          "", request_id)
+            
             # 更新状态为"正在思考"
-            yield gr.update(value=""), gr.update(value=""), gr.update(value=self._get_status_html("正在思考"))
+            yield (gr.update(value=""), gr.update(value=""),
+                  gr.update(value=self._get_status_html("正在思考", mode_detail)), "", request_id)
             
-            # 使用 yield 实现流式输出
-            for step in problem_solver.solve_problem(text_input, image_input, is_complex_mode):
+            # 使用 yield 实现流式输出（按需附加性能剖析）
+            steps = request_profiler.wrap(
+                problem_solver.solve_problem(
+                    text_input, image_input, is_complex_mode, ensemble=is_ensemble, trace=trace,
+                    speculative=is_speculative
+                ),
+                request_id,
+                {"source": "ui", "complex_mode": is_complex_mode, "ensemble": is_ensemble,
+                 "speculative": is_speculative}
+            )
+            for step in steps:
                 if isinstance(step, tuple):
                     solution, log = step
                     if solution:
@@ -144,33 +315,81 @@ class SolverUI:
                 # 当开始接收到模型输出时，更新状态为"正在求解"
                 if not has_started_solving and current_solution.strip():
                     has_started_solving = True
-                    status_html = self._get_status_html("正在求解")
+                    status_html = self._get_status_html("正在求解", mode_detail)
                 
-                # 使用 gr.update() 来更新输出
-                yield (gr.update(value=current_solution),
+                # 使用 gr.update() 来更新输出（只重新渲染末尾未完成的段落）
+                render_start = time.perf_counter()
+                rendered = renderer.render(current_solution)
+                render_seconds += time.perf_counter() - render_start
+                yield (gr.update(value=rendered),
                       gr.update(value=current_log),
-                      gr.update(value=status_html))
+                      gr.update(value=status_html),
+                      current_solution, request_id)
             
             # 求解完成后更新状态
-            status_html = self._get_status_html("求解完成")
-            yield (gr.update(value=current_solution),
+            status_html = self._get_status_html("求解完成", mode_detail)
+            with trace.span("ui.render"):
+                rendered = renderer.render(current_solution)
+            yield (gr.update(value=rendered),
                   gr.update(value=current_log),
-                  gr.update(value=status_html))
+                  gr.update(value=status_html),
+                  current_solution, request_id)
                 
         except Exception as e:
+            error = str(e)
             error_msg = f"处理出错：{str(e)}"
-            yield (gr.update(value=error_msg),
+            yield (gr.update(value=renderer.render(error_msg)),
                   gr.update(value=f"错误：{str(e)}"),
-                  gr.update(value=self._get_status_html("求解完成")))
+                  gr.update(value=self._get_status_html("求解完成")),
+                  error_msg, request_id)
+        finally:
+            lane_scheduler.release(
+                ticket, estimate_tokens(text_input or "") + estimate_tokens(current_solution)
+            )
+            # 记录求解结果（含排队时间），用于训练模式分类器和评估对耗时的影响
+            mode_classifier.record(
+                text_input, bool(is_complex_mode), current_solution,
+                time.monotonic() - start_time, decision, image_input, error
+            )
+            trace.root.set_attribute("render.seconds", round(render_seconds, 4))
+            trace.end(error)
 
-    def _handle_save(self, text_input, image_input, solution_content):
+    def _handle_save(self, text_input, image_input, solution_content, request_id=""):
         """处理保存请求"""
+        # 与对应的求解请求归入同一条链路
+        trace = tracer.start_trace("save", request_id or uuid.uuid4().hex[:12])
         try:
-            zip_path, zip_name = save_solution(text_input, image_input, solution_content)
+            zip_path, zip_name = save_solution(
+                text_input, image_input, solution_content, settings.solutions_dir
+            )
+            trace.end()
             return zip_path
         except Exception as e:
+            trace.end(str(e))
             return None
 
+    def _handle_ingest(self, problem_set_path, is_complex_mode, request: gr.Request = None):
+        """处理整套习题批量求解请求（各题按当前用户进入调度通道）"""
+        if not problem_set_path:
+            yield "请先上传扫描件", None
+            return
+            
+        try:
+            for progress, zip_path in problem_set_ingestor.process(
+                problem_set_path, is_complex_mode, username=self._get_username(request)
+            ):
+                yield progress, zip_path
+        except Exception as e:
+            yield f"批量处理出错：{str(e)}", None
+
+    def _handle_export(self, start, end, ids):
+        """生成批量导出的下载链接"""
+        params = {key: value.strip() for key, value in
+                  (("start", start), ("end", end), ("ids", ids)) if value and value.strip()}
+        if not params:
+            return "请填写日期范围或解答ID"
+        return f'<a href="/api/export?{urlencode(params)}" download>下载解答压缩包</a>'
+
     def launch(self, **kwargs):
         """启动界面"""
         interface = self.create_interface()
@@ -180,5 +399,21 @@ class SolverUI:
         interface.queue()  # 启用队列模式
         interface.launch(**kwargs)  # 启动界面
 
+    def mount(self, app, path: str = "/"):
+        """
+        将界面挂载到已有的FastAPI应用上
+        
+        Args:
+            app: FastAPI应用
+            path: 挂载路径
+            
+        Returns:
+            FastAPI应用
+        """
+        interface = self.create_interface()
+        interface.queue()  # 启用队列模式
+        auth = settings.verify_auth if settings.auth_enabled else None
+        return gr.mount_gradio_app(app, interface, path=path, auth=auth)
+
 # 创建全局UI实例
 solver_ui = SolverUI()
\ No newline at end of file
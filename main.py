@@ -19,11 +19,37 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from backend.config.settings import settings
 from frontend import solver_ui
 
+def create_app():
+    """创建包含UI（以及可选HTTP API）的应用，供uvicorn及多进程部署使用"""
+    from fastapi import FastAPI
+    from backend.api import create_api_app
+    
+    app = create_api_app() if settings.api_enabled else FastAPI()
+    return solver_ui.mount(app)
+
 if __name__ == "__main__":
-    # 启动UI
-    solver_ui.launch(
-        server_name="0.0.0.0",
-        server_port=7860
-    )
\ No newline at end of file
+    if settings.job_workers > 0:
+        from backend.jobs import JobWorkerPool
+        
+        # 启动异步任务工作进程池
+        JobWorkerPool(settings.job_workers).start()
+    
+    if settings.server_workers > 1:
+        from backend.serving import run_multiworker
+        
+        # 多进程部署：多个应用进程共用一个对外端口
+        run_multiworker("main:create_app", settings.server_workers)
+    elif settings.api_enabled:
+        import uvicorn
+        
+        # 在同一进程中提供HTTP API和UI
+        uvicorn.run(create_app(), host="0.0.0.0", port=settings.server_port)
+    else:
+        # 启动UI
+        solver_ui.launch(
+            server_name="0.0.0.0",
+            server_port=settings.server_port
+        )
\ No newline at end of file
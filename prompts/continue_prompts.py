@@ -0,0 +1,5 @@
+"""中断续写提示词配置"""
+
+CONTINUE_PROMPT = """上面的回答因网络中断没有输出完整。请从中断处直接继续输出剩余内容：
+不要重复已经输出的任何文字，不要添加开场白或说明，保持原有的格式（Markdown 和 LaTeX），
+如果中断发生在公式或句子中间，请从中断的字符处接着写。"""
\ No newline at end of file
@@ -62,6 +62,8 @@ IMAGE_SYSTEM_PROMPT = """你是一个理论力学课程助教，在你的班级
 #     """生成图片解析的完整提示词"""
 #     return f"本道题的题目为：{text_input}。\n请准确、详细、清晰、有逻辑地描述这张题目所含图片中的信息，包括图片内容、几何关系、力学关系、变量标注等与题解相关的内容。"
 
-def get_image_prompt(text_input):
+def get_image_prompt(text_input, image_count=1):
     """生成图片解析的完整提示词"""
+    if image_count > 1:
+        return f"本道题的题目为：{text_input}。\n本题共有{image_count}张附图，请按上传顺序依次准确、详细、清晰、有逻辑地描述每张图片中的信息，并说明各图之间的对应关系，包括图片内容、几何关系、力学关系、变量标注等与题解相关的内容；给出求解该问题需要的知识点和完整思路；以及求解问题的详细过程。下面，请按照上面要求的格式给出三个部分的回答。"
     return f"本道题的题目为：{text_input}。\n请准确、详细、清晰、有逻辑地描述这张题目所含图片中的信息，包括图片内容、几何关系、力学关系、变量标注等与题解相关的内容；给出求解该问题需要的知识点和完整思路；以及求解问题的详细过程。下面，请按照上面要求的格式给出三个部分的回答。"
\ No newline at end of file
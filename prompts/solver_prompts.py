@@ -88,6 +88,11 @@ SOLVER_SYSTEM_PROMPT = """你是一位**顶级的理论力学和分析力学教
 * **反思解题过程**：简要回顾整个解题过程，总结所用的方法和技巧，以及从这个问题中学到的经验教训。例如，可以思考 "本题的最佳解法是什么？"，"如果采用其他方法会怎么样？"，"有没有更简洁的解题思路？" 等问题。
 """
 
+# 集成求解时追加到系统提示词末尾的最终答案格式要求（各路样本的答案据此提取并投票）
+ENSEMBLE_ANSWER_PROMPT = """
+**最终答案格式：** 在总结答案时，将每个待求量的最终结果（化简后的表达式，或带单位的数值）分别写在 $\\boxed{}$ 中，例如 $\\boxed{T = 2\\pi\\sqrt{\\frac{l}{g}}}$。只对最终结果使用 \\boxed，中间步骤不要使用。
+"""
+
 # def get_solver_prompt(problem_text, image_description=None):
 #     """生成完整的题目求解提示词"""
 #     full_problem = problem_text
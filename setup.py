@@ -9,5 +9,10 @@ setup(
         "openai",
         "python-dotenv",
         "Pillow",
+        "fastapi",
+        "uvicorn",
+        "python-multipart",
+        "markdown-it-py",
+        "latex2mathml",
     ],
 )
\ No newline at end of file
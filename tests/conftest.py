@@ -0,0 +1,25 @@
+"""测试公共配置：在导入后端模块之前补齐必需的环境变量，运行时文件写入临时目录"""
+
+import os
+import tempfile
+
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="theoryx-tests-")
+
+for _name, _value in {
+    "OPENAI_API_BASE_URL": "http://127.0.0.1:9/v1",
+    "OPENAI_API_KEY": "test",
+    "SIMPLE_IMAGE_MODEL": "simple-image",
+    "SIMPLE_SOLVER_MODEL": "simple-solver",
+    "COMPLEX_IMAGE_MODEL": "complex-image",
+    "COMPLEX_SOLVER_MODEL": "complex-solver",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+os.environ["SHARED_STATE_PATH"] = os.path.join(_RUNTIME_DIR, "shared_state.db")
+os.environ["JOB_DB_PATH"] = os.path.join(_RUNTIME_DIR, "jobs.db")
+os.environ["SOLUTIONS_DIR"] = os.path.join(_RUNTIME_DIR, "solutions")
+os.environ["MODE_LOG_PATH"] = os.path.join(_RUNTIME_DIR, "mode_outcomes.jsonl")
+os.environ["MODE_MODEL_PATH"] = os.path.join(_RUNTIME_DIR, "mode_classifier.json")
+os.environ["CASSETTE_DIR"] = os.path.join(_RUNTIME_DIR, "cassettes")
+os.environ["PROFILE_DIR"] = os.path.join(_RUNTIME_DIR, "profiles")
+os.environ["TRACE_DIR"] = os.path.join(_RUNTIME_DIR, "traces")
\ No newline at end of file
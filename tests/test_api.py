@@ -0,0 +1,103 @@
+"""HTTP API：流式求解的排队凭据在各种结束方式下都会释放，管理接口的权限校验"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.config.settings import settings
+from backend.api.server import TicketStreamingResponse, _stream_events, create_api_app
+from backend.core.scheduler import lane_scheduler
+from backend.core.solver import problem_solver
+
+@pytest.fixture
+def slow_solver(monkeypatch):
+    """每隔一小段时间输出一段内容的求解器"""
+    def solve_problem(text, images=None, is_complex_mode=False, **kwargs):
+        output = ""
+        for index in range(20):
+            time.sleep(0.01)
+            output += f"第{index}步。"
+            yield output, ""
+    monkeypatch.setattr(problem_solver, "solve_problem", solve_problem)
+
+def _lane_idle() -> bool:
+    return all(lane["active"] == 0 and lane["waiting"] == 0
+               for lane in lane_scheduler.get_status().values())
+
+def _call(response, send):
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    with pytest.raises(Exception):
+        asyncio.run(response(scope, receive, send))
+
+def test_stream_endpoint_releases_ticket(slow_solver):
+    client = TestClient(create_api_app())
+    response = client.post("/api/solve/stream", data={"text": "单摆的周期"})
+    assert response.status_code == 200
+    assert "event: done" in response.text
+    assert _lane_idle()
+
+def test_client_disconnect_releases_ticket(slow_solver):
+    ticket = lane_scheduler.enter(lane_scheduler.lane_for(False))
+    response = TicketStreamingResponse(_stream_events("题目", [], False, ticket=ticket), ticket)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        # 收到两段内容后客户端断开
+        if message["type"] == "http.response.body" and len(sent) >= 3:
+            raise OSError("client disconnected")
+
+    _call(response, send)
+    assert ticket.released
+    assert _lane_idle()
+
+def test_response_never_sent_releases_ticket():
+    ticket = lane_scheduler.enter(lane_scheduler.lane_for(True))
+    response = TicketStreamingResponse(_stream_events("题目", [], True, ticket=ticket), ticket)
+
+    async def send(message):
+        raise OSError("connection lost before headers")
+
+    _call(response, send)
+    assert ticket.released
+    assert _lane_idle()
+
+def test_disconnect_while_queued_releases_ticket_once(monkeypatch):
+    lane = lane_scheduler.lane_for(True)
+    running = [lane_scheduler.enter(lane) for _ in range(lane_scheduler.lanes[lane].concurrency)]
+    ticket = lane_scheduler.enter(lane)
+    assert not ticket.admitted
+    released = []
+    original = lane_scheduler.release
+
+    def release(ticket, tokens=0):
+        released.append(ticket)
+        original(ticket, tokens)
+    monkeypatch.setattr(lane_scheduler, "release", release)
+
+    response = TicketStreamingResponse(_stream_events("题目", [], True, ticket=ticket), ticket)
+
+    async def send(message):
+        # 收到排队事件后客户端断开，此时生成器仍在等待放行
+        if message["type"] == "http.response.body":
+            raise OSError("client disconnected")
+
+    try:
+        _call(response, send)
+    finally:
+        for other in running:
+            original(other)
+    assert released == [ticket]
+    assert _lane_idle()
+
+def test_admin_endpoints_denied_without_configured_admin(monkeypatch):
+    client = TestClient(create_api_app())
+    assert client.get("/api/admin/profiling").status_code == 403
+    monkeypatch.setattr(settings, "admin_users", ["root"])
+    assert client.post("/api/admin/profiling", data={"enabled": "true"}).status_code == 403
\ No newline at end of file
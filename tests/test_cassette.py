@@ -0,0 +1,47 @@
+"""上游响应的录制与回放"""
+
+import time
+
+import pytest
+
+from backend.core.cassette import CassetteError, CassetteStore
+from backend.core.router import is_transient_error
+
+MESSAGES = [{"role": "user", "content": "单摆的周期"}]
+
+@pytest.fixture
+def recorder(tmp_path):
+    return CassetteStore("record", str(tmp_path), speed=0)
+
+def _replayer(tmp_path):
+    return CassetteStore("replay", str(tmp_path), speed=0)
+
+def _record(store, chunks):
+    return store.record("m", MESSAGES, {}, iter(chunks), time.monotonic())
+
+def test_identical_requests_are_recorded_separately(recorder, tmp_path):
+    assert list(_record(recorder, ["甲"])) == ["甲"]
+    assert list(_record(recorder, ["乙"])) == ["乙"]
+
+    replayer = _replayer(tmp_path)
+    assert list(replayer.replay("m", MESSAGES, {})) == ["甲"]
+    assert list(replayer.replay("m", MESSAGES, {})) == ["乙"]
+    # 回放的请求多于录制时循环复用
+    assert list(replayer.replay("m", MESSAGES, {})) == ["甲"]
+
+def test_cancelled_stream_is_marked_truncated(recorder, tmp_path):
+    stream = _record(recorder, ["一", "二", "三"])
+    assert next(stream) == "一"
+    stream.close()
+
+    cassette = _replayer(tmp_path).load("m", MESSAGES, {})
+    assert cassette["truncated"]
+    replayed = _replayer(tmp_path).replay("m", MESSAGES, {})
+    assert next(replayed) == "一"
+    with pytest.raises(CassetteError):
+        next(replayed)
+
+def test_missing_recording_raises_transient_error(tmp_path):
+    with pytest.raises(CassetteError) as info:
+        _replayer(tmp_path).replay("m", MESSAGES, {})
+    assert is_transient_error(info.value)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""集成求解：最终答案提取、投票与提前停止"""
+
+import time
+
+import pytest
+
+from backend.config.settings import settings
+from backend.core.solver import problem_solver
+from backend.core.utils import extract_final_answers
+from prompts.solver_prompts import ENSEMBLE_ANSWER_PROMPT
+
+class FakeRouter:
+    """按模型名返回预设的流式输出"""
+    def __init__(self, outputs, delay=None):
+        self.outputs = outputs
+        self.delay = delay or {}
+        self.requests = []
+        self.closed = []
+
+    def stream_content(self, model, messages, **kwargs):
+        self.requests.append((model, messages))
+        return self._stream(model)
+
+    def _stream(self, model):
+        try:
+            for chunk in self.outputs[model]:
+                time.sleep(self.delay.get(model, 0))
+                yield chunk
+        finally:
+            self.closed.append(model)
+
+@pytest.fixture
+def ensemble(monkeypatch):
+    monkeypatch.setattr(settings, "ensemble_models", ["m1", "m2", "m3"])
+    monkeypatch.setattr(settings, "ensemble_size", 3)
+    monkeypatch.setattr(settings, "ensemble_max_tokens", 0)
+
+    def run(router):
+        monkeypatch.setattr(problem_solver, "router", router)
+        output = ""
+        for output, _ in problem_solver.solve_problem("单摆的周期", ensemble=True):
+            pass
+        return output
+    return run
+
+def test_extract_final_answers_prefers_boxed():
+    assert extract_final_answers("$$a$$ 所以 $\\boxed{T = 2\\pi}$") == ["T = 2\\pi"]
+    assert extract_final_answers("$$T = 1$$ 最后 \\[ T = 2\\pi \\]") == ["T = 2\\pi"]
+    assert extract_final_answers("没有公式") == []
+
+def test_majority_vote_and_early_stop(ensemble):
+    router = FakeRouter(
+        {
+            "m1": ["推导……", "所以 $\\boxed{T = 2\\pi\\sqrt{l/g}}$"],
+            "m2": ["另一种推导，", "$\\boxed{T=2\\pi \\sqrt{l/g}}$。"],
+            "m3": ["很慢的推导"] * 200,
+        },
+        delay={"m3": 0.02},
+    )
+    start = time.monotonic()
+    output = ensemble(router)
+
+    # 前两路答案一致（忽略空白差异）即达到多数，第三路被提前停止
+    assert time.monotonic() - start < 2
+    assert "**一致性**：2/2" in output
+    assert "提前停止" in output
+    assert "**多数答案**" in output
+    # 被停止的样本不阻塞求解结束，其后台线程随后关闭上游流
+    deadline = time.monotonic() + 2
+    while "m3" not in router.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "m3" in router.closed
+    # 每路请求都要求以 \boxed{} 给出最终答案
+    assert all(messages[0]["content"].endswith(ENSEMBLE_ANSWER_PROMPT) for _, messages in router.requests)
+
+def test_vote_falls_back_to_last_display_formula(ensemble):
+    router = FakeRouter({
+        "m1": ["结果为 $$v = \\sqrt{2gh}$$"],
+        "m2": ["可得 \\[ v=\\sqrt{2gh} \\]"],
+        "m3": ["$$v = gh$$"],
+    })
+    output = ensemble(router)
+    assert "未能从样本中提取到最终答案" not in output
+    majority = output.split("**多数答案**：")[1]
+    assert majority.replace(" ", "").startswith("$\\boxed{v=\\sqrt{2gh}}$")
+
+def test_no_answers_reported(ensemble):
+    router = FakeRouter({model: ["只有文字"] for model in ("m1", "m2", "m3")})
+    assert "未能从样本中提取到最终答案" in ensemble(router)
+
+class FailingRouter(FakeRouter):
+    """指定模型输出若干块后中断"""
+    def __init__(self, outputs, failing, delay=None):
+        super().__init__(outputs, delay)
+        self.failing = failing
+
+    def _stream(self, model):
+        yield from super()._stream(model)
+        if model in self.failing:
+            raise ConnectionError("连接中断")
+
+def test_lead_error_switches_to_completed_sample(ensemble):
+    router = FailingRouter(
+        {
+            "m1": ["首先输出的推导，"],
+            "m2": ["完整推导 $\\boxed{T = 2\\pi}$"],
+            "m3": ["另一份完整推导 $\\boxed{T = 2\\pi}$"],
+        },
+        failing={"m1"},
+        delay={"m2": 0.05, "m3": 0.05},
+    )
+    output = ensemble(router)
+    assert "首先输出的推导" not in output
+    assert "完整推导" in output
+    assert "| 1 | m1 | - | 出错 |" in output
+
+def test_lead_error_is_reported_without_other_samples(ensemble, monkeypatch):
+    monkeypatch.setattr(settings, "ensemble_models", ["m1"])
+    monkeypatch.setattr(settings, "ensemble_size", 1)
+    router = FailingRouter({"m1": ["部分推导"]}, failing={"m1"})
+    output = ensemble(router)
+    assert "部分推导" in output
+    assert "# m1 求解出错" in output
\ No newline at end of file
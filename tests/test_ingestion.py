@@ -0,0 +1,73 @@
+"""整套习题导入：解码前的大小检查、出错计数与取消"""
+
+import threading
+import time
+import zipfile
+
+import pytest
+from PIL import Image, ImageDraw
+
+from backend.config.settings import settings
+from backend.core import ingestion
+from backend.core.ingestion import ProblemSetIngestor, load_pages
+from backend.core.utils import ImageTooLarge
+
+def _page(path, regions=2):
+    """生成包含若干道题（黑色方块，上下以空白隔开）的页面"""
+    page = Image.new("L", (400, 200 * regions), 255)
+    draw = ImageDraw.Draw(page)
+    for index in range(regions):
+        draw.rectangle((50, index * 200 + 50, 350, index * 200 + 150), fill=0)
+    page.save(path)
+    return str(path)
+
+def test_zip_entry_size_checked_before_decoding(tmp_path, monkeypatch):
+    archive_path = tmp_path / "scans.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.write(_page(tmp_path / "page.png"), "page.png")
+    monkeypatch.setattr(settings, "image_max_bytes", 10)
+    monkeypatch.setattr(ingestion.Image, "open", lambda *args: pytest.fail("不应解码超出限制的图片"))
+
+    with pytest.raises(ImageTooLarge, match="page.png"):
+        list(load_pages(str(archive_path)))
+
+def test_page_pixels_checked_before_decoding(tmp_path, monkeypatch):
+    path = _page(tmp_path / "page.png")
+    monkeypatch.setattr(settings, "image_max_pixels", 1000)
+
+    with pytest.raises(ImageTooLarge, match="像素数过多"):
+        list(load_pages(path))
+
+def test_error_output_counted_as_failed(tmp_path, monkeypatch):
+    solutions = iter(["答案：$T = 2\\pi$", "# simple-solver 求解出错\n\n连接中断"])
+    monkeypatch.setattr(
+        ProblemSetIngestor, "_solve_region",
+        staticmethod(lambda image_bytes, is_complex_mode, username="": next(solutions))
+    )
+
+    progress = ""
+    for progress, zip_path in ProblemSetIngestor(1).process(
+        _page(tmp_path / "page.png"), output_dir=str(tmp_path)
+    ):
+        pass
+    assert "完成 1 道，失败 1 道" in progress
+
+def test_close_cancels_queued_regions(tmp_path, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def solve(image_bytes, is_complex_mode, username=""):
+        calls.append(image_bytes)
+        release.wait(5)
+        return "答案"
+
+    monkeypatch.setattr(ProblemSetIngestor, "_solve_region", staticmethod(solve))
+    steps = ProblemSetIngestor(1).process(_page(tmp_path / "page.png"), output_dir=str(tmp_path))
+    next(steps)
+    start = time.monotonic()
+    # 界面关闭：不等待正在求解的题目，排队的题目直接取消
+    steps.close()
+    assert time.monotonic() - start < 1
+    release.set()
+    time.sleep(0.1)
+    assert len(calls) == 1
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""任务队列：领取、续租与中断任务回收"""
+
+import time
+
+import pytest
+
+from backend.config.settings import settings
+from backend.jobs import worker
+from backend.jobs.store import JobStore, STATUS_QUEUED, STATUS_RUNNING
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(worker, "job_store", store)
+    return store
+
+def _age(store, job_id, seconds):
+    """把任务的更新时间调回若干秒之前"""
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET updated_at = updated_at - ? WHERE id = ?", (seconds, job_id))
+
+def test_requeue_only_expired_leases(store):
+    live = store.submit("题目一")
+    stale = store.submit("题目二")
+    store.claim("w1")
+    store.claim("w2")
+    _age(store, stale, 120)
+
+    assert store.requeue_stale(60) == 1
+    assert store.get(live)["status"] == STATUS_RUNNING
+    assert store.get(stale)["status"] == STATUS_QUEUED
+
+def test_heartbeat_keeps_lease(store):
+    job_id = store.submit("题目")
+    store.claim("w1")
+    _age(store, job_id, 120)
+    assert store.heartbeat(job_id, "w1")
+    assert store.requeue_stale(60) == 0
+    # 其他工作进程无法为该任务续租
+    assert not store.heartbeat(job_id, "w2")
+
+def test_heartbeat_fails_after_requeue(store):
+    job_id = store.submit("题目")
+    store.claim("w1")
+    _age(store, job_id, 120)
+    store.requeue_stale(60)
+    assert not store.heartbeat(job_id, "w1")
+
+def test_run_job_heartbeats_while_solver_is_silent(store, monkeypatch):
+    from backend.core.solver import problem_solver
+
+    monkeypatch.setattr(settings, "job_heartbeat_interval", 0.05)
+    monkeypatch.setattr(settings, "job_checkpoint_interval", 3600)
+    job_id = store.submit("题目")
+    job = store.claim("w1")
+    _age(store, job_id, 120)
+
+    def silent_solver(text, images, complex_mode, **kwargs):
+        # 长时间没有输出，期间不会触发阶段性保存
+        time.sleep(0.3)
+        yield "答案", ""
+
+    monkeypatch.setattr(problem_solver, "solve_problem", silent_solver)
+    before = time.time()
+    seen = []
+    original = store.heartbeat
+
+    def recording_heartbeat(*args):
+        seen.append(time.time())
+        return original(*args)
+
+    monkeypatch.setattr(store, "heartbeat", recording_heartbeat)
+    worker.run_job(job, "w1")
+    assert seen and seen[0] >= before
+    assert store.get(job_id)["output"] == "答案"
+
+def test_run_job_goes_through_lane_and_quota(store, monkeypatch):
+    from backend.core.quota import usage_tracker
+    from backend.core.scheduler import lane_scheduler
+
+    monkeypatch.setattr(usage_tracker, "tokens_per_hour", 10)
+    usage_tracker.record("quota-user", 100)
+    store.submit("题目", username="quota-user")
+    job = store.claim("w1")
+    worker.run_job(job, "w1")
+
+    result = store.get(job["id"])
+    assert result["status"] == "failed"
+    assert "额度" in result["error"]
+    assert all(lane["active"] == 0 for lane in lane_scheduler.get_status().values())
+
+def test_writes_require_lease(store):
+    job_id = store.submit("题目")
+    store.claim("w1")
+    _age(store, job_id, 120)
+    store.requeue_stale(60)
+    store.claim("w2")
+
+    # 被回收的工作进程不能覆盖新持有者的结果
+    assert not store.checkpoint(job_id, "w1", "旧输出")
+    assert not store.finish(job_id, "w1", "旧输出")
+    assert not store.fail(job_id, "w1", "出错")
+    assert store.finish(job_id, "w2", "新输出")
+    assert store.get(job_id)["output"] == "新输出"
+
+def test_run_job_stops_when_lease_is_lost(store, monkeypatch):
+    from backend.core.solver import problem_solver
+
+    monkeypatch.setattr(settings, "job_checkpoint_interval", 0)
+    job_id = store.submit("题目")
+    job = store.claim("w1")
+    steps = []
+
+    def solver(text, images, complex_mode, **kwargs):
+        for index in range(5):
+            steps.append(index)
+            if index == 1:
+                # 租约过期后被其他工作进程领取
+                _age(store, job_id, 120)
+                store.requeue_stale(60)
+                store.claim("w2")
+            yield f"第{index}步", ""
+
+    monkeypatch.setattr(problem_solver, "solve_problem", solver)
+    worker.run_job(job, "w1")
+    assert steps == [0, 1]
+    result = store.get(job_id)
+    assert result["status"] == STATUS_RUNNING
+    assert result["output"] == "第0步"
+
+def test_rerun_resumes_from_checkpoint(store, monkeypatch):
+    from backend.core.solver import problem_solver
+
+    job_id = store.submit("题目")
+    first = store.claim("w1")
+    store.checkpoint(job_id, "w1", "已保存的输出", "日志")
+    store.requeue_worker("w1")
+    job = store.claim("w2")
+    assert job["attempts"] == 2 and job["output"] == "已保存的输出"
+
+    received = []
+
+    def solver(text, images, complex_mode, resume_output=""):
+        received.append(resume_output)
+        yield resume_output + "，继续", ""
+
+    monkeypatch.setattr(problem_solver, "solve_problem", solver)
+    worker.run_job(job, "w2")
+    assert first["attempts"] == 1
+    assert received == ["已保存的输出"]
+    assert store.get(job_id)["output"] == "已保存的输出，继续"
+
+def test_solver_continues_saved_output(monkeypatch):
+    from backend.core.solver import problem_solver
+
+    _, solver_model = settings.get_model_info(False)
+    calls = []
+
+    class ContinuingRouter:
+        def continue_content(self, model, messages, partial, **kwargs):
+            calls.append(partial)
+            return iter(["，所以周期为 $T$"])
+
+        def stream_content(self, model, messages, **kwargs):
+            raise AssertionError("不应重新求解")
+
+    monkeypatch.setattr(problem_solver, "router", ContinuingRouter())
+    saved = (
+        f"# {solver_model} 求解过程\n\n由单摆公式"
+        f"\n\n---\n\n\n\n# {solver_model} 求解出错\n\n连接中断"
+    )
+    output = ""
+    for output, _ in problem_solver.solve_problem("单摆的周期", resume_output=saved):
+        pass
+    assert calls == ["由单摆公式"]
+    assert output == f"# {solver_model} 求解过程\n\n由单摆公式，所以周期为 $T$"
+
+def test_pool_requeues_jobs_of_restarted_pool(store, monkeypatch):
+    job_id = store.submit("题目")
+    # 重启前的进程池（同一主机，进程已退出）
+    store.claim(f"{worker.socket.gethostname()}:999999999-0")
+    other = store.submit("其他题目")
+    store.claim("other-host:1-0")
+
+    pool = worker.JobWorkerPool(0)
+    pool.start()
+    pool.stop()
+    assert store.get(job_id)["status"] == STATUS_QUEUED
+    assert store.get(other)["status"] == STATUS_RUNNING
+
+def test_pool_respawns_dead_worker(store, monkeypatch):
+    class FakeProcess:
+        def __init__(self, alive):
+            self.alive = alive
+            self.exitcode = None if alive else 1
+
+        def is_alive(self):
+            return self.alive
+
+    spawned = []
+
+    def spawn(self, worker_id, index):
+        spawned.append(worker_id)
+        return FakeProcess(True)
+
+    monkeypatch.setattr(worker.JobWorkerPool, "_spawn", spawn)
+    pool = worker.JobWorkerPool(2)
+    dead_id = f"{worker._worker_prefix()}1"
+    job_id = store.submit("题目")
+    store.claim(dead_id)
+    pool.processes = [FakeProcess(True), FakeProcess(False)]
+
+    assert pool.check_workers() == 1
+    assert spawned == [dead_id]
+    assert store.get(job_id)["status"] == STATUS_QUEUED
+
+def test_worker_loop_survives_errors(store, monkeypatch):
+    calls = []
+
+    def flaky_claim(worker_id):
+        calls.append(worker_id)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(settings, "job_poll_interval", 0)
+    monkeypatch.setattr(store, "claim", flaky_claim)
+    with pytest.raises(KeyboardInterrupt):
+        worker.worker_loop("w1")
+    assert len(calls) == 2
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""求解模式自动选择：结果记录与训练标签"""
+
+from backend.core import mode_classifier as module
+from backend.core.mode_classifier import ModeClassifier, build_training_set, load_outcomes
+
+def _entry(problem, mode, error=False):
+    return {"problem": problem, "mode": mode, "error": error, "features": {"bias": 1.0}}
+
+def test_labels_come_from_errors_and_complex_retries():
+    samples = build_training_set([
+        _entry("ok", "simple"),
+        _entry("failed", "simple", error=True),
+        _entry("retried", "simple"),
+        _entry("retried", "complex"),
+        _entry("complex-only", "complex"),
+    ])
+    assert [label for _, label in samples] == [0, 1, 1]
+
+def test_record_is_disabled_without_log_path(tmp_path, monkeypatch):
+    def extract_features(text, images=None):
+        raise AssertionError("未启用记录时不应提取特征")
+    monkeypatch.setattr(module, "extract_features", extract_features)
+    classifier = ModeClassifier(0.5, str(tmp_path / "model.json"), "")
+    classifier.record("题目", False, "解答", 1.0)
+
+def test_record_marks_raised_errors_and_rotates(tmp_path):
+    path = tmp_path / "outcomes.jsonl"
+    classifier = ModeClassifier(0.5, str(tmp_path / "model.json"), str(path), log_max_bytes=1)
+    classifier.record("题目一", False, "部分解答", 1.0, error="连接中断")
+    classifier.record("题目二", False, "完整解答", 1.0)
+
+    assert path.with_name("outcomes.jsonl.1").exists()
+    outcomes = load_outcomes(str(path))
+    assert [entry["error"] for entry in outcomes] == [True, False]
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""模型参数档案：求解与图片描述请求按档案发送参数"""
+
+from PIL import Image
+
+from backend.config.settings import settings
+from backend.core.image_processor import image_processor
+
+def test_request_params_follow_profile(monkeypatch):
+    monkeypatch.setattr(settings, "model_profiles", {
+        "o*": {"temperature": False, "reasoning_effort": "high", "max_tokens": 4096},
+    })
+    assert settings.get_request_params("o3", 0.7, "medium") == {
+        "reasoning_effort": "medium", "max_completion_tokens": 4096
+    }
+    assert settings.get_request_params("gpt-4o", 0.7) == {"temperature": 0.7}
+
+def test_image_request_uses_profile(monkeypatch):
+    image_model, _ = settings.get_model_info(False)
+    monkeypatch.setattr(settings, "model_profiles", {image_model: {"temperature": False}})
+    calls = []
+
+    class RecordingRouter:
+        def stream_content(self, model, messages, **kwargs):
+            calls.append(kwargs)
+            return iter(["图中为单摆"])
+
+    monkeypatch.setattr(image_processor, "router", RecordingRouter())
+    results = list(image_processor.get_image_description("题目", Image.new("RGB", (8, 8))))
+    assert results[-1][0] == "图中为单摆"
+    assert calls == [{}]
\ No newline at end of file
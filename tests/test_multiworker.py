@@ -0,0 +1,156 @@
+"""多进程部署：本地代理按请求分配工作进程"""
+
+import asyncio
+import http.client
+import socket
+import threading
+
+import pytest
+
+from backend.serving.multiworker import LocalProxy
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_close_after_response_rewrites_connection_header():
+    head = b"GET /api/x HTTP/1.1\r\nHost: h\r\nConnection: keep-alive\r\n\r\n"
+    rewritten = LocalProxy._close_after_response(head)
+    assert rewritten == b"GET /api/x HTTP/1.1\r\nHost: h\r\nConnection: close\r\n\r\n"
+
+def test_upgrade_request_is_untouched():
+    head = b"GET /queue HTTP/1.1\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\n"
+    assert LocalProxy._close_after_response(head) == head
+
+async def _cancel_pending():
+    """取消仍在等待的连接处理任务，之后才能关闭事件循环"""
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+@pytest.fixture
+def cluster():
+    """启动两个最简后端和代理，返回 (代理端口, 代理, 各后端收到的请求头)"""
+    loop = asyncio.new_event_loop()
+    received = [[], []]
+    ports = [_free_port(), _free_port()]
+    proxy_port = _free_port()
+    proxy = LocalProxy(ports)
+
+    def backend(index):
+        async def handle(reader, writer):
+            # 与uvicorn一致：默认保持连接，请求头要求关闭时响应后关闭
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                received[index].append(head)
+                close = b"connection: close" in head.lower()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: 1\r\n"
+                    + (b"Connection: close\r\n" if close else b"") + b"\r\n" + str(index).encode()
+                )
+                await writer.drain()
+                if close:
+                    break
+            writer.close()
+        return handle
+
+    async def start():
+        for index, port in enumerate(ports):
+            await asyncio.start_server(backend(index), "127.0.0.1", port)
+        await asyncio.start_server(proxy.handle, "127.0.0.1", proxy_port)
+
+    loop.run_until_complete(start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield proxy_port, proxy, received
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.run_until_complete(_cancel_pending())
+    loop.close()
+
+def test_keep_alive_requests_are_routed_individually(cluster):
+    proxy_port, proxy, received = cluster
+    conn = http.client.HTTPConnection("127.0.0.1", proxy_port, timeout=5)
+
+    conn.request("GET", "/api/first")
+    assert conn.getresponse().read() == b"0"
+    # 工作进程0变得繁忙后，同一客户端连接上的下一个请求应分配到工作进程1
+    proxy.active[0] += 5
+    conn.request("GET", "/api/second")
+    assert conn.getresponse().read() == b"1"
+    conn.close()
+
+    assert all(b"Connection: close" in head for heads in received for head in heads)
+
+def test_ui_requests_stick_to_worker_by_cookie(cluster):
+    proxy_port, proxy, received = cluster
+
+    def get(headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", proxy_port, timeout=5)
+        conn.request("GET", "/gradio_api/queue/data", headers=headers or {})
+        response = conn.getresponse()
+        result = response.read(), response.getheader("Set-Cookie")
+        conn.close()
+        return result
+
+    body, cookie = get()
+    assert body == b"0" and cookie.startswith("theoryx_worker=0;")
+    # 同一出口IP后的新会话按最少连接数分配，已有会话按Cookie固定在原进程
+    proxy.active[0] += 5
+    assert get({"Cookie": "theme=dark; theoryx_worker=0"}) == (b"0", None)
+    body, cookie = get()
+    assert body == b"1" and cookie.startswith("theoryx_worker=1;")
+
+def test_client_half_close_still_receives_response(cluster):
+    proxy_port, _, _ = cluster
+    with socket.create_connection(("127.0.0.1", proxy_port), timeout=5) as sock:
+        sock.sendall(b"GET /api/x HTTP/1.1\r\nHost: h\r\n\r\n")
+        # 发完请求后关闭写方向，仍应收到完整响应
+        sock.shutdown(socket.SHUT_WR)
+        response = b""
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            response += data
+    assert response.startswith(b"HTTP/1.1 200 OK") and response.endswith(b"0")
+
+def test_shared_state_is_created_lazily(tmp_path):
+    from backend.core.shared_state import SharedState
+
+    path = tmp_path / "state" / "shared.db"
+    state = SharedState(str(path))
+    assert not path.exists()
+    state.incr("hits", 2)
+    assert path.exists()
+    assert state.get_counters("hits") == {"hits": 2}
+
+def test_metrics_flush_thread_stops():
+    from backend.core.metrics import Metrics
+
+    collector = Metrics(flush_interval=3600)
+    collector.incr("stop.test")
+    collector.stop()
+    assert not collector._flush_thread.is_alive()
+    assert collector.snapshot()["stop.test"] >= 1
+
+def test_failed_metrics_flush_keeps_pending(monkeypatch):
+    from backend.core.metrics import METRICS_PREFIX, Metrics
+    from backend.core.shared_state import shared_state
+
+    collector = Metrics(flush_interval=3600)
+
+    def broken(deltas):
+        raise OSError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(shared_state, "incr_many", broken)
+        collector.incr("retry.test", 3)
+        with pytest.raises(OSError):
+            collector.flush()
+    collector.flush()
+    assert shared_state.get_counters(METRICS_PREFIX + "retry.test")[METRICS_PREFIX + "retry.test"] == 3
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""按请求的性能剖析：只在实际迭代时占用剖析器"""
+
+import pytest
+
+from backend.core.profiler import RequestProfiler
+
+@pytest.fixture
+def profiler(tmp_path):
+    return RequestProfiler(enabled=True, sample_rate=0, output_dir=str(tmp_path), retention=5)
+
+def _steps():
+    yield "a"
+    yield "b"
+
+def test_unstarted_generator_does_not_hold_profiler(profiler, tmp_path):
+    profiler.wrap(_steps(), "never-started")
+    assert list(profiler.wrap(_steps(), "second")) == ["a", "b"]
+    assert not profiler._active.locked()
+    assert (tmp_path / "second" / "meta.json").exists()
+    assert not (tmp_path / "never-started").exists()
+
+def test_concurrent_request_passes_through_unprofiled(profiler, tmp_path):
+    first = profiler.wrap(_steps(), "first")
+    assert next(first) == "a"
+    assert list(profiler.wrap(_steps(), "second")) == ["a", "b"]
+    assert not (tmp_path / "second").exists()
+    first.close()
+    assert not profiler._active.locked()
+    assert (tmp_path / "first" / "meta.json").exists()
+
+def test_should_profile_does_not_read_shared_state_per_request(monkeypatch, tmp_path):
+    from backend.core import profiler as profiler_module
+
+    reads = []
+    monkeypatch.setattr(profiler_module.shared_state, "get", lambda key: reads.append(key))
+    profiler = RequestProfiler(enabled=False, sample_rate=0, output_dir=str(tmp_path), retention=5)
+    for _ in range(100):
+        assert not profiler.should_profile()
+    profiler.stop()
+    # 只在启动后台刷新线程时读取一次
+    assert len(reads) == 1
+    assert not profiler._refresh_thread.is_alive()
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""用户用量配额"""
+
+import pytest
+
+from backend.core.quota import UsageTracker, _hour_prefix
+from backend.core.shared_state import shared_state
+
+def test_check_and_record():
+    tracker = UsageTracker(tokens_per_hour=100, flush_interval=3600)
+    assert tracker.check("alice")
+    tracker.record("alice", 60)
+    assert tracker.check("alice")
+    tracker.record("alice", 40)
+    assert not tracker.check("alice")
+    assert tracker.check("bob")
+    assert tracker.usage("alice") == (100, 100)
+
+def test_unlimited_quota():
+    tracker = UsageTracker(tokens_per_hour=0, flush_interval=3600)
+    tracker.record("alice", 10 ** 9)
+    assert tracker.check("alice")
+
+def test_flush_merges_other_workers():
+    tracker = UsageTracker(tokens_per_hour=100, flush_interval=3600)
+    tracker.record("carol", 30)
+    tracker.flush()
+    # 模拟另一个工作进程写入的用量
+    shared_state.incr(_hour_prefix(tracker._hour) + "carol", 80)
+    tracker.flush()
+    assert tracker.usage("carol")[0] == 110
+    assert not tracker.check("carol")
+
+def test_seconds_until_reset():
+    tracker = UsageTracker(tokens_per_hour=100, flush_interval=3600)
+    assert 0 < tracker.seconds_until_reset() <= 3601
+
+def test_stop_ends_flush_thread_and_writes_pending():
+    tracker = UsageTracker(tokens_per_hour=100, flush_interval=3600)
+    tracker.record("dave", 5)
+    thread = tracker._flush_thread
+    tracker.stop()
+    assert not thread.is_alive()
+    assert shared_state.get_counters(_hour_prefix(tracker._hour) + "dave")
+
+def test_failed_flush_keeps_pending(monkeypatch):
+    tracker = UsageTracker(tokens_per_hour=100, flush_interval=3600)
+
+    def broken(deltas):
+        raise OSError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(shared_state, "incr_many", broken)
+        tracker.record("erin", 7)
+        with pytest.raises(OSError):
+            tracker.flush()
+    tracker.flush()
+    assert shared_state.get_counters(_hour_prefix(tracker._hour) + "erin")
\ No newline at end of file
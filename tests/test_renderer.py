@@ -0,0 +1,61 @@
+"""解答渲染：公式转换、MathML清理与代码中的$"""
+
+from backend.core.renderer import IncrementalRenderer, MarkdownRenderer, render_markdown, sanitize_mathml
+
+def test_math_is_rendered_as_mathml():
+    rendered = render_markdown("由 $v = \\sqrt{2gh}$ 可得\n\n$$T = 2\\pi$$")
+    assert rendered.count("<math") == 2
+    assert 'display="block"' in rendered
+
+def test_text_command_cannot_inject_tags():
+    rendered = render_markdown("$\\text{<img/src=x/onerror=alert(1)>}$")
+    assert "<img" not in rendered
+    assert "&lt;img/src=x/onerror=alert(1)&gt;" in rendered
+
+def test_mbox_content_is_escaped():
+    rendered = render_markdown("$$\\mbox{<script>alert(1)</script>}$$")
+    assert "<script" not in rendered
+    assert "&lt;script&gt;" in rendered
+
+def test_href_and_style_attributes_are_dropped():
+    rendered = render_markdown("$\\href{javascript:alert(1)}{x}$ $\\style{position:fixed}{y}$ $\\class{c}{z}$")
+    assert "javascript:" not in rendered
+    assert "href=" not in rendered
+    assert "style=" not in rendered
+    assert "class=\"c\"" not in rendered
+    assert "<mi>x</mi>" in rendered
+
+def test_attribute_values_stay_quoted():
+    rendered = render_markdown('$\\color{red" onclick="alert(1)}{a}$')
+    assert ' onclick="' not in rendered
+
+def test_sanitizer_keeps_operators_escaped():
+    assert sanitize_mathml("<math><mo>&#x0003C;</mo><mtext>a&b</mtext></math>") == \
+        "<math><mo>&lt;</mo><mtext>a&amp;b</mtext></math>"
+
+def test_dollar_inside_inline_code_is_not_math():
+    rendered = render_markdown("代码 `$y$` 与公式 $y$")
+    assert "<code>$y$</code>" in rendered
+    assert rendered.count("<math") == 1
+
+def test_dollar_inside_fenced_code_is_not_math():
+    rendered = render_markdown("说明\n```\nprint('$x$')\n```")
+    assert "<math" not in rendered
+    assert "$x$" in rendered
+
+def test_incremental_renderer_sanitizes_tail():
+    renderer = IncrementalRenderer(MarkdownRenderer(16))
+    rendered = renderer.render("第一段\n\n$\\text{<img src=x onerror=alert(1)>}$")
+    assert "<img" not in rendered
+    assert "第一段" in rendered
+
+def test_raw_html_is_not_passed_through():
+    rendered = render_markdown("<img src=x onerror=alert(1)>")
+    assert "<img" not in rendered
+
+def test_placeholder_like_text_is_kept():
+    renderer = MarkdownRenderer(cache_size=8)
+    rendered = renderer.render("MATHPLACEHOLDER7END 与 CODEPLACEHOLDER3END，$x$")
+    assert "MATHPLACEHOLDER7END" in rendered
+    assert "CODEPLACEHOLDER3END" in rendered
+    assert rendered.count("<math") == 1
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""模型路由：故障转移、流中断续写与取消"""
+
+import json
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+
+from backend.config.settings import settings
+from backend.core import router as router_module
+from backend.core.router import ModelRouter, StreamCancel, trim_overlap, is_transient_error
+
+def _endpoints(*names):
+    return [
+        {"name": name, "base_url": "http://127.0.0.1:9/v1", "api_key": "test", "weight": 1.0, "models": None}
+        for name in names
+    ]
+
+@pytest.fixture
+def make_router(monkeypatch):
+    """创建不启动探测线程的路由器"""
+    monkeypatch.setattr(settings, "router_probe_interval", 0)
+    monkeypatch.setattr(settings, "stream_fast_path", False)
+
+    def factory(*names):
+        monkeypatch.setattr(settings, "endpoints", _endpoints(*names))
+        return ModelRouter()
+    return factory
+
+def test_failover_before_first_token(make_router, monkeypatch):
+    router = make_router("primary", "backup")
+    opened = []
+
+    def fake_open(endpoint, model, messages, **kwargs):
+        opened.append(endpoint.name)
+        if endpoint.name == "primary":
+            raise httpx.ConnectError("refused")
+        yield "ok"
+
+    monkeypatch.setattr(router, "_open_stream", fake_open)
+    assert "".join(router._open_with_failover("m", [])) == "ok"
+    assert opened == ["primary", "backup"]
+
+    primary = router.endpoints[0]
+    assert not primary.healthy
+    assert primary.error_rate > 0
+    # 冷却中的端点排在后面
+    assert [ep.name for ep in router._rank("m")] == ["backup", "primary"]
+
+def test_all_endpoints_failing_raises(make_router, monkeypatch):
+    router = make_router("a", "b")
+
+    def fake_open(endpoint, model, messages, **kwargs):
+        raise httpx.ConnectError(f"{endpoint.name} down")
+        yield
+
+    monkeypatch.setattr(router, "_open_stream", fake_open)
+    with pytest.raises(Exception, match="所有端点均请求失败"):
+        router._open_with_failover("m", [])
+
+def test_trim_overlap():
+    tail = "由能量守恒可得 v = \\sqrt{2gh}，代入数据"
+    assert trim_overlap(tail, "\\sqrt{2gh}，代入数据得 v = 14 m/s") == len("\\sqrt{2gh}，代入数据")
+    # 重叠过短时视为巧合，不跳过
+    assert trim_overlap("abc", "c and more") == 0
+    assert trim_overlap(tail, "全新的内容") == 0
+
+def test_transient_error_classification():
+    assert is_transient_error(httpx.ReadError("reset"))
+    assert not is_transient_error(ValueError("bad request"))
+
+def test_resume_after_transient_error(make_router, monkeypatch):
+    router = make_router("default")
+    monkeypatch.setattr(settings, "stream_max_resumes", 2)
+    calls = []
+
+    def interrupted():
+        yield "第一步：受力分析，"
+        yield "重力与支持力平衡。"
+        raise httpx.ReadError("connection reset")
+
+    def continuation():
+        yield "重力与支持力平衡。第二步："
+        yield "列出运动方程。"
+
+    streams = iter([interrupted(), continuation()])
+
+    def fake_open(model, messages, **kwargs):
+        calls.append(messages)
+        return next(streams)
+
+    monkeypatch.setattr(router, "_open_with_failover", fake_open)
+    output = "".join(router.stream_content("m", [{"role": "user", "content": "题目"}]))
+
+    assert output == "第一步：受力分析，重力与支持力平衡。第二步：列出运动方程。"
+    # 续写请求以已输出内容作为assistant前缀
+    assert calls[1][1] == {"role": "assistant", "content": "第一步：受力分析，重力与支持力平衡。"}
+    assert calls[1][2]["content"] == router_module.CONTINUE_PROMPT
+
+def test_non_transient_error_is_not_resumed(make_router, monkeypatch):
+    router = make_router("default")
+    monkeypatch.setattr(settings, "stream_max_resumes", 2)
+
+    def broken():
+        yield "部分内容"
+        raise ValueError("bad")
+
+    monkeypatch.setattr(router, "_open_with_failover", lambda model, messages, **kwargs: broken())
+    with pytest.raises(ValueError):
+        list(router.stream_content("m", []))
+
+def test_resume_limit(make_router, monkeypatch):
+    router = make_router("default")
+    monkeypatch.setattr(settings, "stream_max_resumes", 1)
+
+    def interrupted():
+        yield "每次都只输出了一部分内容"
+        raise httpx.ReadError("reset")
+
+    monkeypatch.setattr(router, "_open_with_failover", lambda model, messages, **kwargs: interrupted())
+    received = []
+    with pytest.raises(httpx.ReadError):
+        for content in router.stream_content("m", []):
+            received.append(content)
+    # 原始输出一次，续写时与已输出内容完全重叠的部分被去掉
+    assert "".join(received) == "每次都只输出了一部分内容"
+
+def test_continue_saved_content(make_router, monkeypatch):
+    router = make_router("default")
+    monkeypatch.setattr(settings, "stream_max_resumes", 2)
+    calls = []
+
+    def continuation():
+        yield "重力与支持力平衡。第二步："
+        yield "列出运动方程。"
+
+    def fake_open(model, messages, **kwargs):
+        calls.append(messages)
+        return continuation()
+
+    monkeypatch.setattr(router, "_open_with_failover", fake_open)
+    saved = "第一步：受力分析，重力与支持力平衡。"
+    output = "".join(router.continue_content("m", [{"role": "user", "content": "题目"}], saved))
+
+    assert output == "第二步：列出运动方程。"
+    assert calls[0][1] == {"role": "assistant", "content": saved}
+
+@pytest.fixture
+def stalled_server():
+    """发送一个内容块后不再响应的SSE服务，返回 (地址, 已接受的连接数列表)"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    connections = []
+    done = threading.Event()
+    chunk = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "m",
+             "choices": [{"index": 0, "delta": {"content": "第一步"}, "finish_reason": None}]}
+
+    def serve():
+        while not done.is_set():
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            connections.append(conn)
+            conn.recv(65536)
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Connection: close\r\n\r\n"
+                         + f"data: {json.dumps(chunk)}\n\n".encode())
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}/v1", connections
+    done.set()
+    listener.close()
+    for conn in connections:
+        conn.close()
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_cancel_interrupts_stalled_stream(make_router, monkeypatch, stalled_server, fast_path):
+    base_url, connections = stalled_server
+    router = make_router("default")
+    router.endpoints[0].client = router.endpoints[0].client.with_options(base_url=base_url)
+    monkeypatch.setattr(settings, "stream_fast_path", fast_path)
+    monkeypatch.setattr(settings, "stream_max_resumes", 2)
+
+    cancel = StreamCancel()
+    stream = router.stream_content("m", [{"role": "user", "content": "题目"}], cancel=cancel)
+    assert next(stream) == "第一步"
+    threading.Timer(0.2, cancel.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(Exception):
+        next(stream)
+    assert time.monotonic() - start < 5
+    # 取消后不再续写
+    assert len(connections) == 1
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""调度通道：并发限制、排队、拒绝与按用户公平放行"""
+
+import threading
+import time
+
+import pytest
+
+from backend.core.scheduler import (
+    AdmissionRejected, Lane, LaneScheduler, REJECT_BUSY, REJECT_USER_LIMIT
+)
+
+def _scheduler(concurrency=1, max_queue=2, **kwargs):
+    return LaneScheduler({"simple": Lane("simple", concurrency, max_queue, 10.0)}, **kwargs)
+
+def test_admission_and_queue():
+    scheduler = _scheduler(concurrency=1, max_queue=1)
+    first = scheduler.enter("simple")
+    second = scheduler.enter("simple")
+    assert first.admitted and not second.admitted
+    assert scheduler.get_status()["simple"]["waiting"] == 1
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        scheduler.enter("simple")
+    assert excinfo.value.reason == REJECT_BUSY
+    assert excinfo.value.retry_after > 0
+
+    scheduler.release(first)
+    assert second.admitted
+    scheduler.release(second)
+    status = scheduler.get_status()["simple"]
+    assert status["active"] == 0 and status["waiting"] == 0
+
+def test_release_is_idempotent_and_frees_queued_ticket():
+    scheduler = _scheduler(concurrency=1, max_queue=2)
+    first = scheduler.enter("simple")
+    queued = scheduler.enter("simple")
+    scheduler.release(queued)
+    scheduler.release(queued)
+    assert scheduler.get_status()["simple"]["waiting"] == 0
+    scheduler.release(first)
+    scheduler.release(first)
+    assert scheduler.get_status()["simple"]["active"] == 0
+
+def test_max_wait_rejects_long_queue():
+    scheduler = _scheduler(concurrency=1, max_queue=5, max_wait=5.0)
+    scheduler.enter("simple")
+    with pytest.raises(AdmissionRejected):
+        scheduler.enter("simple")
+
+def test_wait_yields_estimate_until_admitted():
+    scheduler = _scheduler(concurrency=1, max_queue=2)
+    first = scheduler.enter("simple")
+    second = scheduler.enter("simple")
+    waiting = scheduler.wait(second, poll_interval=0.01)
+    assert next(waiting) == pytest.approx(10.0)
+    scheduler.release(first)
+    assert list(waiting) == []
+    assert second.admitted
+
+def test_user_queue_limit():
+    scheduler = _scheduler(concurrency=1, max_queue=10, user_max_queued=1)
+    scheduler.enter("simple", "alice")
+    scheduler.enter("simple", "alice")
+    with pytest.raises(AdmissionRejected) as excinfo:
+        scheduler.enter("simple", "alice")
+    assert excinfo.value.reason == REJECT_USER_LIMIT
+    # 其他用户不受影响
+    assert not scheduler.enter("simple", "bob").admitted
+
+def test_round_robin_between_users():
+    scheduler = _scheduler(concurrency=1, max_queue=10)
+    running = scheduler.enter("simple", "alice")
+    alice = [scheduler.enter("simple", "alice") for _ in range(3)]
+    bob = scheduler.enter("simple", "bob")
+
+    order = []
+    current = running
+    pending = alice + [bob]
+    while pending:
+        scheduler.release(current)
+        current = next(ticket for ticket in pending if ticket.admitted)
+        pending.remove(current)
+        order.append(current.user)
+    # bob 的请求不必等待 alice 排在前面的全部请求
+    assert order.index("bob") < 2
+
+def test_user_active_limit_skips_user():
+    scheduler = _scheduler(concurrency=2, max_queue=10, user_max_active=1)
+    scheduler.enter("simple", "alice")
+    blocked = scheduler.enter("simple", "alice")
+    other = scheduler.enter("simple", "bob")
+    assert not blocked.admitted
+    assert other.admitted
+    assert scheduler.get_user_status("alice")["active"] == 1
+
+def test_enter_when_available_waits_instead_of_rejecting():
+    scheduler = _scheduler(concurrency=1, max_queue=0)
+    running = scheduler.enter("simple")
+    threading.Timer(0.2, scheduler.release, args=(running,)).start()
+    start = time.monotonic()
+    ticket = scheduler.enter_when_available("simple")
+    assert ticket.admitted
+    assert time.monotonic() - start >= 0.2
+    scheduler.release(ticket)
+
+def test_fair_quantum_must_be_positive(monkeypatch):
+    from backend.config.settings import Settings
+
+    monkeypatch.setenv("FAIR_QUANTUM", "0")
+    with pytest.raises(ValueError, match="FAIR_QUANTUM"):
+        Settings()
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""复杂模式草稿：复杂模式开始输出后取消草稿，不等待停滞的草稿请求"""
+
+import threading
+import time
+
+from backend.config.settings import settings
+from backend.core.concurrent_streams import ConcurrentStreams, EVENT_CANCELLED
+from backend.core.solver import problem_solver
+
+class StallingRouter:
+    """草稿模型输出一块后停滞，直到被取消；其他模型正常输出"""
+    def __init__(self, outputs, stalled):
+        self.outputs = outputs
+        self.stalled = stalled
+        self.cancelled = []
+
+    def stream_content(self, model, messages, cancel=None, **kwargs):
+        if model == self.stalled:
+            return self._stall(model, cancel)
+        return iter(self.outputs[model])
+
+    def _stall(self, model, cancel):
+        yield self.outputs[model][0]
+        # 模拟阻塞在读取上的连接：只有取消才能使其返回
+        while not cancel.cancelled:
+            time.sleep(0.01)
+        self.cancelled.append(model)
+        raise ConnectionError("aborted")
+
+def test_cancelled_stream_is_not_awaited():
+    release = threading.Event()
+
+    class HangingRouter:
+        def stream_content(self, model, messages, cancel=None, **kwargs):
+            yield "开始"
+            release.wait(30)
+
+    streams = ConcurrentStreams(HangingRouter())
+    streams.start("draft", "m", [])
+    start = time.monotonic()
+    events = []
+    for key, kind, payload in streams.events():
+        events.append(kind)
+        if len(events) == 1:
+            streams.cancel("draft")
+    release.set()
+    assert events[-1] == EVENT_CANCELLED
+    assert time.monotonic() - start < 5
+
+def test_draft_is_cancelled_when_final_answer_streams(monkeypatch):
+    _, draft_model = settings.get_model_info(False)
+    _, solver_model = settings.get_model_info(True)
+    router = StallingRouter({draft_model: ["草稿"], solver_model: ["正式解答"]}, stalled=draft_model)
+    monkeypatch.setattr(problem_solver, "router", router)
+
+    start = time.monotonic()
+    output = ""
+    for output, _ in problem_solver.solve_problem("单摆的周期", None, True, speculative=True):
+        pass
+    assert time.monotonic() - start < 5
+    assert "正式解答" in output
+    assert "草稿" not in output
+    # 草稿请求收到取消信号后立即结束
+    deadline = time.monotonic() + 2
+    while not router.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert router.cancelled == [draft_model]
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""界面求解入口：图片限制检查先于自动选择模式"""
+
+from PIL import Image
+
+from backend.config.settings import settings
+from backend.core.mode_classifier import mode_classifier
+from frontend.components.ui import solver_ui
+
+def test_oversized_image_rejected_before_mode_decision(tmp_path, monkeypatch):
+    path = tmp_path / "large.png"
+    Image.new("L", (64, 64)).save(path)
+    monkeypatch.setattr(settings, "image_max_pixels", 100)
+
+    def decide(text, images=None):
+        raise AssertionError("不应解码超出限制的图片")
+    monkeypatch.setattr(mode_classifier, "decide", decide)
+
+    outputs = list(solver_ui._handle_solve("题目", [str(path)], False, is_auto_mode=True))
+    assert len(outputs) == 1
+    assert "像素数过多" in outputs[0][0]["value"]
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""图片编码缓存与解答保存"""
+
+import io
+import zipfile
+
+from PIL import Image
+
+from backend.config.settings import settings
+from backend.core import utils
+
+def _jpeg(size=(32, 32), color=(200, 30, 30)) -> bytes:
+    buffered = io.BytesIO()
+    Image.new("RGB", size, color).save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+def test_encode_cache_is_bounded_by_bytes(monkeypatch):
+    images = [_jpeg(color=(index * 40, 0, 0)) for index in range(4)]
+    encoded = len(utils.encode_image_cached(images[0])[1])
+    monkeypatch.setattr(settings, "image_cache_bytes", encoded * 2)
+    monkeypatch.setattr(utils, "_encode_cache", utils.OrderedDict())
+    monkeypatch.setattr(utils, "_encode_cache_bytes", 0)
+
+    for image in images:
+        utils.encode_image_cached(image)
+    assert utils._encode_cache_bytes <= encoded * 2
+    assert len(utils._encode_cache) == 2
+
+def test_pil_images_are_resized_without_touching_the_original(monkeypatch):
+    monkeypatch.setattr(settings, "image_max_side", 16)
+    image = Image.new("RGB", (64, 32))
+    mime, data = utils.prepare_image(image)
+
+    assert image.size == (64, 32)
+    assert Image.open(io.BytesIO(data)).size == (16, 8)
+    assert utils._image_cache_key(image) is None
+
+def test_save_solution_keeps_uploaded_bytes(tmp_path):
+    upload = _jpeg()
+    zip_path, _ = utils.save_solution("题目", [upload, Image.new("RGB", (8, 8))], "解答", str(tmp_path))
+
+    with zipfile.ZipFile(zip_path) as archive:
+        names = archive.namelist()
+        saved = next(name for name in names if name.endswith(".jpg"))
+        assert archive.read(saved) == upload
+        assert any(name.endswith("_2.png") for name in names)
+        markdown = archive.read(next(name for name in names if name.endswith(".md"))).decode("utf-8")
+    assert f"](./{saved})" in markdown
\ No newline at end of file